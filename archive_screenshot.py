@@ -1,24 +1,39 @@
 import argparse
+import contextlib
 import os
 import sqlite3
 import time
 import csv
 import asyncio
-import urllib.request
-import urllib.error
-#from pyppeteer import launch
-#from pyppeteer import errors
 import logging
 import signal
+import subprocess
 import re
 import sys
 from PIL import Image
+import requests
 sys.path.insert(0, './utils/')
 from website_exists_mod import *
+from http_client_mod import error_reason, shared_client
+from webdriver_pool_mod import WebDriverPool
+from puppeteer_browser_mod import PuppeteerBrowser, capture_all
+from xvfb_pool_mod import XvfbPool
+from capture_workers_mod import run_workers
+from capture_journal_mod import CaptureJournal
+from csv_offsets_mod import seek_row
+from shard_mod import assign_hosts, parse_shard, shard_file_name, shard_range, url_host
+from host_scheduler_mod import HostScheduler, interleave_hosts
+from retry_queue_mod import DeadLetters, RetryQueue, is_retryable
+from host_timeouts_mod import HostTimeouts
+from request_filter_mod import RequestFilter
+from page_settle_mod import PageSettle, log_timing
 
 
 def screenshot_csv(csv_in_name, csv_out_name, pics_out_path, screenshot_method, timeout_duration, read_range,
-                   chrome_args, screensize, keep_cookies):
+                   chrome_args, screensize, keep_cookies, driver_pool=None, workers=1, display_pool=None,
+                   completion_order=False, shard=None, shard_by="rows", scheduler=None,
+                   interleave=False, retries=None, host_timeouts=None, request_filter=None, page_settle=None,
+                   check_in_browser=False):
     """Fetches urls from the input CSV and takes a screenshot
 
     Parameters
@@ -41,50 +56,329 @@ def screenshot_csv(csv_in_name, csv_out_name, pics_out_path, screenshot_method,
         Contains two int which are height and width of the browser viewport.
     keep_cookies : bool
         Whether or not to run click_button() to attempt to remove cookies banners. False to remove.
+    driver_pool : WebDriverPool
+        The WebDrivers reused by selenium_screenshot. None to use a new driver for each url.
+    workers : int
+        Number of urls captured at the same time, by worker threads or, with puppeteer (method 1),
+        by pages of one browser.
+    display_pool : XvfbPool
+        The X displays used by cutycapt_screenshot. None to start an X server for each url.
+    completion_order : bool
+        Write the rows of the index as their screenshots finish instead of in input order.
+    shard : tuple
+        The shard number and the number of shards, only the urls of that shard are captured. None to capture all.
+    shard_by : str
+        "rows" gives each shard one block of lines of csv_in, "host" gives all the urls of a host to the same
+        shard and spreads the hosts so the shards get about as many urls.
+    scheduler : HostScheduler
+        Limits the captures of each host, across all the capture processes. None for no limits.
+    interleave : bool
+        Take turns between the hosts of the urls instead of capturing them in input order.
+    retries : RetryQueue
+        Where captures that failed for a reason that may go away wait to be tried again, after
+        all the other urls. None to try each url once.
+    host_timeouts : HostTimeouts
+        Timeouts learned from each host. None to use timeout_duration and a 10 second check.
+    request_filter : RequestFilter
+        Decides which requests the puppeteer pages abort. None to let pages load everything.
+        Selenium drivers get theirs from driver_pool.
+    page_settle : PageSettle
+        Decides when a loaded page is ready for its screenshot, and how long cutycapt waits. None
+        for the defaults. Selenium drivers get theirs from driver_pool.
+    check_in_browser : bool
+        Tell whether a site is live from the response the browser got when it loaded the url,
+        instead of requesting the url once more before the capture. Only puppeteer (method 1) and
+        selenium (method 3) can, the other methods still check first. Selenium needs a driver_pool
+        made with check_navigation.
+
+    Notes
+    -----
+    Finished rows are also appended to <csv_out_name>.journal. When the run is started again,
+    rows in the journal whose screenshot is still valid, or whose site could not be reached,
+    are not captured again; their journal rows go into the rebuilt index instead.
+
+    Rows whose capture failed for good are also written to <csv_out_name>.dead.csv, and are
+    captured again by the next run.
 
     """
     
-    with open(csv_in_name, 'r') as csv_file_in:
-        csv_reader = csv.reader(csv_file_in)
-        with open(csv_out_name, 'w+') as csv_file_out:
-            csv_writer = csv.writer(csv_file_out, delimiter=',', quoting=csv.QUOTE_ALL)
-            csv_writer.writerow(
-                ["archive_id", "url_id", "date", "url", "site_status", "site_message", "screenshot_message"])
-
-            line_count = 0
-            next(csv_reader)  # skip header
-            while True:
-                try:
-                    line = next(csv_reader)
-                except StopIteration:
-                    break
-                line_count += 1
-
-                if (read_range[0] != None) and (read_range[1] != None):  # skip if not within range
-                    if line_count < read_range[0] or line_count > read_range[1]:
-                        continue
-
-                archive_id = str(line[0])
-                url_id = line[1]
-                date = line[2]
-                url = line[3]
-
-                if url == "":
-                    continue
-
-                print("\nurl #{0} {1}".format(url_id, url))
-                logging.info("url #{0} {1}".format(url_id, url))
-
-                try:
-                    site_status, site_message, screenshot_message = take_screenshot(archive_id, url_id, date, url,
-                    pics_out_path, screenshot_method, timeout_duration, chrome_args, screensize, keep_cookies)
-                except:
-                    continue
-
-                csv_writer.writerow([archive_id, url_id, date, url, site_status, site_message, screenshot_message])
+    host_shards = None
+    if shard is not None and shard_by == "host":
+        with open(csv_in_name, 'r') as csv_file_in:
+            host_shards = assign_hosts((row[-1] for row in read_urls(csv_file_in, read_range)), shard[1])
+    elif shard is not None:
+        read_range = shard_range(csv_in_name, read_range, shard)
+
+    header = ["archive_id", "url_id", "date", "url", "site_status", "site_message", "screenshot_message"]
+    if retries is None:
+        retries = RetryQueue()
+    dead_letters = DeadLetters(csv_out_name, header)
+    journal = CaptureJournal(csv_out_name)
+    try:
+        with open(csv_in_name, 'r') as csv_file_in:
+            with open(csv_out_name, 'w+') as csv_file_out:
+                csv_writer = csv.writer(csv_file_out, delimiter=',', quoting=csv.QUOTE_ALL)
+                csv_writer.writerow(header)
+
+                # the files the captures wrote, which are named by the redirected date when cutycapt followed a redirect
+                written_files = {}
+
+                def write_row(output):
+                    # the journal lets a restarted run skip this row and still write it to the rebuilt index
+                    key = (output[0], output[1], output[2])
+                    file_name = written_files.pop(key, None) or journal.file_name(key)
+                    if file_name is None:
+                        file_name = screenshot_file_name(pics_out_path, output[0], output[1], output[2], screenshot_method)
+                    retry = is_retryable(output[-3], output[-2], output[-1])
+                    journal.record(key, output, output[4], file_name, retry)
+                    csv_writer.writerow(output)
+                    if retry:
+                        dead_letters.write(output)
+
+                def write_or_retry(output):
+                    # a failure that may go away is tried again later, until its last attempt; the urls of
+                    # a host skipped for timing out wait until the host is tried again
+                    if is_retryable(output[-3], output[-2], output[-1]):
+                        skipped_until = host_timeouts.skipped_until(output[3]) if host_timeouts is not None else None
+                        if retries.defer(tuple(output[:4]), skipped_until, output):
+                            return
+                    write_row(output)
+
+                rows = read_urls(csv_file_in, read_range)
+                if host_shards is not None:
+                    rows = (row for row in rows if host_shards[url_host(row[-1])] == shard[0])
+                if interleave:
+                    rows = interleave_hosts(rows, lambda row: url_host(row[-1]))
+
+                if screenshot_method == 1:
+                    puppeteer_screenshot_csv(rows, write_or_retry, journal, pics_out_path, timeout_duration,
+                                             chrome_args, screensize, keep_cookies, workers, completion_order,
+                                             scheduler, retries, host_timeouts, request_filter, page_settle,
+                                             check_in_browser)
+                    return
+
+                def capture(row):
+                    archive_id, url_id, date, url = row
+                    finished_row = journal.finished_row((archive_id, url_id, date))
+                    if finished_row is not None:
+                        return finished_row
+
+                    print("\nurl #{0} {1}".format(url_id, url))
+                    logging.info("url #{0} {1}".format(url_id, url))
+
+                    slot = scheduler.slot(url) if scheduler is not None else contextlib.nullcontext()
+                    try:
+                        with slot:
+                            site_status, site_message, screenshot_message, file_name = take_screenshot(archive_id,
+                            url_id, date, url, pics_out_path, screenshot_method, timeout_duration, chrome_args,
+                            screensize, keep_cookies, driver_pool, display_pool, host_timeouts, page_settle,
+                            check_in_browser)
+                    except:
+                        return None
+                    written_files[(archive_id, url_id, date)] = file_name
+                    if scheduler is not None and scheduler.is_throttling(site_message):
+                        scheduler.throttled()
+
+                    return [archive_id, url_id, date, url, site_status, site_message, screenshot_message]
+
+                def retry(item):
+                    due, row = item
+                    if due is None:
+                        return row    # the output of a row that is not tried again
+                    time.sleep(max(0, due - time.time()))
+                    return capture(row)
+
+                def write(output):
+                    if output is not None:
+                        write_or_retry(output)
+
+                run_workers(rows, capture, workers, write, completion_order)
+                while retries:
+                    run_workers(retries.take(), retry, workers, write, completion_order)
+    finally:
+        journal.close()
+        dead_letters.close()
+
+
+def screenshot_file_name(pics_out_path, archive_id, url_id, date, screenshot_method):
+    """Returns the file the screenshot of a url is saved to, the same name the capture functions use
+
+    Parameters
+    ----------
+    pics_out_path : str
+        Directory to output the screenshots.
+    archive_id : str
+        The archive ID.
+    url_id : str
+        The url ID.
+    date : str
+        The date of the archive capture.
+    screenshot_method : int
+        Which method takes the screenshots, every method saves a png.
+
+    """
+    return "{0}{1}.{2}.{3}.png".format(pics_out_path, archive_id, url_id, date)
+
+
+def read_urls(csv_file_in, read_range):
+    """Yields the archive ID, url ID, date and url of each row of the input CSV with a url
+
+    Parameters
+    ----------
+    csv_file_in : file object
+        The CSV file with the archive urls.
+    read_range : list
+        Contains two int which tell the programs to only take screenshots between these lines in the csv_in.
+
+    Notes
+    -----
+    With a read_range the file is moved straight to the first line of the range using the
+    offsets saved in <csv_in>.offsets, see csv_offsets_mod, and reading stops after its last line.
+
+    """
+    csv_reader = csv.reader(csv_file_in)
+    in_range = (read_range[0] != None) and (read_range[1] != None)
+    line_count = 0
+    if in_range:
+        if not seek_row(csv_file_in, read_range[0]):
+            return  # the range starts after the last line
+        line_count = max(1, read_range[0]) - 1
+    else:
+        next(csv_reader)  # skip header
+    for line in csv_reader:
+        line_count += 1
+
+        if in_range and line_count > read_range[1]:  # stop at the end of the range
+            break
+
+        archive_id = str(line[0])
+        url_id = line[1]
+        date = line[2]
+        url = line[3]
+
+        if url == "":
+            continue
+
+        yield archive_id, url_id, date, url
+
+
+def puppeteer_screenshot_csv(rows, write_row, journal, pics_out_path, timeout_duration, chrome_args, screensize,
+                             keep_cookies, workers, completion_order=False, scheduler=None, retries=None,
+                             host_timeouts=None, request_filter=None, page_settle=None, check_in_browser=False):
+    """Takes the puppeteer screenshots of rows with one shared browser, several pages at a time
+
+    Parameters
+    ----------
+    rows : iterable
+        The archive ID, url ID, date and url of each screenshot, see read_urls.
+    write_row : function
+        Writes one row of the index CSV.
+    journal : CaptureJournal
+        The journal of the run, rows it has finished are not captured again.
+    pics_out_path : str
+        Directory to output the screenshots.
+    timeout_duration : int
+        Duration before timeout when going to each website.
+    chrome_args : list
+        Contains extra arguments for chrome that can be passed into pyppeteer. None if no additional arguments.
+    screensize : list
+        Contains two int which are height and width of the browser viewport.
+    keep_cookies : bool
+        Whether or not to run click_button() to attempt to remove cookies banners. False to remove.
+    workers : int
+        Number of pages rendered at once.
+    completion_order : bool
+        Write the rows as their screenshots finish instead of in input order.
+    scheduler : HostScheduler
+        Limits the captures of each host. None for no limits.
+    retries : RetryQueue
+        The captures write_row deferred, tried again once every row had its first attempt.
+    host_timeouts : HostTimeouts
+        Timeouts learned from each host. None to use timeout_duration and a 10 second check.
+    request_filter : RequestFilter
+        Decides which requests of the pages are aborted. None to let pages load everything.
+    page_settle : PageSettle
+        Decides when a loaded page is ready for its screenshot. None for the defaults.
+    check_in_browser : bool
+        Tell whether a site is live from the response of the page instead of requesting it first.
+
+    """
+    browser = PuppeteerBrowser(chrome_args, screensize, workers, request_filter, page_settle)
+
+    async def capture(row):
+        archive_id, url_id, date, url = row
+        finished_row = journal.finished_row((archive_id, url_id, date))
+        if finished_row is not None:
+            return finished_row
+
+        if scheduler is None:
+            return await render(archive_id, url_id, date, url)
+        slot = await asyncio.get_event_loop().run_in_executor(None, scheduler.acquire, url)
+        try:
+            output = await render(archive_id, url_id, date, url)
+        finally:
+            scheduler.release(slot)
+        if scheduler.is_throttling(output[-2]):
+            scheduler.throttled()
+        return output
+
+    async def render(archive_id, url_id, date, url):
+        check_timeout, capture_timeout = 10, timeout_duration
+        if host_timeouts is not None:
+            skipped = host_timeouts.fail_fast(url)
+            if skipped is not None:
+                logging.info(skipped)
+                return [archive_id, url_id, date, url, "FAIL", skipped, "Screenshot unsuccessful"]
+            check_timeout = host_timeouts.timeout(url, "check", check_timeout)
+            capture_timeout = host_timeouts.timeout(url, "capture", capture_timeout)
+
+        if not check_in_browser:
+            start = time.time()
+            site_status, site_message, availability = await asyncio.get_event_loop().run_in_executor(
+                None, is_website_exist, url, check_timeout)
+            if host_timeouts is not None:
+                host_timeouts.record(url, "check", time.time() - start, check_timeout, site_message)
+            if site_status == "FAIL":
+                logging.info("Website does not exist: {}".format(url))
+                return [archive_id, url_id, date, url, site_status, site_message, "Screenshot unsuccessful"]
+
+        start = time.time()
+        try:
+            navigation = await browser.screenshot(url, '{0}{1}.{2}.{3}.png'.format(pics_out_path, archive_id, url_id, date),
+                                                  capture_timeout, keep_cookies, screenshot_on_timeout=True,
+                                                  check_response=check_in_browser)
+            if check_in_browser:
+                site_status, site_message = navigation
+            screenshot_message = "Screenshot successful" if site_status == "LIVE" else "Screenshot unsuccessful"
+        except Exception as e:
+            if check_in_browser:
+                site_status, site_message = navigation_status(url, error=e)
+            screenshot_message = e
+        if host_timeouts is not None:
+            host_timeouts.record(url, "capture", time.time() - start, capture_timeout, screenshot_message)
+        logging.info("url #{0} {1}: {2}".format(url_id, url, screenshot_message))
+        return [archive_id, url_id, date, url, site_status, site_message, screenshot_message]
+
+    def write(output):
+        print("\nurl #{0} {1}".format(output[1], output[3]))
+        print(output[-1])
+        write_row(output)
+
+    async def retry(item):
+        due, row = item
+        if due is None:
+            return row    # the output of a row that is not tried again
+        await asyncio.sleep(max(0, due - time.time()))
+        return await capture(row)
+
+    capture_all(rows, capture, workers, write, browser, completion_order)
+    while retries:
+        capture_all(retries.take(), retry, workers, write, browser, completion_order)
+
 
 def take_screenshot(archive_id, url_id, date, url, pics_out_path, screenshot_method, timeout_duration,
-                    chrome_args, screensize, keep_cookies):
+                    chrome_args, screensize, keep_cookies, driver_pool=None, display_pool=None, host_timeouts=None,
+                    page_settle=None, check_in_browser=False):
     """Calls the function or command to take a screenshot
 
     Parameters
@@ -109,6 +403,19 @@ def take_screenshot(archive_id, url_id, date, url, pics_out_path, screenshot_met
         Contains two int which are height and width of the browser viewport.
     keep_cookies : bool
         Whether or not to run click_button() to attempt to remove cookies banners. False to remove.
+    driver_pool : WebDriverPool
+        The WebDrivers reused by selenium_screenshot. None to use a new driver for each url.
+    display_pool : XvfbPool
+        The X displays used by cutycapt_screenshot. None to start an X server for each url.
+    host_timeouts : HostTimeouts
+        Gives the check and the capture of url timeouts learned from its host, and skips hosts that
+        keep timing out. None to use timeout_duration and a 10 second check.
+    page_settle : PageSettle
+        Decides when a loaded page is ready for its screenshot, and how long cutycapt waits.
+        None for the defaults.
+    check_in_browser : bool
+        With puppeteer or selenium, tell whether the site is live from the response the browser
+        got instead of checking it first with is_website_exist.
 
     Returns
     -------
@@ -119,19 +426,39 @@ def take_screenshot(archive_id, url_id, date, url, pics_out_path, screenshot_met
         An error describing why the site can't be reached or a message saying the site was redirected.
     screenshot_message : str
         Message indicating whether the screenshot was successful.
+    output_file_name : str
+        The file the screenshot is saved to. cutycapt names it by the date of the capture an
+        archive redirected to, which can differ from date.
 
     """
 
     # site_status, site_message = check_site_availability(url)
-    site_status, site_message, availability = is_website_exist(url, 10)
-    if site_status == "FAIL":
-        logging.info("Website does not exist")
-        print("*"*20)
-        print("wesite not exist")
-        return site_status, site_message, "Screenshot unsuccessful"
-
+    output_file_name = screenshot_file_name(pics_out_path, archive_id, url_id, date, screenshot_method)
+    check_timeout = 10
+    if host_timeouts is not None:
+        skipped = host_timeouts.fail_fast(url)
+        if skipped is not None:
+            logging.info(skipped)
+            print(skipped)
+            return "FAIL", skipped, "Screenshot unsuccessful", output_file_name
+        check_timeout = host_timeouts.timeout(url, "check", check_timeout)
+        timeout_duration = host_timeouts.timeout(url, "capture", timeout_duration)
+
+    check_in_browser = check_in_browser and screenshot_method in (1, 3)    # cutycapt and chrome give no response
+    if not check_in_browser:
+        start = time.time()
+        site_status, site_message, availability = is_website_exist(url, check_timeout)
+        if host_timeouts is not None:
+            host_timeouts.record(url, "check", time.time() - start, check_timeout, site_message)
+        if site_status == "FAIL":
+            logging.info("Website does not exist")
+            print("*"*20)
+            print("wesite not exist")
+            return site_status, site_message, "Screenshot unsuccessful", output_file_name
+
+    start = time.time()
     if screenshot_method == 0:
-        return site_status, site_message, chrome_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration)
+        screenshot_message = chrome_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration)
     elif screenshot_method == 2:
         if (site_message.find("Redirected") == 0):
             url = site_message.split()[2]
@@ -140,60 +467,54 @@ def take_screenshot(archive_id, url_id, date, url, pics_out_path, screenshot_met
             date = url_split[:url_split.find('/')]
             if (date.find("if_") != -1):
                 date = date[:-3]
-        return site_status, site_message, cutycapt_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration)
+            output_file_name = screenshot_file_name(pics_out_path, archive_id, url_id, date, screenshot_method)
+        screenshot_message = cutycapt_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration,
+                                                 display_pool, page_settle)
     elif screenshot_method == 3:
-        return site_status, site_message, selenium_screenshot(pics_out_path, archive_id, url_id, url, timeout_duration)
+        if check_in_browser:
+            site_status, site_message, screenshot_message = selenium_screenshot(
+                pics_out_path, archive_id, url_id, date, url, timeout_duration, driver_pool, page_settle, True)
+        else:
+            screenshot_message = selenium_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration,
+                                                     driver_pool, page_settle)
     elif screenshot_method == 1:
+        # screenshot_csv shares one browser between all its urls, this launches one for a single url
+        browser = PuppeteerBrowser(chrome_args, screensize, page_settle=page_settle)
+        loop = asyncio.get_event_loop()
         try:
-            signal.alarm(timeout_duration * 2 + 60)  # timer for when asyncio stalls on a invalid state error
-            loop = asyncio.get_event_loop()
-            task = asyncio.gather(puppeteer_screenshot(archive_id, url_id, date, url, pics_out_path, timeout_duration,
-                                                       chrome_args, screensize, keep_cookies))
-            result = loop.run_until_complete(task)
-            #logging.info(result)
-            logging.info("Screenshot successful")
-            print("Screenshot successful")
-            return site_status, site_message, "Screenshot successful"
-        except errors.TimeoutError as e:
-            print(e)
-            logging.info(e)
-            return site_status, site_message, e
-        except errors.NetworkError as e:
-            print(e)
-            logging.info(e)
-            return site_status, site_message, e
-        except errors.PageError as e:
-            print(e)
-            logging.info(e)
-            return site_status, site_message, e
+            navigation = loop.run_until_complete(browser.screenshot(url, output_file_name, timeout_duration,
+                                                                    keep_cookies, screenshot_on_timeout=True,
+                                                                    check_response=check_in_browser))
+            if check_in_browser:
+                site_status, site_message = navigation
+            if site_status == "LIVE":
+                logging.info("Screenshot successful")
+                print("Screenshot successful")
+                screenshot_message = "Screenshot successful"
+            else:
+                screenshot_message = "Screenshot unsuccessful"
         except Exception as e:
             print(e)
             logging.info(e)
-            return site_status, site_message, e
-        except asyncio.futures.InvalidStateError as e:
-            print(e)
-            logging.info(e)
-            return site_status, site_message, e
-        except asyncio.streams.IncompleteReadError as e:
-            print(e)
-            logging.info(e)
-            return site_status, site_message, e
-        except TimeoutError as e:
-            print(e)
-            logging.info(e)
-            return site_status, site_message, e
-        except:
-            print("Unknown error")
-            logging.info("Unknown error")
-            return site_status, site_message, "Unknown error"
+            if check_in_browser:
+                site_status, site_message = navigation_status(url, error=e)
+            screenshot_message = e
+        finally:
+            loop.run_until_complete(browser.close())
+
+    if host_timeouts is not None:
+        host_timeouts.record(url, "capture", time.time() - start, timeout_duration, screenshot_message)
+    return site_status, site_message, screenshot_message, output_file_name
 
 
-async def puppeteer_screenshot(archive_id, url_id, date, url, pics_out_path, timeout_duration, chrome_args,
-                               screensize, keep_cookies):
-    """Take screenshot using the pyppeteer package.
+def selenium_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration, driver_pool=None, page_settle=None,
+                        check_response=False):
+    """Take a full page screenshot with selenium.
 
     Parameters
     ----------
+    pics_out_path : str
+        Directory to output the screenshots.
     archive_id : str
         The archive ID.
     url_id : str
@@ -202,106 +523,73 @@ async def puppeteer_screenshot(archive_id, url_id, date, url, pics_out_path, tim
         The date of the archive capture.
     url : str
         The url to take a screenshot of.
-    pics_out_path : str
-        Directory to output the screenshots.
     timeout_duration : str
         Duration before timeout when going to each website.
-    chrome_args : list
-        Contains extra arguments for chrome that can be passed into pyppeteer. None if no additional arguments.
-    screensize : list
-        Contains two int which are height and width of the browser viewport.
-    keep_cookies : bool
-        Whether or not to run click_button() to attempt to remove cookies banners. False to remove.
+    driver_pool : WebDriverPool
+        The pool to borrow a WebDriver from. None to start a driver for this url only.
+    page_settle : PageSettle
+        Decides when the page is ready for its screenshot if there is no driver_pool, which has its own.
+    check_response : bool
+        Also tell whether the site is live from the response of the page, and skip the screenshot
+        of HTTP error pages. driver_pool has to be made with check_navigation.
 
-    References
-    ----------
-    .. [1] https://pypi.org/project/pyppeteer/
+    Returns
+    -------
+    site_status : str
+        Only with check_response, LIVE or FAIL as navigation_status derives it from the response.
+    site_message : str
+        Only with check_response, the reason for site_status.
+    screenshot_message : str
+        Message indicating whether the screenshot was successful.
 
     """
+    from selenium.webdriver.common.by import By
 
-    browser = await launch(headless=True, dumpio=True, args=chrome_args)
-    page = await browser.newPage()
-    try:
-        await page.setViewport({'height': screensize[0], 'width': screensize[1]})
-        await page.goto(url, timeout=(timeout_duration * 1000))
-        # TODO: Test
-        await page.waitFor(1000)
-        await page.reload(timeout=(timeout_duration * 1000))
-
-        if not keep_cookies:
-            await click_button(page, "I Accept")        # click through popups and banners, there could be a lot more
-            await click_button(page, "I Understand")
-            await click_button(page, "I Agree")
-            await click_button(page, "Accept Recommended Settings")
-            await click_button(page, "Close")
-            await click_button(page, "Close and Accept")
-            await click_button(page, "OK")
-            await click_button(page, "OK, I Understand.")
-            await click_button(page, "Accept")
-            await click_button(page, "Accept Cookies")
-            await click_button(page, "No Thanks")
-            await page.keyboard.press("Escape")
-
-
-    except errors.TimeoutError as e:
-        await page.screenshot(path='{0}{1}.{2}.{3}.png'.format(pics_out_path, archive_id, url_id, date))
-        try:
-            await page.close()
-            await browser.close()
-        except:
-            await browser.close()
-        raise e
-
-    except Exception as e:
-        try:
-            await page.close()
-            await browser.close()
-        except:
-            await browser.close()
-        raise e
-        # https://github.com/GoogleChrome/puppeteer/issues/2269
-    else:
-        await page.screenshot(path='{0}{1}.{2}.{3}.png'.format(pics_out_path, archive_id, url_id, date))
-        try:
-            await page.close()
-            await browser.close()
-        except:
-            await browser.close()
-
-    try:
-        await page.close()
-        await browser.close()
-    except:
-        await browser.close()
+    own_pool = driver_pool is None
+    if own_pool:
+        driver_pool = WebDriverPool(1, 1, timeout_duration, page_settle=page_settle,
+                                    check_navigation=check_response)
 
-def selenium_screenshot(pics_out_path, archive_id, url_id, url, timeout_duration):
-    
-    import time
-    from selenium import webdriver
-    from selenium.webdriver.chrome.options import Options
-    import os
-
-    print("Loading Selenium")
-    options = webdriver.ChromeOptions()
-    options.headless = True
-    driver = webdriver.Chrome(options=options)
-    
+    site_status, site_message = "FAIL", "No response"
     try:
-       driver.get(url)
-       S = lambda X: driver.execute_script('return document.body.parentNode.scroll'+X)
-       driver.set_window_size(S('Width'),S('Height')) # May need manual adjustment 
-       output_file_name = pics_out_path+archive_id+"."+url_id+"."+date+".png"
-       print("Output file name: ", output_file_name)
-       driver.find_element_by_tag_name('body').screenshot(output_file_name)
-       print("Screenshot successful")
-       driver.quit()
-       return "Screenshot successful"
+        with driver_pool.driver() as driver:
+            driver.set_page_load_timeout(timeout_duration)
+            start = time.time()
+            try:
+                driver_pool.navigate(driver, url)
+            except Exception as e:
+                if check_response:
+                    site_status, site_message = navigation_status(url, error=e)
+                raise
+            loaded = time.time()
+            if check_response:
+                site_status, site_message = navigation_status(url, *driver_pool.navigation_response(driver))
+                if site_status == "FAIL":
+                    return site_status, site_message, "Screenshot unsuccessful"
+            settle_seconds, settled = driver_pool.page_settle.wait_selenium(driver)
+            rendering = time.time()
+            S = lambda X: driver.execute_script('return document.body.parentNode.scroll'+X)
+            driver.set_window_size(S('Width'),S('Height')) # May need manual adjustment
+            output_file_name = pics_out_path+archive_id+"."+url_id+"."+date+".png"
+            print("Output file name: ", output_file_name)
+            driver.find_element(By.TAG_NAME, 'body').screenshot(output_file_name)
+            log_timing(url, loaded - start, settle_seconds, settled, time.time() - rendering)
+        print("Screenshot successful")
+        screenshot_message = "Screenshot successful"
 
     except:  # unknown error
         logging.info("Screenshot unsuccessful")
         print("Screenshot unsuccessful")
-        return "Screenshot unsuccessful"
-    
+        screenshot_message = "Screenshot unsuccessful"
+
+    finally:
+        if own_pool:
+            driver_pool.close()
+
+    if check_response:
+        return site_status, site_message, screenshot_message
+    return screenshot_message
+
 
 def chrome_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration):
     # not fully implemented
@@ -323,19 +611,62 @@ def chrome_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_dura
         return "Screenshot unsuccessful"
 
 
-def cutycapt_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration):
-    command = "timeout {6}s xvfb-run -e /dev/stdout --server-args=\"-screen 0, 1024x768x24\" " \
-              "/usr/bin/cutycapt --url='{0}' --out={1}{2}.{3}.{4}.png --delay=2000 --max-wait={5} --private-browsing=on --plugins=off" \
-        .format(url, pics_out_path, archive_id, url_id, date, timeout_duration*1000, timeout_duration+10)
-    print(command)
+def cutycapt_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration, display_pool=None, page_settle=None):
+    """Take a screenshot with cutycapt.
+
+    Parameters
+    ----------
+    pics_out_path : str
+        Directory to output the screenshots.
+    archive_id : str
+        The archive ID.
+    url_id : str
+        The url ID.
+    date : str
+        The date of the archive capture.
+    url : str
+        The url to take a screenshot of.
+    timeout_duration : int
+        Duration before timeout when going to each website.
+    display_pool : XvfbPool
+        The running X displays to render on. None to start an X server with xvfb-run for this url.
+    page_settle : PageSettle
+        Gives the delay after the page loaded before the screenshot. None for 2 seconds.
+
+    Returns
+    -------
+    screenshot_message : str
+        Message indicating whether the screenshot was successful.
+
+    """
+    output_file_name = "{0}{1}.{2}.{3}.png".format(pics_out_path, archive_id, url_id, date)
+    delay = (page_settle or PageSettle()).fixed_delay_ms
+    c_out = None
+    start = time.time()
     try:
-        time.sleep(1)  # cutycapt needs to rest
-        c_out = os.system(command)
-        if (c_out == 0 or c_out == 31744):
+        if display_pool is None:
+            command = "timeout {3}s xvfb-run -a -e /dev/stdout --server-args=\"-screen 0, 1024x768x24\" " \
+                      "/usr/bin/cutycapt --url='{0}' --out={1} --delay={4} --max-wait={2} --private-browsing=on --plugins=off" \
+                .format(url, output_file_name, timeout_duration*1000, timeout_duration+10, delay)
+            print(command)
+            time.sleep(1)  # cutycapt needs to rest
+            c_out = os.system(command)
+            successful = (c_out == 0 or c_out == 31744)
+        else:
+            command = ["timeout", "{}s".format(timeout_duration+10), "/usr/bin/cutycapt", "--url=" + url,
+                       "--out=" + output_file_name, "--delay={}".format(delay), "--max-wait={}".format(timeout_duration*1000),
+                       "--private-browsing=on", "--plugins=off"]
+            with display_pool.display() as display:
+                print("DISPLAY={0} {1}".format(display, " ".join(command)))
+                c_out = subprocess.run(command, env=dict(os.environ, DISPLAY=display)).returncode
+            successful = (c_out == 0 or c_out == 124)    # 124 is the exit value of timeout, 31744 from os.system
+        logging.info("Timing {0}: load and render {1:.2f}s, fixed delay {2:.2f}s".format(
+            url, time.time() - start - delay / 1000, delay / 1000))
+
+        if successful:
             logging.info("Screenshot successful")
             print("Screenshot successful")
-            filename = archive_id+"."+url_id+"."+date+".png"
-            print(filename)
+            print(output_file_name)
             return "Screenshot successful"
         else:
             logging.info("Screenshot unsuccessful")
@@ -346,42 +677,12 @@ def cutycapt_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_du
         print(e)
         logging.info("Screenshot unsuccessful")
         print("Screenshot unsuccessful")
-        logging.info("process exit value: %d" % c_out)
-        print("process exit value: %d" % c_out)
+        logging.info("process exit value: {}".format(c_out))
+        print("process exit value: {}".format(c_out))
         return "Screenshot unsuccessful"
 
 
 
-
-
-async def click_button(page, button_text):
-    """Execute js script on page to click button
-
-    Parameters
-    ----------
-    page : pyppeteer.page.Page
-        The page to go through
-    button_text: str
-        Name of the button to click
-
-    References
-    ----------
-    .. [1] https://github.com/ukwa/webrender-puppeteer/blob/6fcc719d64dc19a4929c02d3a445a8283bee5195/renderer.js
-
-    Notes
-    -----
-    Right now only clicks popups and banners that are buttons, but some sites have banners with using a or wb_divs
-
-
-    """
-    await page.evaluate('''query => {
-      const elements = [...document.querySelectorAll('button')];
-      const targetElement = elements.find(e => e.innerText.toLowerCase().includes(query));
-      targetElement && targetElement.click();
-      }''', button_text.lower())
-
-
-
 def check_site_availability(url):
     """Run a request to see if the given url is available.
 
@@ -405,61 +706,40 @@ def check_site_availability(url):
     """
 
     try:
-        conn = urllib.request.urlopen(url)
-    except urllib.error.HTTPError as e:
-        # Return code error (e.g. 404, 501, ...)
-        try:
-            conn.close()
-        except:
-            print("Process close error")
-        finally:
-            error_message = 'HTTPError: {}'.format(e.code)
-            print(error_message)
-            logging.info(error_message)
-            return "FAIL", error_message
-    except urllib.error.URLError as e:
+        response = shared_client().probe(url)
+    except requests.exceptions.ConnectionError as e:
         # Not an HTTP-specific error (e.g. connection refused)
-        try:
-            conn.close()
-        except:
-            print("Process close error")
-        finally:
-            error_message = 'URLError: {}'.format(e.reason)
-            print(error_message)
-            logging.info(error_message)
-            return "FAIL", error_message
+        error_message = 'URLError: {}'.format(error_reason(e))
+        print(error_message)
+        logging.info(error_message)
+        return "FAIL", error_message
     except Exception as e:
         # other reasons such as "your connection is not secure"
-        try:
-            conn.close()
-        except:
-            print("Process close error")
-        finally:
-            print(e)
-            logging.info(e)
-            return "FAIL", e
+        print(e)
+        logging.info(e)
+        return "FAIL", e
     except:
         # broad exception for anything else
-        try:
-            conn.close()
-        except:
-            print("Process close error")
-        finally:
-            print("Unknown error")
-            logging.info("Unknown error")
-            return "FAIL", "Unknown error"
+        print("Unknown error")
+        logging.info("Unknown error")
+        return "FAIL", "Unknown error"
+
+    if response.status_code >= 400:
+        # Return code error (e.g. 404, 501, ...)
+        error_message = 'HTTPError: {}'.format(response.status_code)
+        print(error_message)
+        logging.info(error_message)
+        return "FAIL", error_message
 
     # check if redirected
-    if conn.geturl() != url:
-        print("Redirected to {}".format(conn.geturl()))
-        logging.info("Redirected to {}".format(conn.geturl()))
-        conn.close()
-        return "LIVE", "Redirected to {}".format(conn.geturl())
+    if response.history:
+        print("Redirected to {}".format(response.url))
+        logging.info("Redirected to {}".format(response.url))
+        return "LIVE", "Redirected to {}".format(response.url)
 
     # reaching this point means it received code 200
     print("Return code 200")
     logging.info("Return code 200")
-    conn.close()
     return "LIVE", "Return code 200"
 
 def set_up_logging(pics_out_path):
@@ -491,27 +771,88 @@ def signal_handler_sigint(sig, frame):
     raise Exception("User interrupted")
 
 
-def signal_handler_sigalrm(sig, frame):
-    # sigalrm handler for a rare asyncio invalid state error
-    raise TimeoutError("Timeout Error")
+def parse_args():
+    """Parses the arguments that split a run into shards
+
+    Returns
+    -------
+    args.shard : str
+        "i/n" to capture only shard i of n, ie: "2/8". None to capture every url.
+    args.shard_by : str
+        How the urls are split, "rows" or "host".
+    args.picsout : str
+        Directory to output the screenshots instead of archive_pics_dir, ie: a disk local to the node.
+
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shard", type=str, help="(optional) Capture only shard i of n, ie: --shard 2/8")
+    parser.add_argument("--shard-by", type=str, default="rows", choices=["rows", "host"],
+                        help="(optional) Split the urls by blocks of rows or by host. Default is rows")
+    parser.add_argument("--picsout", type=str, help="(optional) Directory to output the screenshots")
+
+    # the submit scripts still pass the old --csv, --indexcsv and --method arguments, the settings file replaced them
+    args, _ = parser.parse_known_args()
+
+    return args.shard, args.shard_by, args.picsout
 
 
 def main():
 
     signal.signal(signal.SIGINT, signal_handler_sigint)
-    signal.signal(signal.SIGALRM, signal_handler_sigalrm)
 
     import read_config_file
     import config
 
-    if not os.path.exists(config.archive_pics_dir):
-        os.makedirs(config.archive_pics_dir)
+    shard, shard_by, pics_dir = parse_args()
+    index_csv = config.archive_index_csv
+    if shard is not None:
+        shard = parse_shard(shard)
+        index_csv = shard_file_name(index_csv, shard)
+    if pics_dir is None:
+        pics_dir = config.archive_pics_dir
+    elif not pics_dir.endswith("/"):
+        pics_dir += "/"
 
-    print("Taking screenshots")
-    set_up_logging(config.archive_pics_dir)
-    screenshot_csv(config.archive_urls_csv, config.archive_index_csv, config.archive_pics_dir, config.a_method, config.a_timeout, [config.a_range_min, config.a_range_max], config.a_chrome_args, [config.a_screen_height, config.a_screen_width], config.a_keep_cookies)
+    if not os.path.exists(pics_dir):
+        os.makedirs(pics_dir)
 
-    print("The archive screenshots have been created in this directory: ", config.archive_pics_dir)
+    print("Taking screenshots")
+    set_up_logging(pics_dir)
+    request_filter = RequestFilter.from_settings(config.a_block_resource_types, config.a_block_url_patterns,
+                                                 config.a_allow_url_patterns)
+    page_settle = PageSettle(config.a_settle_quiet_ms, config.a_settle_max_wait_ms, config.a_cutycapt_delay)
+    driver_pool = None
+    if config.a_method == 3:
+        driver_pool = WebDriverPool(max(config.a_driver_pool_size, config.a_workers), config.a_driver_max_pages, config.a_timeout,
+                                    [config.a_screen_height, config.a_screen_width], request_filter, page_settle,
+                                    config.a_check_in_browser)
+    scheduler = None
+    if config.a_host_concurrency > 0 or config.a_host_rate > 0:
+        scheduler = HostScheduler(config.a_host_state_dir, config.a_host_concurrency, config.a_host_rate,
+                                  config.a_throttle_backoff, config.a_max_backoff)
+    retries = RetryQueue(config.a_max_attempts, config.a_retry_delay, config.a_max_retry_delay)
+    host_timeouts = None
+    if config.a_adaptive_timeout:
+        host_timeouts = HostTimeouts(pics_dir + "host_timeouts.json", config.a_min_timeout, config.a_max_timeout,
+                                     config.a_timeout_factor, config.a_fail_fast_after)
+    display_pool = None
+    if config.a_method == 2:
+        display_pool = XvfbPool.start_or_none(config.a_workers, [config.a_screen_height, config.a_screen_width])
+    try:
+        screenshot_csv(config.archive_urls_csv, index_csv, pics_dir, config.a_method, config.a_timeout, [config.a_range_min, config.a_range_max], config.a_chrome_args, [config.a_screen_height, config.a_screen_width], config.a_keep_cookies, driver_pool, config.a_workers, display_pool, config.a_completion_order, shard, shard_by, scheduler, config.a_interleave_hosts, retries, host_timeouts, request_filter, page_settle, config.a_check_in_browser)
+    finally:
+        if host_timeouts is not None:
+            host_timeouts.save()
+        if driver_pool is not None:
+            driver_pool.close()
+        if request_filter is not None:
+            print(request_filter.summary())
+            logging.info(request_filter.summary())
+        if display_pool is not None:
+            display_pool.close()
+
+    print("The archive screenshots have been created in this directory: ", pics_dir)
 
 
 if __name__ == "__main__":
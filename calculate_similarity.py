@@ -1,11 +1,30 @@
 import argparse
+import collections
 import csv
 import importlib
-from PIL import Image
+import multiprocessing
 from PIL import ImageChops
 import os
-from skimage import io
 import time
+import score_cache
+
+
+# similarity scores in the order of the output CSV columns
+METRICS = ["ssim", "mse", "percent", "phash", "hausdorff", "nrmse", "psnr"]
+
+# scores of two byte-identical screenshots
+IDENTICAL_SCORES = {"ssim": 1.0, "mse": 0.0, "percent": 100.0, "phash": 0.0, "dhash": 0.0, "hausdorff": 0.0,
+                    "nrmse": 0.0, "psnr": float("inf")}
+
+# scores that are skipped in tiered mode when the hash distance already tells the pair apart
+EXPENSIVE_METRICS = ["ssim", "hausdorff"]
+
+# scores that similarity_measures.calculate_error_metrics calculates together in one pass
+ERROR_METRICS = ["mse", "percent", "nrmse", "psnr"]
+
+# stored with each cached score, raise it when a change to similarity_measures changes the scores
+# so that the scores cached before it are calculated again
+SCORE_VERSION = 1
 
 
 def read_input_file(csv_in_name, curr_img_dir, arch_img_dir):
@@ -94,13 +113,336 @@ def is_monochromatic_image(img):
     return a == 0
 
 
-def open_images(current_image_name, archive_image_name):
-    current_image = io.imread(current_image_name)
-    archive_image = io.imread(archive_image_name)
-    return current_image, archive_image
+def is_monochromatic_array(array):
+    """Same as is_monochromatic_image on a decoded (height, width, channels) matrix, without making a copy"""
+    return bool((array.min(axis=(0, 1)) == array.max(axis=(0, 1))).all())
+
+
+def open_image(image_name, blank_image_list, cache=None, known_image=None):
+    """Decodes a screenshot once and checks whether it is blank.
+
+    Parameters
+    ----------
+    image_name : str
+        The screenshot file path.
+    blank_image_list : list
+        The file name is appended to this list if the screenshot is blank.
+    cache : score_cache.ScoreCache, optional
+        Where the result of the blank check is looked up and recorded.
+    known_image : similarity_measures.ScreenshotImage, optional
+        A screenshot that was already checked. If the file has the same content,
+        known_image is returned and nothing is decoded.
+
+    Returns
+    -------
+    image : similarity_measures.ScreenshotImage
+        The decoded screenshot, None if it is blank or could not be opened.
+
+    """
+    similarity_measures = importlib.import_module("similarity_measures")
+    try:
+        image = similarity_measures.ScreenshotImage(image_name)
+        if known_image is not None and image.data == known_image.data:
+            return known_image
+
+        is_blank = None
+        if cache is not None:
+            is_blank = cache.lookup_blank(image.content_hash)
+        if is_blank is None:
+            is_blank = is_monochromatic_array(image.array)
+            if cache is not None:
+                cache.record_blank(image.content_hash, is_blank)
+
+        if(is_blank):
+            print("Image: ", image_name+" is blank")
+            blank_image_list.append(image_name)
+            return None
+    except FileNotFoundError as e:
+        print("File not found", image_name);
+        return None
+    except IOError as e:
+
+        # filename not an image file
+        print(e);
+        print("File:    ", image_name, "is not an   image file")
+        return None
+    except:
+        print("Unknown error")
+        return None
+    return image
+
+
+def get_metric_parameters(metric, ssim_options=None):
+    """Returns the parameters of a metric that its cached scores are keyed by.
+
+    Parameters
+    ----------
+    metric : str
+        One of the names in METRICS.
+    ssim_options : dict, optional
+        The "gray", "width" and "window" arguments of similarity_measures.calculate_ssim.
+        The "engine" argument is left out, the engines give the same scores.
+
+    Returns
+    -------
+    parameters : str
+        SCORE_VERSION followed by the settings the score depends on.
+
+    """
+    similarity_measures = importlib.import_module("similarity_measures")
+
+    parameters = "version={}".format(SCORE_VERSION)
+    if metric == "ssim":
+        ssim_options = ssim_options or {}
+        if ssim_options.get("window", "uniform") == "gaussian":
+            parameters += ";win_size={};gaussian".format(similarity_measures.SSIM_GAUSSIAN_WIN_SIZE)
+        else:
+            parameters += ";win_size={}".format(similarity_measures.SSIM_WIN_SIZE)
+        if ssim_options.get("gray"):
+            parameters += ";gray"
+        if ssim_options.get("width"):
+            parameters += ";width={}".format(ssim_options["width"])
+    return parameters
+
+
+def calculate_metric(metric, current, archive, ssim_options=None, strip_height=0):
+    """Calculates one similarity score of a pair of decoded screenshots.
+
+    Parameters
+    ----------
+    metric : str
+        One of the names in METRICS, or "dhash".
+    current : similarity_measures.ScreenshotImage
+        The current website screenshot.
+    archive : similarity_measures.ScreenshotImage
+        The archive website screenshot.
+    ssim_options : dict, optional
+        Keyword arguments passed on to similarity_measures.calculate_ssim.
+    strip_height : int, optional
+        Passed on to calculate_ssim and calculate_hausdorff, 0 to score the whole screenshots.
+
+    Returns
+    -------
+    score : float
+        The similarity score.
+
+    """
+    similarity_measures = importlib.import_module("similarity_measures")
+
+    if metric == "ssim":
+        return similarity_measures.calculate_ssim(current.name, archive.name, current.array, archive.array, current.features,
+                                                  strip_height=strip_height, **(ssim_options or {}))
+    if metric == "mse":
+        return similarity_measures.calculate_mse(current.name, archive.name, current.array, archive.array)
+    if metric == "percent":
+        return similarity_measures.calculate_percent(current.name, archive.name, current.array, archive.array)
+    if metric == "phash":
+        return similarity_measures.calculate_phash(current.pil_image, archive.pil_image, current.features)
+    if metric == "dhash":
+        return similarity_measures.calculate_dhash(current.pil_image, archive.pil_image, current.features)
+    if metric == "hausdorff":
+        return similarity_measures.calculate_hausdorff(current.name, archive.name, current.array, archive.array, strip_height)
+    if metric == "nrmse":
+        return similarity_measures.calculate_nrmse(current.array, archive.array)
+    if metric == "psnr":
+        return similarity_measures.calculate_psnr(current.array, archive.array)
+    raise ValueError("Unknown similarity metric: {}".format(metric))
+
+
+def get_tier(distance, tier_settings):
+    """Sorts a pair of screenshots into a tier by the distance of their hashes.
+
+    Parameters
+    ----------
+    distance : float
+        The phash or dhash distance of the pair.
+    tier_settings : tuple
+        The hash ("phash" or "dhash"), the distance at or below which the pair is
+        near-identical and the distance at or above which the pair is different.
+
+    Returns
+    -------
+    tier : str
+        "near_identical", "different" or "full" when the expensive metrics are needed.
+
+    """
+    tier_hash, near_identical_distance, different_distance = tier_settings
+    if distance <= near_identical_distance:
+        return "near_identical"
+    if distance >= different_distance:
+        return "different"
+    return "full"
+
+
+def score_image_group(task):
+    """Calculates the scores of one current screenshot against all of its archive screenshots.
+
+    Parameters
+    ----------
+    task : tuple
+        The current screenshot file name, the list of its archive screenshot file names,
+        a dictionary with the parameters of each metric to calculate (see get_metric_parameters),
+        the score cache file, empty if scores are not cached, the tier settings (see get_tier),
+        None to calculate every metric of every pair, the SSIM options and the strip height (see find_scores).
+
+    Returns
+    -------
+    results : list
+        A (archive screenshot file name, scores, tier) tuple for each archive screenshot. scores
+        is None when one of the screenshots is blank or could not be opened, a skipped score is None.
+    blank_image_list : list
+        The file names of the blank screenshots found in the group.
+    pending : tuple
+        The new cache entries from score_cache.ScoreCache.take_pending, None without a cache.
+    counts : collections.Counter
+        How many scores were calculated, taken from the cache or known because both
+        screenshots were byte-identical, how many pairs fell in each tier, how many
+        expensive scores were skipped and the time spent calculating each metric.
+
+    Notes
+    -----
+    This runs in the worker processes when find_scores is given more than one worker, so
+    the current screenshot is decoded only once per group in whichever process scores it.
+
+    When more than one of the ERROR_METRICS is wanted, or the screenshots are compared in
+    strips, they are calculated together by similarity_measures.calculate_error_metrics
+    instead of one at a time, which never makes float64 copies of the screenshots.
 
+    """
+    similarity_measures = importlib.import_module("similarity_measures")
+    current_image_name, archive_image_list, metric_parameters, cache_file, tier_settings, ssim_options, strip_height = task
+    cache = score_cache.get_score_cache(cache_file)
+    results = []
+    blank_image_list = []
+    counts = collections.Counter()
+
+    lookup_parameters = dict(metric_parameters)
+    fuse_error_metrics = len([metric for metric in metric_parameters if metric in ERROR_METRICS]) > 1 or strip_height > 0
+    if tier_settings is not None:
+        lookup_parameters.setdefault(tier_settings[0], get_metric_parameters(tier_settings[0]))
+
+    # the current screenshot and the features derived from it are reused for all of its archive screenshots
+    current = open_image(current_image_name, blank_image_list, cache)
+
+    for archive_image_name in archive_image_list:
+        print(current_image_name, archive_image_name)
+        archive = open_image(archive_image_name, blank_image_list, cache, current)
+
+        if current is None or archive is None:
+            results.append((archive_image_name, None, None))
+            continue
+
+        if archive is current:
+            # byte-identical screenshots, nothing needs to be decoded or calculated
+            results.append((archive_image_name, [IDENTICAL_SCORES[metric] for metric in metric_parameters], "identical"))
+            counts["identical"] += len(metric_parameters)
+            counts["tier_identical"] += 1
+            continue
+
+        cached_scores = {}
+        if cache is not None:
+            cached_scores = cache.lookup_scores(current.content_hash, archive.content_hash, lookup_parameters)
+
+        pair_scores = {}
+        error_scores = {}
+
+        def get_score(metric):
+            if metric in pair_scores:
+                return pair_scores[metric]
+
+            if metric in cached_scores:
+                counts["cached"] += 1
+                score = cached_scores[metric]
+            else:
+                start = time.perf_counter()
+                if fuse_error_metrics and metric in ERROR_METRICS:
+                    # one pass over the pair gives all of the error metrics
+                    if not error_scores:
+                        error_scores.update(similarity_measures.calculate_error_metrics(current.array, archive.array))
+                    score = error_scores[metric]
+                else:
+                    score = calculate_metric(metric, current, archive, ssim_options, strip_height)
+                counts["seconds_" + metric] += time.perf_counter() - start
+                counts["timed_" + metric] += 1
+                counts["calculated"] += 1
+                if cache is not None:
+                    cache.record_score(current.content_hash, archive.content_hash, metric, lookup_parameters[metric], score)
+            pair_scores[metric] = score
+            return score
+
+        tier = None
+        skipped_metrics = []
+        if tier_settings is not None:
+            tier = get_tier(get_score(tier_settings[0]), tier_settings)
+            counts["tier_" + tier] += 1
+            if tier != "full":
+                skipped_metrics = EXPENSIVE_METRICS
+
+        scores = []
+        for metric in metric_parameters:
+            if metric in skipped_metrics and metric not in cached_scores:
+                scores.append(None)
+                counts["skipped_" + metric] += 1
+            else:
+                scores.append(get_score(metric))
+        results.append((archive_image_name, scores, tier))
+
+    pending = cache.take_pending() if cache is not None else None
+    return results, blank_image_list, pending, counts
+
+
+def score_image_groups(tasks, workers):
+    """Yields the result of score_image_group for each task, in the order of the tasks.
+
+    Parameters
+    ----------
+    tasks : iterable
+        The score_image_group tasks.
+    workers : int
+        Number of processes scoring the groups. 1 scores them in this process,
+        0 uses one process per CPU core.
 
-def find_scores(image_dict, url_name_dict, ssim_flag, mse_flag, hausdorff_flag, phash_flag, percent_flag, nrmse_flag, psnr_flag, csv_out_name, blank_csv_name, do_print):
+    """
+    if workers == 1:
+        for task in tasks:
+            yield score_image_group(task)
+    else:
+        with multiprocessing.Pool(workers or None) as pool:
+            yield from pool.imap(score_image_group, tasks)
+
+
+def print_tier_summary(totals):
+    """Prints how many pairs fell in each tier and how much calculation the tiers saved.
+
+    Parameters
+    ----------
+    totals : collections.Counter
+        The counts returned by score_image_group, added up over all groups.
+
+    Notes
+    -----
+    The time saved is estimated from the average time each skipped metric took on the
+    pairs where it was calculated in this run.
+
+    """
+    print("Pairs per tier - full: {0}, near identical: {1}, different: {2}, identical: {3}"
+          .format(totals["tier_full"], totals["tier_near_identical"], totals["tier_different"],
+                  totals["tier_identical"]))
+    saved_seconds = 0.0
+    for metric in EXPENSIVE_METRICS:
+        skipped = totals["skipped_" + metric]
+        if skipped == 0:
+            continue
+        if totals["timed_" + metric]:
+            average = totals["seconds_" + metric] / totals["timed_" + metric]
+            saved_seconds += skipped * average
+            print("Skipped {0} {1} calculations, about {2:.2f} seconds each".format(skipped, metric, average))
+        else:
+            print("Skipped {0} {1} calculations".format(skipped, metric))
+    print("Estimated calculation time saved in seconds: %.2f" % saved_seconds)
+
+
+def find_scores(image_dict, url_name_dict, ssim_flag, mse_flag, hausdorff_flag, phash_flag, percent_flag, nrmse_flag, psnr_flag, csv_out_name, blank_csv_name, do_print, workers=1, cache_file="", tier_settings=None, ssim_options=None, strip_height=0):
     """Calculates the image similarity scores of the given images
 
     Parameters
@@ -121,119 +463,83 @@ def find_scores(image_dict, url_name_dict, ssim_flag, mse_flag, hausdorff_flag,
         The output CSV file name.
     do_print : bool
         If True then the urls and file names and scores will be printed to stdout.
+    workers : int
+        Number of processes scoring the screenshots, 0 for one per CPU core. Each process
+        scores all the archive screenshots of a current screenshot, and the rows are written
+        here in the order of image_dict.
+    cache_file : str
+        SQLite file where scores are stored by the content of the screenshots, so that only
+        new pairs or metrics are calculated on the next run. Empty to calculate every score.
+    tier_settings : tuple
+        The hash ("phash" or "dhash") and the two distances used by get_tier. When given, the
+        hash distance of each pair is calculated first and the expensive metrics are skipped for
+        pairs that are near-identical or clearly different. The output gets a "tier" column and a
+        summary of the skipped work is printed. None to calculate every metric of every pair.
+    ssim_options : dict
+        The "gray", "width", "window" and "engine" arguments of similarity_measures.calculate_ssim. When
+        they differ from the full resolution colour SSIM with a uniform window, the mode is added
+        to the name of the SSIM column, ie: ssim_gray_w256_score. None for the defaults.
+    strip_height : int
+        Screenshots taller than this are compared in horizontal strips of this many rows, so
+        that memory use does not grow with the height of full page screenshots. The scores
+        are the same as on the whole screenshots. 0 to always compare whole screenshots.
 
     """
     similarity_measures = importlib.import_module("similarity_measures")
+    flags = [ssim_flag, mse_flag, percent_flag, phash_flag, hausdorff_flag, nrmse_flag, psnr_flag]
+    metrics = [metric for metric, flag in zip(METRICS, flags) if flag]
+    metric_parameters = {metric: get_metric_parameters(metric, ssim_options) for metric in metrics}
+    cache = score_cache.get_score_cache(cache_file)
+    totals = collections.Counter()
 
     with open(csv_out_name, 'w+') as csv_file_out, open(blank_csv_name, 'w+') as blank_file_out:
         csv_writer = csv.writer(csv_file_out, delimiter=',', quoting=csv.QUOTE_ALL)
         blank_csv_writer = csv.writer(blank_file_out, delimiter=',', quoting=csv.QUOTE_ALL)
 
         header = ["current_url", "archive_url", "current_file_name", "archive_file_name"]
-        if ssim_flag:
-            header.append("ssim_score")
-        if mse_flag:
-            header.append("mse_score")
-        if percent_flag:
-            header.append("percent_score")
-        if phash_flag:
-            header.append("phash_score")
-        if hausdorff_flag:
-            header.append("hausdorff_score")
-        if nrmse_flag:
-            header.append("nrmse_score")
-        if psnr_flag:
-            header.append("psnr_score")
+        ssim_label = similarity_measures.ssim_mode_label(**(ssim_options or {}))
+        for metric in metrics:
+            if metric == "ssim" and ssim_label:
+                header.append("ssim_" + ssim_label + "_score")
+            else:
+                header.append(metric + "_score")
+        if tier_settings is not None:
+            header.append("tier")
         csv_writer.writerow(header)
 
         blank_header = ["blank_image_file_name"]
         blank_csv_writer.writerow(blank_header)
 
+        tasks = ((current_image_name, archive_image_list, metric_parameters, cache_file, tier_settings, ssim_options, strip_height)
+                 for current_image_name, archive_image_list in image_dict.items())
+
+        for current_image_name, (results, blank_image_list, pending, counts) in zip(image_dict, score_image_groups(tasks, workers)):
+            if cache is not None:
+                cache.write_pending(pending)
+            totals.update(counts)
+
+            for blank_image_name in blank_image_list:
+                blank_csv_writer.writerow([blank_image_name])
+
+            for archive_image_name, scores, tier in results:
+                if scores is None:
+                    continue
 
-        for current_image_name, archive_image_list in image_dict.items():
-            for archive_image_name in archive_image_list:
                 output = [url_name_dict[current_image_name], url_name_dict[archive_image_name],
                           current_image_name, archive_image_name]
+                # truncate to 2 decimal places, skipped scores are left empty
+                output.extend("" if score is None else "%.2f" % score for score in scores)
+                if tier_settings is not None:
+                    output.append(tier)
+                csv_writer.writerow(output)
+
+                if do_print:
+                    print(", ".join(output[2:]))
 
-                is_valid = True;
-
-                image_name_pair = [current_image_name, archive_image_name];
-
-                for image_name in image_name_pair :
-                    try:
-                        print(current_image_name, archive_image_name)
-                        im =    Image.open(image_name)
-                        if(is_monochromatic_image(im)):
-                            print("Image: ", image_name+" is blank")
-                            csv_output = [image_name];
-                            blank_csv_writer.writerow(csv_output);
-                            is_valid = False;
-                    except FileNotFoundError as e:
-                        is_valid = False;
-                        print("File not found", image_name);
-                    except IOError as e:
-                        
-                        # filename not an image file
-                        print(e);
-                        print("File:    ", image_name, "is not an   image file")
-                        is_valid = False;
-                    except:
-                        print("Unknown error")
-                        is_valid = False;
-
-
-
-                if is_valid:
-                    
-                    result = open_images(current_image_name, archive_image_name)
-                    current_image = result[0]
-                    archive_image = result[1]
-                    print("Results: ")
-                    
-                    
-                    if ssim_flag:
-                        ssim_score = similarity_measures.calculate_ssim(current_image_name, archive_image_name, current_image, archive_image)
-                        if ssim_score is None:
-                            continue
-                        else: 
-                            output.append("%.2f" % ssim_score)   # truncate to 2 decimal places
-                    if mse_flag:
-                        mse_score = similarity_measures.calculate_mse(current_image_name, archive_image_name, current_image, archive_image)
-                        output.append("%.2f" % mse_score)
-                    if percent_flag:
-                        percent_score = similarity_measures.calculate_percent(current_image_name, archive_image_name, current_image, archive_image)
-                        output.append("%.2f" % percent_score)
-                    if phash_flag:
-                        phash_score = similarity_measures.calculate_phash(current_image_name, archive_image_name)
-                        output.append("%.2f" % phash_score)
-                    if hausdorff_flag:
-                        hausdorff_score = similarity_measures.calculate_hausdorff(current_image_name, archive_image_name, current_image, archive_image)
-                        output.append("%.2f" % hausdorff_score)
-                    if nrmse_flag:
-                        nrmse_score = similarity_measures.calculate_nrmse(current_image, archive_image)
-                        output.append("%.2f" % nrmse_score)
-                    if psnr_flag:
-                        psnr_score = similarity_measures.calculate_psnr(current_image, archive_image)
-                        output.append("%.2f" % psnr_score)
-                    csv_writer.writerow(output)
-
-                    if do_print:
-                        print("{0}, {1}".format(output[2], output[3]), end='')
-                        if ssim_flag:
-                            print(", %.2f" % ssim_score, end='')
-                        if mse_flag:
-                            print(", %.2f" % mse_score, end='')
-                        if percent_flag:
-                            print(", %.2f" % percent_score, end='')
-                        if phash_flag:
-                            print(", %.2f" % phash_score, end='')
-                        if hausdorff_flag:
-                            print(", %.2f" % hausdorff_score, end='')
-                        if nrmse_flag:
-                            print(", %.2f" % nrmse_score, end='')
-                        if psnr_flag:
-                            print(", %.2f" % psnr_score, end='')
-                        print('\n', end='')
+    print("Scores calculated: {0}, taken from the cache: {1}, of identical screenshots: {2}"
+          .format(totals["calculated"], totals["cached"], totals["identical"]))
+    if tier_settings is not None:
+        print_tier_summary(totals)
 
 
 def parse_args():
@@ -307,10 +613,18 @@ def main():
     print("Reading the input files ...")
     image_dict, url_name_dict = read_input_file(config.file_names_csv, config.current_pics_dir, config.archive_pics_dir)
 
-    find_scores(image_dict, url_name_dict, config.ssim, config.mse, config.hausdorff, config.phash, config.percent, config.nrmse, config.psnr, config.scores_file_csv, config.blank_file_csv, config.print)
+    tier_settings = None
+    if config.tiered:
+        tier_settings = (config.tier_hash, config.tier_near_identical, config.tier_different)
+
+    ssim_options = {"gray": config.ssim_gray, "width": config.ssim_width, "window": config.ssim_window,
+                    "engine": config.ssim_engine}
+
+    find_scores(image_dict, url_name_dict, config.ssim, config.mse, config.hausdorff, config.phash, config.percent, config.nrmse, config.psnr, config.scores_file_csv, config.blank_file_csv, config.print, config.workers, config.score_cache_file, tier_settings, ssim_options, config.strip_height)
     print("Finished calculating similarity scores")
     end = time.time()
     print("Elapsed time in seconds: ", end - start)
 
 
-main()
+if __name__ == "__main__":
+    main()
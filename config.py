@@ -22,6 +22,25 @@ except ImportError:
 
 
 
+def get_json_list(config, sect, option, fallback):
+    """Returns an option holding a JSON list, ie: ["--no-sandbox", "--incognito"].
+
+    A missing or empty option gives fallback. A value that is not a JSON list raises
+    configparser.Error naming the option, instead of being ignored.
+
+    """
+    value = config.get(sect, option, fallback='').strip()
+    if not value:
+        return fallback
+    try:
+        parsed = json.loads(value)
+    except json.JSONDecodeError as e:
+        raise configparser.Error("{0} in screenshot_compare.ini is not valid JSON: {1}".format(option, e))
+    if not isinstance(parsed, list):
+        raise configparser.Error("{0} in screenshot_compare.ini must be a JSON list".format(option))
+    return parsed
+
+
 def load_config():
     # 'Safe' is preferred, according to docs
     config = configparser.SafeConfigParser()
@@ -47,7 +66,33 @@ def load_config():
     globals()['c_screen_width'] = config.getint(sect, 'c_screen_width')
     globals()['c_timeout'] = config.getint(sect, 'c_timeout')
     globals()['c_keep_cookies'] = config.get(sect, 'c_keep_cookies')
-    globals()['c_chrome_args'] = config.get(sect, 'c_chrome_args')
+    # chrome arguments are a JSON list, ie: ["--no-sandbox", "--incognito"]
+    globals()['c_chrome_args'] = get_json_list(config, sect, 'c_chrome_args', None)
+    globals()['c_workers'] = config.getint(sect, 'c_workers', fallback=1)
+    globals()['c_completion_order'] = config.getboolean(sect, 'c_completion_order', fallback=False)
+    globals()['c_interleave_hosts'] = config.getboolean(sect, 'c_interleave_hosts', fallback=False)
+    globals()['c_host_concurrency'] = config.getint(sect, 'c_host_concurrency', fallback=0)
+    globals()['c_host_rate'] = config.getfloat(sect, 'c_host_rate', fallback=0)
+    globals()['c_throttle_backoff'] = config.getint(sect, 'c_throttle_backoff', fallback=30)
+    globals()['c_max_backoff'] = config.getint(sect, 'c_max_backoff', fallback=600)
+    globals()['c_host_state_dir'] = config.get(sect, 'c_host_state_dir', fallback=None)
+    globals()['c_max_attempts'] = config.getint(sect, 'c_max_attempts', fallback=1)
+    globals()['c_retry_delay'] = config.getint(sect, 'c_retry_delay', fallback=30)
+    globals()['c_max_retry_delay'] = config.getint(sect, 'c_max_retry_delay', fallback=600)
+    globals()['c_adaptive_timeout'] = config.getboolean(sect, 'c_adaptive_timeout', fallback=False)
+    globals()['c_min_timeout'] = config.getint(sect, 'c_min_timeout', fallback=5)
+    globals()['c_max_timeout'] = config.getint(sect, 'c_max_timeout', fallback=120)
+    globals()['c_timeout_factor'] = config.getfloat(sect, 'c_timeout_factor', fallback=2.0)
+    globals()['c_fail_fast_after'] = config.getint(sect, 'c_fail_fast_after', fallback=3)
+    globals()['c_block_resource_types'] = get_json_list(config, sect, 'c_block_resource_types', [])
+    globals()['c_block_url_patterns'] = get_json_list(config, sect, 'c_block_url_patterns', [])
+    globals()['c_allow_url_patterns'] = get_json_list(config, sect, 'c_allow_url_patterns', [])
+    globals()['c_settle_quiet_ms'] = config.getint(sect, 'c_settle_quiet_ms', fallback=500)
+    globals()['c_settle_max_wait_ms'] = config.getint(sect, 'c_settle_max_wait_ms', fallback=10000)
+    globals()['c_cutycapt_delay'] = config.getint(sect, 'c_cutycapt_delay', fallback=2000)
+    globals()['c_check_in_browser'] = config.getboolean(sect, 'c_check_in_browser', fallback=False)
+    globals()['c_driver_pool_size'] = config.getint(sect, 'c_driver_pool_size', fallback=1)
+    globals()['c_driver_max_pages'] = config.getint(sect, 'c_driver_max_pages', fallback=50)
 
     # Range could be null
     try:
@@ -68,7 +113,33 @@ def load_config():
     globals()['a_screen_width'] = config.getint(sect, 'a_screen_width')
     globals()['a_timeout'] = config.getint(sect, 'a_timeout')
     globals()['a_keep_cookies'] = config.get(sect, 'a_keep_cookies')
-    globals()['a_chrome_args'] = config.get(sect, 'a_chrome_args')
+    # chrome arguments are a JSON list, ie: ["--no-sandbox", "--incognito"]
+    globals()['a_chrome_args'] = get_json_list(config, sect, 'a_chrome_args', None)
+    globals()['a_workers'] = config.getint(sect, 'a_workers', fallback=1)
+    globals()['a_completion_order'] = config.getboolean(sect, 'a_completion_order', fallback=False)
+    globals()['a_interleave_hosts'] = config.getboolean(sect, 'a_interleave_hosts', fallback=False)
+    globals()['a_host_concurrency'] = config.getint(sect, 'a_host_concurrency', fallback=0)
+    globals()['a_host_rate'] = config.getfloat(sect, 'a_host_rate', fallback=0)
+    globals()['a_throttle_backoff'] = config.getint(sect, 'a_throttle_backoff', fallback=30)
+    globals()['a_max_backoff'] = config.getint(sect, 'a_max_backoff', fallback=600)
+    globals()['a_host_state_dir'] = config.get(sect, 'a_host_state_dir', fallback=None)
+    globals()['a_max_attempts'] = config.getint(sect, 'a_max_attempts', fallback=1)
+    globals()['a_retry_delay'] = config.getint(sect, 'a_retry_delay', fallback=30)
+    globals()['a_max_retry_delay'] = config.getint(sect, 'a_max_retry_delay', fallback=600)
+    globals()['a_adaptive_timeout'] = config.getboolean(sect, 'a_adaptive_timeout', fallback=False)
+    globals()['a_min_timeout'] = config.getint(sect, 'a_min_timeout', fallback=5)
+    globals()['a_max_timeout'] = config.getint(sect, 'a_max_timeout', fallback=120)
+    globals()['a_timeout_factor'] = config.getfloat(sect, 'a_timeout_factor', fallback=2.0)
+    globals()['a_fail_fast_after'] = config.getint(sect, 'a_fail_fast_after', fallback=3)
+    globals()['a_block_resource_types'] = get_json_list(config, sect, 'a_block_resource_types', [])
+    globals()['a_block_url_patterns'] = get_json_list(config, sect, 'a_block_url_patterns', [])
+    globals()['a_allow_url_patterns'] = get_json_list(config, sect, 'a_allow_url_patterns', [])
+    globals()['a_settle_quiet_ms'] = config.getint(sect, 'a_settle_quiet_ms', fallback=500)
+    globals()['a_settle_max_wait_ms'] = config.getint(sect, 'a_settle_max_wait_ms', fallback=10000)
+    globals()['a_cutycapt_delay'] = config.getint(sect, 'a_cutycapt_delay', fallback=2000)
+    globals()['a_check_in_browser'] = config.getboolean(sect, 'a_check_in_browser', fallback=False)
+    globals()['a_driver_pool_size'] = config.getint(sect, 'a_driver_pool_size', fallback=1)
+    globals()['a_driver_max_pages'] = config.getint(sect, 'a_driver_max_pages', fallback=50)
 
     # Range could be null
     try:
@@ -109,6 +180,17 @@ def load_config():
     globals()['blank_file_csv'] = config.get(sect, 'blank_file_csv')
     globals()['similarity_print'] = config.getboolean(sect, 'similarity_print')
     globals()['print'] = config.getboolean(sect, 'print')
+    globals()['workers'] = config.getint(sect, 'workers', fallback=1)
+    globals()['score_cache_file'] = config.get(sect, 'score_cache_file', fallback='')
+    globals()['tiered'] = config.getboolean(sect, 'tiered', fallback=False)
+    globals()['tier_hash'] = config.get(sect, 'tier_hash', fallback='phash')
+    globals()['tier_near_identical'] = config.getint(sect, 'tier_near_identical', fallback=4)
+    globals()['tier_different'] = config.getint(sect, 'tier_different', fallback=24)
+    globals()['ssim_gray'] = config.getboolean(sect, 'ssim_gray', fallback=False)
+    globals()['ssim_width'] = config.getint(sect, 'ssim_width', fallback=0)
+    globals()['ssim_window'] = config.get(sect, 'ssim_window', fallback='uniform')
+    globals()['ssim_engine'] = config.get(sect, 'ssim_engine', fallback='numpy')
+    globals()['strip_height'] = config.getint(sect, 'strip_height', fallback=0)
 
     sect = 'crop_banners_from_images'
     globals()['pics_archived_banners_dir'] = config.get(sect, 'pics_archived_banners_dir')
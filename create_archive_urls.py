@@ -2,8 +2,10 @@
 import argparse
 import sqlite3
 import csv
-import requests
+import sys
 from bs4 import BeautifulSoup
+sys.path.insert(0, './utils/')
+from http_client_mod import shared_client
 
 def create_with_csv(csv_out_name, csv_in_name, remove_banner):
     """Finds the archive urls using the input csv file with current urls, and outputs it into a csv.
@@ -40,7 +42,7 @@ def create_with_csv(csv_out_name, csv_in_name, remove_banner):
                 print("url #" + archive_url)
 
                 found = False  # next 15 lines just goes through the html to find the urls
-                page = requests.get(archive_url)
+                page = shared_client().get(archive_url)    # keeps the connection to the archive open between urls
                 soup = BeautifulSoup(page.content, features='html.parser')
                 for htmltd in soup.findAll('td'):
                     htmlclass = htmltd.get('class')
@@ -0,0 +1,139 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+sys.path.insert(0, './utils/')
+from capture_journal_mod import read_journal
+from shard_mod import shard_file_name
+
+
+def merge_shards(index_csv, pics_out_path, shard_count, move=False):
+    """Combines the index CSVs of the shards of a run and gathers their screenshots in one directory
+
+    Parameters
+    ----------
+    index_csv : str
+        The index CSV of the whole run. The shard index CSVs are found next to it, see shard_mod.shard_file_name.
+    pics_out_path : str
+        Directory the screenshots of every shard end up in.
+    shard_count : int
+        The number of shards of the run.
+    move : bool
+        Move the screenshots instead of hard linking them.
+
+    Notes
+    -----
+    The journal of each shard is its manifest: it gives the screenshot file of every row, so
+    no directory is listed or globbed. A hard link or a move within one file system costs no
+    copy of the screenshot; a file on another file system is copied, or moved, once.
+
+    """
+    gathered = 0
+    header_written = False
+    with open(index_csv, 'w+') as csv_file_out:
+        csv_writer = csv.writer(csv_file_out, delimiter=',', quoting=csv.QUOTE_ALL)
+        for shard_number in range(1, shard_count + 1):
+            shard_csv = shard_file_name(index_csv, (shard_number, shard_count))
+            if not os.path.exists(shard_csv):
+                print("Shard {0} of {1} is missing: {2}".format(shard_number, shard_count, shard_csv))
+                continue
+
+            manifest = {}
+            if os.path.exists(shard_csv + ".journal"):
+                manifest = read_journal(shard_csv + ".journal")
+            else:
+                print("{} has no journal, its screenshots are left where they are".format(shard_csv))
+
+            with open(shard_csv, 'r') as csv_file_in:
+                csv_reader = csv.reader(csv_file_in)
+                header = next(csv_reader)
+                if not header_written:
+                    csv_writer.writerow(header)
+                    header_written = True
+                key_columns = 3 if "date" in header else 2  # archive rows are keyed by their date as well
+
+                for line in csv_reader:
+                    csv_writer.writerow(line)
+                    entry = manifest.get(tuple(line[:key_columns]))
+                    if entry is not None and gather_screenshot(entry["file"], pics_out_path, move):
+                        gathered += 1
+
+    print("{0} screenshots {1} into {2}".format(gathered, "moved" if move else "linked", pics_out_path))
+
+
+def gather_screenshot(file_name, pics_out_path, move):
+    """Puts a screenshot into pics_out_path under the same name.
+
+    Returns
+    -------
+    gathered : bool
+        False if there is no such screenshot, or it already is in pics_out_path.
+
+    """
+    target = os.path.join(pics_out_path, os.path.basename(file_name))
+    if not os.path.exists(file_name):
+        return False
+    if os.path.exists(target) and os.path.samefile(file_name, target):
+        return False
+
+    if move:
+        shutil.move(file_name, target)  # a rename on the same file system
+        return True
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(file_name, target)
+    except OSError:
+        shutil.copy2(file_name, target)  # hard links cannot cross file systems
+    return True
+
+
+def parse_args():
+    """Parses the arguments of the merge
+
+    Returns
+    -------
+    args.shards : int
+        The number of shards of the run.
+    args.current : bool
+        Whether to merge the shards of current_screenshot.py instead of archive_screenshot.py.
+    args.picsout : str
+        Directory to gather the screenshots in instead of the pics directory of the settings file.
+    args.move : bool
+        Whether to move the screenshots instead of hard linking them.
+
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, required=True, help="The number of shards of the run")
+    parser.add_argument("--current", action='store_true', help="(optional) Include to merge current screenshot shards")
+    parser.add_argument("--picsout", type=str, help="(optional) Directory to gather the screenshots in")
+    parser.add_argument("--move", action='store_true', help="(optional) Include to move instead of hard link")
+
+    args = parser.parse_args()
+
+    return args.shards, args.current, args.picsout, args.move
+
+
+def main():
+    shard_count, current, pics_dir, move = parse_args()
+
+    import read_config_file
+    import config
+
+    if current:
+        index_csv, default_pics_dir = config.current_index_csv, config.current_pics_dir
+    else:
+        index_csv, default_pics_dir = config.archive_index_csv, config.archive_pics_dir
+    if pics_dir is None:
+        pics_dir = default_pics_dir
+    if not os.path.exists(pics_dir):
+        os.makedirs(pics_dir)
+
+    merge_shards(index_csv, pics_dir, shard_count, move)
+    print("The merged index is in", index_csv)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""On-disk store of similarity scores used by calculate_similarity.py.
+
+Scores are keyed by the content hash of the current screenshot, the content hash of the
+archive screenshot, the metric name and the metric parameters, so a pair is only scored
+again when one of its screenshots or the way the metric is calculated changes. Whether
+a screenshot is blank is stored by its content hash as well.
+
+"""
+
+import os
+import sqlite3
+
+
+_open_caches = {}
+
+
+class ScoreCache:
+    """A SQLite database holding previously calculated similarity scores.
+
+    Parameters
+    ----------
+    cache_file : str
+        The database file, created if it does not exist.
+
+    Notes
+    -----
+    A connection cannot be shared across fork, so each process opens its own with
+    get_score_cache. Lookups can be made from any process. New values are only buffered by record_score
+    and record_blank; take_pending hands them over so that a single process writes them
+    with write_pending.
+
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self.connection = sqlite3.connect(cache_file, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS scores (current_hash TEXT, archive_hash TEXT, "
+                                "metric TEXT, parameters TEXT, score REAL, "
+                                "PRIMARY KEY (current_hash, archive_hash, metric, parameters))")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS blank (image_hash TEXT PRIMARY KEY, is_blank INTEGER)")
+        self.connection.commit()
+        self.pending_scores = []
+        self.pending_blanks = []
+
+    def lookup_scores(self, current_hash, archive_hash, metric_parameters):
+        """Finds the cached scores of a pair of screenshots.
+
+        Parameters
+        ----------
+        current_hash : str
+            Content hash of the current screenshot.
+        archive_hash : str
+            Content hash of the archive screenshot.
+        metric_parameters : dict
+            The parameters of each metric that is wanted, ie: {"ssim": "version=1;win_size=7", "mse": "version=1"}
+
+        Returns
+        -------
+        scores : dict
+            The cached score of each metric that was found.
+
+        """
+        scores = {}
+        cursor = self.connection.execute("SELECT metric, parameters, score FROM scores "
+                                         "WHERE current_hash = ? AND archive_hash = ?", (current_hash, archive_hash))
+        for metric, parameters, score in cursor:
+            if score is not None and metric_parameters.get(metric) == parameters:
+                scores[metric] = score
+        return scores
+
+    def lookup_blank(self, image_hash):
+        """Returns True or False if it is known whether the screenshot is blank, None otherwise."""
+        row = self.connection.execute("SELECT is_blank FROM blank WHERE image_hash = ?", (image_hash,)).fetchone()
+        if row is None:
+            return None
+        return bool(row[0])
+
+    def record_score(self, current_hash, archive_hash, metric, parameters, score):
+        self.pending_scores.append((current_hash, archive_hash, metric, parameters, float(score)))
+
+    def record_blank(self, image_hash, is_blank):
+        self.pending_blanks.append((image_hash, int(is_blank)))
+
+    def take_pending(self):
+        """Returns and clears the scores and blank checks recorded since the last call."""
+        pending = (self.pending_scores, self.pending_blanks)
+        self.pending_scores = []
+        self.pending_blanks = []
+        return pending
+
+    def write_pending(self, pending):
+        """Stores values returned by take_pending, possibly from another process."""
+        pending_scores, pending_blanks = pending
+        if not pending_scores and not pending_blanks:
+            return
+        with self.connection:
+            self.connection.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?)", pending_scores)
+            self.connection.executemany("INSERT OR REPLACE INTO blank VALUES (?, ?)", pending_blanks)
+
+
+def get_score_cache(cache_file):
+    """Returns the ScoreCache of this process for the given file, None if cache_file is empty.
+
+    The caches are kept by process id, so a worker forked after its parent opened the file
+    opens its own connection instead of using the one it inherited.
+
+    """
+    if not cache_file:
+        return None
+    key = (os.getpid(), cache_file)
+    if key not in _open_caches:
+        _open_caches[key] = ScoreCache(cache_file)
+    return _open_caches[key]
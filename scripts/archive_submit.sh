@@ -19,7 +19,7 @@ current_urls_path=        #index/current_urls.csv
 pics_current_path=        #pics_current/
 current_index_path=       #index/current_index.csv
 
-# REQUIRED path to a directory to store all output. the index folder and the pics_archive_* folders will be created here, and the index files and screenshots will then be put into those folders
+# REQUIRED path to a directory to store all output. the index folder will be created here, and the index files will then be put into that folder
 working_directory=        #./
 
 # REQUIRED number of instances of archive_screenshot.py to be run at once, recommended 5
@@ -35,48 +35,30 @@ num_instances=5
 # creating archive_urls.csv
 python3 "$scripts_path"/create_archive_urls.py --csv="$current_urls_path" --out="$working_directory"index/archive_urls.csv
 
-# number of lines in archive_urls.csv rounded up to the nearest 1000 
-max_num_lines=$(( $(( $(( $( wc -l < "$working_directory"/index/archive_urls.csv ) / 1000 )) + 1 )) * 1000 ))
-
-# make the folders for batches, no action is done if folders exists already
-# if folder contains files of the same name, they may be over written
-mkdir "$working_directory"/pics_archive_combined
-counter=1000
-while [ $counter -le "$max_num_lines" ]
-do
-    mkdir "$working_directory"/pics_archive_$counter
-    counter=$(($counter + 1000))                                                                                                                    
-done 
-
-
-# running the screenshotting code
-# awaits at a certain number of instances and at the last instance
-counter=1000
-while [ $counter -le "$max_num_lines" ]
+# running the screenshotting code, each instance captures one shard of archive_urls.csv
+# --shard-by host keeps all the urls of a site in one shard, use --shard-by rows to split by lines instead
+# each shard writes archive_index.shard<i>of<n>.csv and its journal next to archive_index_csv of screenshot_compare.ini
+# an instance that was stopped can be run again with the same --shard and continues where it stopped
+counter=1
+while [ $counter -le "$num_instances" ]
 do
-    if [ $(( $counter % ( $(($num_instances * 1000)) ) )) -eq 0 ] || [ $counter -eq "$max_num_lines" ]
-    then
-        python3 "$scripts_path"/archive_screenshot.py --csv="$working_directory"/index/archive_urls.csv --indexcsv="$working_directory"/index/archive_index_$counter.csv --picsout="$working_directory"/pics_archive_$counter --method=1 --range=$(($counter - 999)),$counter --banner
-    else
-        python3 "$scripts_path"/archive_screenshot.py --csv="$working_directory"/index/archive_urls.csv --indexcsv="$working_directory"/index/archive_index_$counter.csv --picsout="$working_directory"/pics_archive_$counter --method=1 --range=$(($counter - 999)),$counter --banner &
-    fi
-
-    counter=$(($counter + 1000))
+    python3 "$scripts_path"/archive_screenshot.py --shard=$counter/$num_instances --shard-by=host &
+    counter=$(($counter + 1))
 done
+wait
 
-# move screenshots into one folder, concat all index to one file
-counter=1000
-touch "$working_directory"/index/archive_index_combined.csv
-sed -n 1p "$working_directory"/index/archive_index_$counter.csv > "$working_directory"/index/archive_index_combined.csv
+# combine the shard index files into archive_index_csv, and hard link the screenshots into archive_pics_dir
+# the journals list every screenshot, so nothing is copied or globbed
+python3 "$scripts_path"/merge_shards.py --shards=$num_instances
 
-while [ $counter -le "$max_num_lines" ]
-do
-    sed -n 2,1005p "$working_directory"/index/archive_index_$counter.csv >> "$working_directory"/index/archive_index_combined.csv
-    cp "$working_directory"/pics_archive_$counter/*.png "$working_directory"/pics_archive_combined
-    counter=$(($counter + 1000))
-done
+# the merged index and screenshots are where screenshot_compare.ini puts them, read them from the same settings
+config_value() {
+    python3 -c "import sys; sys.path.insert(0, sys.argv[1]); import config; config.load_config(); print(getattr(config, sys.argv[2]))" "$scripts_path" "$1"
+}
+archive_index_csv=$(config_value archive_index_csv)
+archive_pics_dir=$(config_value archive_pics_dir)
 
 
 # comparison code
-python3 "$scripts_path"/get_file_names.py --currcsv="$current_index_path" --archcsv="$working_directory"/index/archive_index_combined.csv --out="$working_directory"/index/filenames.csv
-python3 "$scripts_path"/calculate_similarity.py --csv="$working_directory"/index/filenames.csv --currdir="$pics_current_path" --archdir="$working_directory"/pics_archive_combined --out="$working_directory"/index/scores.csv --ssim --mse --vec
+python3 "$scripts_path"/get_file_names.py --currcsv="$current_index_path" --archcsv="$archive_index_csv" --out="$working_directory"/index/filenames.csv
+python3 "$scripts_path"/calculate_similarity.py --csv="$working_directory"/index/filenames.csv --currdir="$pics_current_path" --archdir="$archive_pics_dir" --out="$working_directory"/index/scores.csv --ssim --mse --vec
@@ -25,24 +25,110 @@ but with very different mean structural similarity indices.
        python calculate_similarity.py --csv=2217/index/filenames.csv --cpics=2217/pics_current --apics=2217/pics_archive --out=2217/index/output.txt --ssim --print
 """
 
+import hashlib
+import io
+
 import numpy as np
 import cv2
+from scipy.ndimage import gaussian_filter, uniform_filter
+from scipy.spatial import cKDTree
 
 from skimage import img_as_float
 #from skimage.measure import compare_ssim as ssim
 from skimage.metrics import structural_similarity as ssim
-from skimage import io
 from skimage.metrics import hausdorff_distance
 from skimage.metrics import normalized_root_mse
 from skimage.metrics import peak_signal_noise_ratio
 from skimage.metrics import mean_squared_error
+from skimage.util.dtype import dtype_range
 
 from PIL import Image, ImageFile
 import imagehash
 
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
 
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+SSIM_WIN_SIZE = 7
+SSIM_K1 = 0.01
+SSIM_K2 = 0.03
+# gaussian window of Wang et al., truncated like skimage does to an 11 x 11 window
+SSIM_SIGMA = 1.5
+SSIM_TRUNCATE = 3.5
+SSIM_GAUSSIAN_WIN_SIZE = 2 * int(SSIM_TRUNCATE * SSIM_SIGMA + 0.5) + 1
+
+# rows per block when the error sums are calculated with NumPy, bounds the temporary arrays
+ERROR_BLOCK_ROWS = 256
+
+
+class ScreenshotImage:
+    """A screenshot decoded once and shared by the blank check and every metric.
+
+    Parameters
+    ----------
+    image_name : str
+        The screenshot file path.
+
+    Attributes
+    ----------
+    name : str
+        The screenshot file path.
+    data : bytes
+        The content of the screenshot file.
+    array : ndarray
+        The decoded screenshot, normalized to RGB, as a (height, width, 3) uint8 matrix.
+    pil_image : PIL.Image.Image
+        The same pixels as a PIL image, made from array each time it is used.
+    content_hash : str
+        Hash of the file content, used to look up cached scores.
+    features : dict
+        Values derived from the screenshot (phash, SSIM statistics) that are kept
+        so they are computed only once when the screenshot is compared many times.
+
+    Notes
+    -----
+    The file is read when the object is created but only decoded the first time
+    pil_image or array is used, so screenshots whose scores are all cached are
+    never decoded. Only the array is kept, the PIL image is a temporary copy for
+    the hashes, so the decoded pixels are held once.
+
+    RGBA, palette and grayscale screenshots are all converted to RGB here, so the
+    metrics always compare three channel images of the same kind.
+
+    """
+
+    def __init__(self, image_name):
+        self.name = image_name
+        with open(image_name, 'rb') as image_file:
+            self.data = image_file.read()
+        self.features = {}
+        self._array = None
+        self._content_hash = None
+
+    @property
+    def array(self):
+        if self._array is None:
+            pil_image = Image.open(io.BytesIO(self.data))
+            if pil_image.mode != "RGB":
+                pil_image = pil_image.convert("RGB")
+            self._array = np.asarray(pil_image)
+        return self._array
+
+    @property
+    def pil_image(self):
+        return Image.fromarray(self.array)
+
+    @property
+    def content_hash(self):
+        if self._content_hash is None:
+            self._content_hash = hashlib.blake2b(self.data, digest_size=20).hexdigest()
+        return self._content_hash
+
+
 def cropping_images(image_filename_a, image_filename_b):
     o_width, o_height = image_filename_a.shape[:2]
     a_width, a_height = image_filename_b.shape[:2]
@@ -54,7 +140,221 @@ def cropping_images(image_filename_a, image_filename_b):
     return image_filename_a_cropped, image_filename_b_cropped
 
 
-def calculate_ssim(current_image_name, archive_image_name, current_image, archive_image):
+def ssim_mode_label(gray=False, width=0, window="uniform", engine="numpy"):
+    """Describes how calculate_ssim is run, empty for full resolution colour SSIM with a uniform window
+
+    Parameters
+    ----------
+    gray : bool
+        Whether the images are converted to grayscale.
+    width : int
+        Width the images are downscaled to, 0 to keep the full resolution.
+    window : str
+        "uniform" or "gaussian".
+    engine : str
+        Not part of the label, both engines give the same scores.
+
+    Returns
+    -------
+    label : str
+        ie: "gray_w256_gaussian"
+
+    """
+    parts = []
+    if gray:
+        parts.append("gray")
+    if width:
+        parts.append("w{}".format(width))
+    if window != "uniform":
+        parts.append(window)
+    return "_".join(parts)
+
+
+def prepare_ssim_image(image, gray=False, width=0):
+    """Converts an image to the form SSIM is calculated on
+
+    Parameters
+    ----------
+    image : ndarray
+        A (height, width, 3) RGB or (height, width) grayscale matrix.
+    gray : bool
+        Convert the image to grayscale.
+    width : int
+        Downscale the image to this width with area interpolation, keeping its aspect
+        ratio. 0, or a width larger than the image, keeps the full resolution.
+
+    Returns
+    -------
+    image : ndarray
+        The converted image.
+
+    """
+    if gray and image.ndim == 3:
+        image = cv2.cvtColor(np.ascontiguousarray(image[..., :3]), cv2.COLOR_RGB2GRAY)
+    if width and image.shape[1] > width:
+        height = max(1, int(round(image.shape[0] * width / image.shape[1])))
+        image = cv2.resize(np.ascontiguousarray(image), (width, height), interpolation=cv2.INTER_AREA)
+    return image
+
+
+def _ssim_filter(image, window):
+    """Local weighted mean of each channel of image over the SSIM window"""
+    if window == "gaussian":
+        sigma = (SSIM_SIGMA, SSIM_SIGMA) + (0,) * (image.ndim - 2)
+        return gaussian_filter(image, sigma=sigma, truncate=SSIM_TRUNCATE, mode='reflect')
+    size = (SSIM_WIN_SIZE, SSIM_WIN_SIZE) + (1,) * (image.ndim - 2)
+    return uniform_filter(image, size=size)
+
+
+def ssim_statistics(image, window="uniform"):
+    """Calculates the local statistics of an image that the SSIM score is built from
+
+    Parameters
+    ----------
+    image : ndarray
+        A (height, width) or (height, width, channels) matrix representing the image.
+    window : str
+        "uniform" for a SSIM_WIN_SIZE x SSIM_WIN_SIZE window, "gaussian" for a gaussian
+        window with a standard deviation of SSIM_SIGMA.
+
+    Returns
+    -------
+    statistics : tuple of ndarray
+        The image as float64, its local means and its local means of squares.
+
+    """
+    win_size = SSIM_GAUSSIAN_WIN_SIZE if window == "gaussian" else SSIM_WIN_SIZE
+    if np.any(np.asarray(image.shape[:2]) < win_size):
+        raise ValueError("win_size exceeds image extent")
+    image_float = image.astype(np.float64)
+    mean = _ssim_filter(image_float, window)
+    mean_sq = _ssim_filter(image_float * image_float, window)
+    return image_float, mean, mean_sq
+
+
+def ssim_from_statistics(current_stats, archive_stats, data_range, window="uniform"):
+    """Combines the local statistics of two images into the mean SSIM score
+
+    With the uniform window the result is the same as skimage.metrics.structural_similarity
+    with its default settings, averaged over the channels. The gaussian window matches
+    gaussian_weights=True, sigma=1.5 and use_sample_covariance=False, the settings of
+    Wang et al.
+
+    """
+    current_float, ux, uxx = current_stats
+    archive_float, uy, uyy = archive_stats
+    uxy = _ssim_filter(current_float * archive_float, window)
+
+    if window == "gaussian":
+        win_size = SSIM_GAUSSIAN_WIN_SIZE
+        cov_norm = 1.0
+    else:
+        win_size = SSIM_WIN_SIZE
+        np_window = SSIM_WIN_SIZE ** 2
+        cov_norm = np_window / (np_window - 1)
+    vx = cov_norm * (uxx - ux * ux)
+    vy = cov_norm * (uyy - uy * uy)
+    vxy = cov_norm * (uxy - ux * uy)
+
+    c1 = (SSIM_K1 * data_range) ** 2
+    c2 = (SSIM_K2 * data_range) ** 2
+    a1 = 2 * ux * uy + c1
+    a2 = 2 * vxy + c2
+    b1 = ux ** 2 + uy ** 2 + c1
+    b2 = vx + vy + c2
+    s = (a1 * a2) / (b1 * b2)
+
+    pad = (win_size - 1) // 2
+    return s[pad:s.shape[0] - pad, pad:s.shape[1] - pad].mean(dtype=np.float64)
+
+
+def _ssim_strips(current_image, archive_image, data_range, window, strip_height):
+    """Mean SSIM of two images of the same size, calculated on strips of strip_height rows
+
+    Each strip is read with the rows the window needs above and below it, so every score
+    is the same as on the whole image while the float64 statistics only cover one strip.
+
+    """
+    win_size = SSIM_GAUSSIAN_WIN_SIZE if window == "gaussian" else SSIM_WIN_SIZE
+    pad = (win_size - 1) // 2
+    height = current_image.shape[0]
+    if np.any(np.asarray(current_image.shape[:2]) < win_size):
+        raise ValueError("win_size exceeds image extent")
+
+    total = 0.0
+    for start in range(pad, height - pad, strip_height):
+        stop = min(start + strip_height, height - pad)
+        current_stats = ssim_statistics(current_image[start - pad:stop + pad], window)
+        archive_stats = ssim_statistics(archive_image[start - pad:stop + pad], window)
+        total += ssim_from_statistics(current_stats, archive_stats, data_range, window) * (stop - start)
+    return total / (height - 2 * pad)
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _ssim_uint8_numba(current_image, archive_image, win_size, c1, c2):
+        """Mean SSIM of two (height, width, channels) uint8 images with a uniform window
+
+        The window sums come from integer column sums that are updated as the window moves
+        down one row at a time, so only valid windows are visited, nothing is converted to
+        float64 as a whole and the extra memory is a few rows of the image.
+
+        """
+        height, width, channels = current_image.shape
+        np_window = win_size * win_size
+        cov_norm = np_window / (np_window - 1.0)
+        # column sums over the last win_size rows of x, y, x * x, y * y and x * y
+        column_sums = np.zeros((5, width, channels), dtype=np.int64)
+        window_sums = np.zeros((5, channels), dtype=np.int64)
+        total = 0.0
+
+        for i in range(height):
+            for j in range(width):
+                for k in range(channels):
+                    x = np.int64(current_image[i, j, k])
+                    y = np.int64(archive_image[i, j, k])
+                    column_sums[0, j, k] += x
+                    column_sums[1, j, k] += y
+                    column_sums[2, j, k] += x * x
+                    column_sums[3, j, k] += y * y
+                    column_sums[4, j, k] += x * y
+                    if i >= win_size:
+                        x = np.int64(current_image[i - win_size, j, k])
+                        y = np.int64(archive_image[i - win_size, j, k])
+                        column_sums[0, j, k] -= x
+                        column_sums[1, j, k] -= y
+                        column_sums[2, j, k] -= x * x
+                        column_sums[3, j, k] -= y * y
+                        column_sums[4, j, k] -= x * y
+            if i < win_size - 1:
+                continue
+
+            window_sums[:, :] = 0
+            for j in range(width):
+                for k in range(channels):
+                    for n in range(5):
+                        window_sums[n, k] += column_sums[n, j, k]
+                        if j >= win_size:
+                            window_sums[n, k] -= column_sums[n, j - win_size, k]
+                if j < win_size - 1:
+                    continue
+                for k in range(channels):
+                    ux = window_sums[0, k] / np_window
+                    uy = window_sums[1, k] / np_window
+                    vx = cov_norm * (window_sums[2, k] / np_window - ux * ux)
+                    vy = cov_norm * (window_sums[3, k] / np_window - uy * uy)
+                    vxy = cov_norm * (window_sums[4, k] / np_window - ux * uy)
+                    total += ((2 * ux * uy + c1) * (2 * vxy + c2)) / ((ux * ux + uy * uy + c1) * (vx + vy + c2))
+
+        return total / ((height - win_size + 1) * (width - win_size + 1) * channels)
+
+    SSIM_ENGINES = ["numpy", "numba"]
+else:
+    SSIM_ENGINES = ["numpy"]
+
+
+def calculate_ssim(current_image_name, archive_image_name, current_image, archive_image, current_features=None,
+                   gray=False, width=0, window="uniform", engine="numpy", strip_height=0):
     """Calculates the structural similarity score of the two given images
 
     Parameters
@@ -63,34 +363,81 @@ def calculate_ssim(current_image_name, archive_image_name, current_image, archiv
         The current website screenshot file path.
     archive_image_name : str
         The archive website screenshot file path.
+    current_image: ndarray
+        A matrix representing the image
+    archive_image: ndarray
+        A matrix representing the image
+    current_features : dict, optional
+        ScreenshotImage.features of the current screenshot. The local statistics of
+        the current image are kept there and reused by the next comparison.
+    gray : bool
+        Calculate the score on grayscale versions of the images.
+    width : int
+        Calculate the score on versions of the images downscaled to this width,
+        0 for full resolution.
+    window : str
+        "uniform" or "gaussian", see ssim_statistics.
+    engine : str
+        "numpy" to calculate the score from ssim_statistics, or "numba" to calculate it
+        directly on the uint8 images with a compiled kernel. The numba engine only handles
+        the uniform window and uint8 images; it falls back to "numpy" otherwise and when
+        numba is not installed (see SSIM_ENGINES).
+    strip_height : int
+        When the images are taller than this, the numpy engine calculates the score strip
+        by strip so that its float64 intermediates stay bounded. The score is the same.
+        0 to always calculate on the whole images.
 
     Returns
     -------
     ssim_noise : float
         The ssim score.
 
+    Notes
+    -----
+    Grayscale and downscaled scores are much cheaper to calculate on tall full page
+    screenshots. The images are cropped to the same size before they are converted.
+
+    Both engines give the score of skimage.metrics.structural_similarity with its default
+    uniform window and sample covariance, up to floating point rounding. The numba engine
+    sums whole numbers and so does not keep the statistics of the current image.
+
     References
     ----------
     .. [1] http://scikit-image.org/docs/stable/auto_examples/transform/plot_ssim.html#
             sphx-glr-auto-examples-transform-plot-ssim-py
 
     """
-    #checks if images are same size (shape for ndarrays)
-    if(current_image.shape == archive_image.shape):
-        #current_image_float = img_as_float(current_image)
-        #archive_image_float = img_as_float(archive_image)
-        #datarange = archive_image_float.max() - archive_image_float.min()
-        ssim_score = ssim(current_image, archive_image, channel_axis = -1)
-    
-    else: 
-    
-        (current_image_cropped, archive_image_cropped) = cropping_images(current_image, archive_image)
-        #current_image_float = img_as_float(current_image_cropped)
-        #archive_image_float = img_as_float(archive_image_cropped)
-        #datarange = archive_image_float.max() - archive_image_float.min()
-        #print("Current_image size: ", current_image_cropped.size, "Shape: ", current_image.shape, "Data type: ", current_image.dtype)
-        ssim_score = ssim(current_image_cropped, archive_image_cropped, channel_axis = -1)
-    
+    (current_image_cropped, archive_image_cropped) = cropping_images(current_image, archive_image)
+    dmin, dmax = dtype_range[current_image.dtype.type]
+
+    if engine == "numba" and "numba" in SSIM_ENGINES and window == "uniform" and current_image.dtype == np.uint8:
+        current_prepared = prepare_ssim_image(current_image_cropped, gray, width)
+        archive_prepared = prepare_ssim_image(archive_image_cropped, gray, width)
+        if np.any(np.asarray(current_prepared.shape[:2]) < SSIM_WIN_SIZE):
+            raise ValueError("win_size exceeds image extent")
+        if current_prepared.ndim == 2:
+            current_prepared = current_prepared[..., np.newaxis]
+            archive_prepared = archive_prepared[..., np.newaxis]
+        data_range = float(dmax - dmin)
+        return _ssim_uint8_numba(np.ascontiguousarray(current_prepared), np.ascontiguousarray(archive_prepared),
+                                 SSIM_WIN_SIZE, (SSIM_K1 * data_range) ** 2, (SSIM_K2 * data_range) ** 2)
+
+    if strip_height and min(current_image_cropped.shape[0], archive_image_cropped.shape[0]) > strip_height:
+        return _ssim_strips(prepare_ssim_image(current_image_cropped, gray, width),
+                            prepare_ssim_image(archive_image_cropped, gray, width), dmax - dmin, window, strip_height)
+
+    # statistics of the current image can only be reused when it was not cropped
+    key = ("ssim", gray, width, window)
+    if current_features is not None and current_image_cropped.shape == current_image.shape:
+        if key not in current_features:
+            current_features[key] = ssim_statistics(prepare_ssim_image(current_image, gray, width), window)
+        current_stats = current_features[key]
+    else:
+        current_stats = ssim_statistics(prepare_ssim_image(current_image_cropped, gray, width), window)
+
+    archive_stats = ssim_statistics(prepare_ssim_image(archive_image_cropped, gray, width), window)
+    ssim_score = ssim_from_statistics(current_stats, archive_stats, dmax - dmin, window)
+
     return ssim_score
 
 def calculate_psnr(current_image, archive_image):
@@ -215,12 +562,22 @@ def calculate_percent(current_image_name, archive_image_name, current_image, arc
         The current website screenshot file path.
     archive_image_name : str
         The archive website screenshot file path.
+    current_image: ndarray
+        A matrix representing the image
+    archive_image: ndarray
+        A matrix representing the image
 
     Returns
     -------
     percent_score : float
         The percentage similarity score.
 
+    Notes
+    -----
+    The absolute differences are summed on the decoded arrays directly instead of
+    iterating over the pixels in Python. Only the colour channels are compared, an
+    alpha channel is ignored just like the previous PIL based implementation did.
+
     References
     ----------
     .. [1] https://rosettacode.org/wiki/Percentage_difference_between_images#Python
@@ -228,39 +585,114 @@ def calculate_percent(current_image_name, archive_image_name, current_image, arc
     """
 
     (current_image_cropped, archive_image_cropped) = cropping_images(current_image, archive_image)
-    current_image = cv2.cvtColor(current_image_cropped, cv2.COLOR_BGR2RGB)
-    current_image = Image.fromarray(current_image)
-    archive_image = cv2.cvtColor(archive_image_cropped, cv2.COLOR_BGR2RGB)
-    archive_image = Image.fromarray(archive_image)
-    assert current_image.mode == archive_image.mode, "Different kinds of images."
-    assert current_image.size == archive_image.size, "Different sizes."
-
-    pairs = zip(current_image.getdata(), archive_image.getdata())
-    if len(current_image.getbands()) == 1:
-        # for gray-scale jpegs
-        dif = sum(abs(p1 - p2) for p1, p2 in pairs)
-    else:
-        dif = sum(abs(c1 - c2) for p1, p2 in pairs for c1, c2 in zip(p1, p2))
+    if current_image_cropped.ndim == 3:
+        current_image_cropped = current_image_cropped[..., :3]
+        archive_image_cropped = archive_image_cropped[..., :3]
+    assert current_image_cropped.shape == archive_image_cropped.shape, "Different kinds of images."
 
-    ncomponents = current_image.size[0] * current_image.size[1] * 3
+    dif = cv2.absdiff(current_image_cropped, archive_image_cropped).sum(dtype=np.float64)
+    ncomponents = current_image_cropped.size
 
     percent_score = 100 - ((dif / 255.0 * 100) / ncomponents)    # convert to percentage match
-    
-    #print("Percentage similarity: ", percent_score)
 
     return percent_score
 
 
 
-def calculate_phash(current_image_name, archive_image_name):
+def _error_sums_numpy(current_image, archive_image):
+    """Sums of squared differences, absolute colour differences and squared current values"""
+    sum_sq_diff = 0
+    sum_abs_diff = 0
+    sum_sq_current = 0
+    for start in range(0, current_image.shape[0], ERROR_BLOCK_ROWS):
+        current_block = current_image[start:start + ERROR_BLOCK_ROWS].astype(np.int64)
+        diff = current_block - archive_image[start:start + ERROR_BLOCK_ROWS]
+        sum_sq_diff += int(np.dot(diff.ravel(), diff.ravel()))
+        sum_abs_diff += int(np.abs(diff[..., :3]).sum())
+        sum_sq_current += int(np.dot(current_block.ravel(), current_block.ravel()))
+    return sum_sq_diff, sum_abs_diff, sum_sq_current
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _error_sums_numba(current_image, archive_image):
+        sum_sq_diff = 0
+        sum_abs_diff = 0
+        sum_sq_current = 0
+        height, width, channels = current_image.shape
+        for i in range(height):
+            for j in range(width):
+                for k in range(channels):
+                    x = np.int64(current_image[i, j, k])
+                    d = x - np.int64(archive_image[i, j, k])
+                    sum_sq_diff += d * d
+                    sum_sq_current += x * x
+                    if k < 3:
+                        sum_abs_diff += abs(d)
+        return sum_sq_diff, sum_abs_diff, sum_sq_current
+
+    _error_sums = _error_sums_numba
+    ERROR_KERNEL = "numba"
+else:
+    _error_sums = _error_sums_numpy
+    ERROR_KERNEL = "numpy"
+
+
+def calculate_error_metrics(current_image, archive_image):
+    """Calculates the MSE, NRMSE, PSNR and percentage scores of the two given images in one pass
+
+    Parameters
+    ----------
+    current_image: ndarray
+        A matrix representing the image
+    archive_image: ndarray
+        A matrix representing the image
+
+    Returns
+    -------
+    scores : dict
+        The "mse", "nrmse", "psnr" and "percent" scores, the same values that calculate_mse,
+        calculate_nrmse, calculate_psnr and calculate_percent return.
+
+    Notes
+    -----
+    All four scores come from the sum of squared differences, the sum of absolute differences
+    and the sum of squared values of the current image, which are collected together while
+    walking over the cropped pair once. With numba the walk is compiled and needs no temporary
+    arrays; otherwise NumPy goes through the pair in blocks of ERROR_BLOCK_ROWS rows.
+
+    """
+    (current_image_cropped, archive_image_cropped) = cropping_images(current_image, archive_image)
+    if current_image_cropped.ndim == 2:
+        current_image_cropped = current_image_cropped[..., np.newaxis]
+        archive_image_cropped = archive_image_cropped[..., np.newaxis]
+
+    sum_sq_diff, sum_abs_diff, sum_sq_current = _error_sums(current_image_cropped, archive_image_cropped)
+
+    ncomponents = current_image_cropped.size
+    percent_components = ncomponents // current_image_cropped.shape[2] * min(current_image_cropped.shape[2], 3)
+    dmin, dmax = dtype_range[current_image.dtype.type]
+
+    mse = sum_sq_diff / ncomponents
+    nrmse = np.sqrt(mse) / np.sqrt(sum_sq_current / ncomponents)
+    psnr = 10 * np.log10(((dmax - dmin) ** 2) / mse) if mse != 0 else np.inf
+    percent = 100 - ((sum_abs_diff / 255.0 * 100) / percent_components)
+
+    return {"mse": mse, "nrmse": nrmse, "psnr": psnr, "percent": percent}
+
+
+def calculate_phash(current_image, archive_image, current_features=None):
     """Calculates the phash score of the two given images
 
     Parameters
     ----------
-    current_image_name : str
-        The current website screenshot file path.
-    archive_image_name : str
-        The archive website screenshot file path.
+    current_image : PIL.Image.Image
+        The decoded current website screenshot.
+    archive_image : PIL.Image.Image
+        The decoded archive website screenshot.
+    current_features : dict, optional
+        ScreenshotImage.features of the current screenshot. The hash of the current
+        image is kept there and reused by the next comparison.
 
     Returns
     -------
@@ -272,21 +704,100 @@ def calculate_phash(current_image_name, archive_image_name):
     .. [1] https://rosettacode.org/wiki/Percentage_difference_between_images#Python
 
     """
-    current_image = Image.open(current_image_name)
-    archive_image = Image.open(archive_image_name)
-    cur_hash = imagehash.phash(current_image)
+    if current_features is None:
+        cur_hash = imagehash.phash(current_image)
+    else:
+        if "phash" not in current_features:
+            current_features["phash"] = imagehash.phash(current_image)
+        cur_hash = current_features["phash"]
     archive_hash = imagehash.phash(archive_image)
     phash_score = cur_hash - archive_hash
     return phash_score
     
-def calculate_hausdorff(current_image_name, archive_image_name, current_image, archive_image):
+def calculate_dhash(current_image, archive_image, current_features=None):
+    """Calculates the dhash (difference hash) distance of the two given images
+
+    Parameters
+    ----------
+    current_image : PIL.Image.Image
+        The decoded current website screenshot.
+    archive_image : PIL.Image.Image
+        The decoded archive website screenshot.
+    current_features : dict, optional
+        ScreenshotImage.features of the current screenshot. The hash of the current
+        image is kept there and reused by the next comparison.
+
+    Returns
+    -------
+    dhash_score : float
+        The number of bits that differ between the two hashes.
+
+    References
+    ----------
+    .. [1] https://github.com/JohannesBuchner/imagehash
+
+    """
+    if current_features is None:
+        cur_hash = imagehash.dhash(current_image)
+    else:
+        if "dhash" not in current_features:
+            current_features["dhash"] = imagehash.dhash(current_image)
+        cur_hash = current_features["dhash"]
+    archive_hash = imagehash.dhash(archive_image)
+    dhash_score = cur_hash - archive_hash
+    return dhash_score
+
+
+def _directed_hausdorff_strips(image_a, image_b, strip_height):
+    """Largest distance from a nonzero point of image_a to the nearest nonzero point of image_b
+
+    The points of each strip of strip_height rows of image_a are matched with the points of
+    image_b in the same rows and strip_height rows above and below. Any point outside those
+    rows is further away than strip_height, so a nearest distance of at most strip_height is
+    the nearest distance in the whole image. None if a point is further than that from every
+    point it was matched with, then only the whole images give the distance.
+
+    """
+    height = image_a.shape[0]
+    distance = 0.0
+    for start in range(0, height, strip_height):
+        stop = min(start + strip_height, height)
+        points_a = np.transpose(np.nonzero(image_a[start:stop]))
+        if len(points_a) == 0:
+            continue
+        low = max(0, start - strip_height)
+        points_b = np.transpose(np.nonzero(image_b[low:stop + strip_height]))
+        if len(points_b) == 0:
+            return None
+        points_a[:, 0] += start - low
+        nearest = cKDTree(points_b).query(points_a, k=1)[0].max()
+        if nearest > strip_height:
+            return None
+        distance = max(distance, nearest)
+    return distance
+
+
+def calculate_hausdorff(current_image_name, archive_image_name, current_image, archive_image, strip_height=0):
     """Calculates the Hausdorff distance of the two given images
-    
+
+    Parameters
+    ----------
+    strip_height : int
+        When the images have the same size and are taller than this, the nearest points are
+        looked up strip by strip (see _directed_hausdorff_strips) so that only a few strips
+        of points are held at a time. The distance is the same as on the whole images, which
+        are used when the strips cannot tell it or the images differ in size. 0 to always
+        use the whole images.
+
     References
     ----------
     ..[1] https://scikit-image.org/docs/stable/api/skimage.metrics.html#skimage.metrics.hausdorff_distance
     
     """
+    if strip_height and current_image.shape == archive_image.shape and current_image.shape[0] > strip_height:
+        forward = _directed_hausdorff_strips(current_image, archive_image, strip_height)
+        backward = _directed_hausdorff_strips(archive_image, current_image, strip_height) if forward is not None else None
+        if backward is not None:
+            return max(forward, backward)
     hausdorff = hausdorff_distance(current_image, archive_image)
     return hausdorff
-    
@@ -0,0 +1,10 @@
+import os
+import sys
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the scripts import each other by module name, as they do when run from the repo and utils directories
+for path in (ROOT, os.path.join(ROOT, "utils")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
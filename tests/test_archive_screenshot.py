@@ -0,0 +1,50 @@
+import csv
+
+from PIL import Image
+
+import archive_screenshot
+
+
+ARCHIVE_URL = "https://web.archive.org/web/20090101000000/http://example.com/"
+REDIRECTED_URL = "https://web.archive.org/web/20090105120000if_/http://example.com/"
+
+
+def capture_redirected_archive(tmp_path, monkeypatch):
+    captures = []
+
+    def is_website_exist(url, timeout_duration):
+        return "LIVE", "Redirected to\t{}".format(REDIRECTED_URL), "Website exists"
+
+    def cutycapt_screenshot(pics_out_path, archive_id, url_id, date, url, timeout_duration, display_pool=None,
+                            page_settle=None):
+        captures.append((date, url))
+        Image.new("RGB", (8, 8), "white").save("{0}{1}.{2}.{3}.png".format(pics_out_path, archive_id, url_id, date))
+        return "Screenshot successful"
+
+    monkeypatch.setattr(archive_screenshot, "is_website_exist", is_website_exist)
+    monkeypatch.setattr(archive_screenshot, "cutycapt_screenshot", cutycapt_screenshot)
+
+    csv_in = tmp_path / "archive_urls.csv"
+    with open(str(csv_in), 'w') as csv_file:
+        csv_writer = csv.writer(csv_file)
+        csv_writer.writerow(["archive_id", "url_id", "date", "url"])
+        csv_writer.writerow(["web", "1", "20090101000000", ARCHIVE_URL])
+    pics_out_path = str(tmp_path) + "/"
+    csv_out = str(tmp_path / "archive_index.csv")
+
+    archive_screenshot.screenshot_csv(str(csv_in), csv_out, pics_out_path, 2, 30, [None, None], [], [768, 1024], False)
+    with open(csv_out) as csv_file:
+        return captures, list(csv.reader(csv_file))
+
+
+def test_resume_skips_a_redirected_archive_row(tmp_path, monkeypatch):
+    captures, first_index = capture_redirected_archive(tmp_path, monkeypatch)
+    assert captures == [("20090105120000", REDIRECTED_URL)]
+
+    journal = archive_screenshot.CaptureJournal(str(tmp_path / "archive_index.csv"))
+    journal.close()
+    assert journal.file_name(("web", "1", "20090101000000")) == str(tmp_path / "web.1.20090105120000.png")
+
+    captures, second_index = capture_redirected_archive(tmp_path, monkeypatch)
+    assert captures == []
+    assert second_index == first_index
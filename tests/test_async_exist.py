@@ -0,0 +1,42 @@
+import asyncio
+import socket
+import ssl
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+import async_exist_mod
+
+
+class FailingSession:
+    """Stands in for aiohttp.ClientSession, every request raises error."""
+
+    def __init__(self, error):
+        self.error = error
+
+    def head(self, url, **kwargs):
+        raise self.error
+
+    get = head
+
+
+def check(error):
+    return asyncio.new_event_loop().run_until_complete(
+        async_exist_mod.check_with_aiohttp(FailingSession(error), "https://example.com/", 5))
+
+
+def test_certificate_error_keeps_its_message():
+    certificate_error = ssl.SSLCertVerificationError(1, "[SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed")
+    site_status, site_message = check(aiohttp.ClientConnectorCertificateError(None, certificate_error))
+    assert site_status == "FAIL"
+    assert "CERTIFICATE_VERIFY_FAILED" in site_message
+    assert "Operation not permitted" not in site_message
+
+
+def test_connection_errors_are_worded_like_urllib():
+    assert check(aiohttp.ClientConnectorError(None, ConnectionRefusedError(111, "Connect call failed"))) == (
+        "FAIL", "URLError: [Errno 111] Connection refused")
+    lookup_error = socket.gaierror(-2, "Name or service not known")
+    assert check(aiohttp.ClientConnectorError(None, lookup_error)) == (
+        "FAIL", "URLError: [Errno -2] Name or service not known")
@@ -0,0 +1,30 @@
+import configparser
+import os
+
+import pytest
+
+import config
+
+INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "screenshot_compare.ini")
+
+
+def load_with(tmp_path, monkeypatch, option, value):
+    with open(INI) as ini:
+        lines = [option + " = " + value + "\n" if line.split("=")[0].strip() == option else line for line in ini]
+    with open(tmp_path / "screenshot_compare.ini", "w") as ini:
+        ini.writelines(lines)
+    monkeypatch.chdir(tmp_path)
+    config.load_config()
+
+
+@pytest.mark.parametrize("option", ["c_chrome_args", "a_block_url_patterns"])
+def test_malformed_json_list_is_an_error(tmp_path, monkeypatch, option):
+    with pytest.raises(configparser.Error, match=option):
+        load_with(tmp_path, monkeypatch, option, '["--no-sandbox",')
+
+
+def test_empty_json_list_gives_the_default(tmp_path, monkeypatch):
+    load_with(tmp_path, monkeypatch, "c_chrome_args", "")
+    assert config.c_chrome_args is None
+    load_with(tmp_path, monkeypatch, "c_block_resource_types", "")
+    assert config.c_block_resource_types == []
@@ -0,0 +1,42 @@
+import time
+
+from host_timeouts_mod import HostTimeouts
+from retry_queue_mod import RetryQueue, is_retryable
+
+
+URL = "http://example.com/page"
+
+
+def test_slow_capture_is_not_a_timeout(tmp_path):
+    host_timeouts = HostTimeouts(str(tmp_path / "host_timeouts.json"), fail_fast_after=1)
+    host_timeouts.record(URL, "capture", 42.0, 30, "Screenshot successful")
+    assert host_timeouts.fail_fast(URL) is None
+
+    host_timeouts.record(URL, "capture", 12.0, 30, TimeoutError("Navigation Timeout Exceeded: 30000 ms exceeded"))
+    assert host_timeouts.fail_fast(URL) is not None
+
+
+def test_skipped_urls_are_not_waited_for(tmp_path):
+    host_timeouts = HostTimeouts(str(tmp_path / "host_timeouts.json"), fail_fast_after=1, fail_fast_for=3600)
+    host_timeouts.record(URL, "check", 10.0, 10, "URLError: timed out")
+    skipped = host_timeouts.fail_fast(URL)
+    assert is_retryable("FAIL", skipped, "Screenshot unsuccessful")
+
+    output = ["1", URL, "FAIL", skipped, "Screenshot unsuccessful"]
+    retries = RetryQueue(max_attempts=3, delay=30, max_delay=600)
+    assert retries.defer(("1", URL), host_timeouts.skipped_until(URL), output)
+    (due, job), = retries.take()
+    assert due is None and job is output
+    assert not retries.defer(("1", URL), host_timeouts.skipped_until(URL), output)
+
+
+def test_retry_waits_at_most_the_backoff(tmp_path):
+    host_timeouts = HostTimeouts(str(tmp_path / "host_timeouts.json"), fail_fast_after=1, fail_fast_for=20)
+    host_timeouts.record(URL, "check", 10.0, 10, "URLError: timed out")
+    output = ["1", URL, "FAIL", host_timeouts.fail_fast(URL), "Screenshot unsuccessful"]
+
+    retries = RetryQueue(max_attempts=2, delay=30, max_delay=600)
+    assert retries.defer(("1", URL), host_timeouts.skipped_until(URL), output)
+    (due, job), = retries.take()
+    assert job == ("1", URL)
+    assert time.time() + 25 <= due <= time.time() + 30
@@ -0,0 +1,75 @@
+import http.server
+import socket
+import threading
+
+import pytest
+
+import http_client_mod
+import website_exists_mod
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    def do_HEAD(self):
+        if self.path == "/old":
+            self.send_response(301)
+            self.send_header("Location", "/")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield "localhost:{}".format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_dns_cache_is_kept_to_the_client(server, monkeypatch):
+    lookups = []
+    getaddrinfo = socket.getaddrinfo
+
+    def counting_getaddrinfo(host, *args, **kwargs):
+        lookups.append(host)
+        return getaddrinfo(host, *args, **kwargs)
+
+    monkeypatch.setattr(socket, "getaddrinfo", counting_getaddrinfo)
+    client = http_client_mod.HttpClient(timeout=5, dns_ttl=300)
+    assert socket.getaddrinfo is counting_getaddrinfo
+
+    for _ in range(3):     # the server closes every connection, so each request connects again
+        assert client.probe("http://{}/".format(server)).status_code == 200
+    client.close()
+    assert lookups.count("localhost") == 1
+
+
+def test_redirect_message_keeps_its_wording(server, monkeypatch):
+    monkeypatch.setattr(http_client_mod, "_shared_client", http_client_mod.HttpClient(timeout=5))
+    assert website_exists_mod.check_website_availability("http://{}/old".format(server), 5) == (
+        "LIVE", "Redirected to\thttp://{}/".format(server))
+    assert website_exists_mod.check_website_availability("http://{}/".format(server), 5) == (
+        "LIVE", "Return\tcode 200")
+
+
+def test_every_cached_address_is_tried(server, monkeypatch):
+    getaddrinfo = socket.getaddrinfo
+
+    def unreachable_first(host, port, *args, **kwargs):
+        if host != "localhost":
+            return getaddrinfo(host, port, *args, **kwargs)
+        # nothing listens on 127.0.0.2, the server only on 127.0.0.1
+        return [(socket.AF_INET, socket.SOCK_STREAM, 6, "", (address, port)) for address in ("127.0.0.2", "127.0.0.1")]
+
+    monkeypatch.setattr(socket, "getaddrinfo", unreachable_first)
+    client = http_client_mod.HttpClient(timeout=5, dns_ttl=300)
+    for _ in range(2):
+        assert client.probe("http://{}/".format(server)).status_code == 200
+    client.close()
@@ -0,0 +1,33 @@
+import pytest
+
+from request_filter_mod import RequestFilter, matches
+
+
+@pytest.mark.parametrize("url", ["https://example.com/feed.json", "https://example.com/index.jsp?id=3",
+                                 "https://web.archive.org/web/2019/https://example.com/page.jsp"])
+def test_page_urls_are_not_blocked_as_scripts(url):
+    request_filter = RequestFilter(["script"])
+    assert not request_filter.blocks(url, "xhr")
+    assert not any(matches(url, pattern) for pattern in request_filter.blocked_url_patterns())
+
+
+@pytest.mark.parametrize("url", ["https://example.com/app.js", "https://example.com/app.js?v=2"])
+def test_scripts_are_blocked_by_extension(url):
+    request_filter = RequestFilter(["script"])
+    assert request_filter.blocks(url, "script")
+    assert any(matches(url, pattern) for pattern in request_filter.blocked_url_patterns())
+
+
+def test_page_itself_is_never_blocked():
+    request_filter = RequestFilter(["script"], ["*.json*"])
+    url = "https://example.com/feed.json"
+    assert request_filter.blocks(url, "xhr")
+    assert not request_filter.blocks(url, "document")
+    assert not request_filter.blocks(url, "other", navigation=True)
+    assert "*.json*" in request_filter.blocked_url_patterns()
+    assert "*.json*" not in request_filter.blocked_url_patterns(url)
+
+
+def test_question_mark_is_not_a_wildcard():
+    assert matches("https://example.com/app.js?v=2", "*.js?*")
+    assert not matches("https://example.com/app.json", "*.js?*")
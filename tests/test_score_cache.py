@@ -0,0 +1,60 @@
+import csv
+import multiprocessing
+import os
+
+import numpy as np
+from PIL import Image
+
+import calculate_similarity
+import score_cache
+
+
+def save_screenshot(path, seed):
+    pixels = np.random.RandomState(seed).randint(0, 256, (48, 64, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(str(path))
+    return str(path)
+
+
+def cache_connection_id(cache_file):
+    return id(score_cache.get_score_cache(cache_file).connection)
+
+
+def test_forked_worker_opens_its_own_cache(tmp_path):
+    cache_file = str(tmp_path / "score_cache.db")
+    parent_connection = cache_connection_id(cache_file)
+
+    with multiprocessing.get_context("fork").Pool(1) as pool:
+        assert pool.apply(cache_connection_id, (cache_file,)) != parent_connection
+
+
+def test_find_scores_with_two_workers_and_a_cache(tmp_path):
+    image_dict = {}
+    url_name_dict = {}
+    for group in range(3):
+        current = save_screenshot(tmp_path / "current.{}.png".format(group), group)
+        archives = [save_screenshot(tmp_path / "archive.{0}.{1}.png".format(group, i), 10 * group + i + 10)
+                    for i in range(2)]
+        image_dict[current] = archives
+        for name in [current] + archives:
+            url_name_dict[name] = "http://example.com/" + os.path.basename(name)
+
+    cache_file = str(tmp_path / "score_cache.db")
+    flags = dict(ssim_flag=True, mse_flag=True, hausdorff_flag=False, phash_flag=True, percent_flag=True,
+                 nrmse_flag=False, psnr_flag=False)
+
+    def run(name, workers):
+        out = str(tmp_path / name)
+        calculate_similarity.find_scores(image_dict, url_name_dict, csv_out_name=out,
+                                         blank_csv_name=str(tmp_path / "blank.csv"), do_print=False,
+                                         workers=workers, cache_file=cache_file, **flags)
+        with open(out) as csv_file:
+            return list(csv.reader(csv_file))
+
+    first = run("first.csv", 2)
+    second = run("second.csv", 2)
+    one_worker = run("one_worker.csv", 1)
+
+    assert len(first) == 7
+    assert first == second == one_worker
+    cache = score_cache.ScoreCache(cache_file)
+    assert cache.connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0] == 6 * 4
@@ -0,0 +1,187 @@
+import imagehash
+import numpy as np
+import pytest
+from PIL import Image
+from skimage.metrics import (hausdorff_distance, mean_squared_error, normalized_root_mse, peak_signal_noise_ratio,
+                             structural_similarity)
+
+import calculate_similarity
+import similarity_measures
+
+
+def old_percent(current_image_name, archive_image_name):
+    """calculate_percent as it was, on images opened with Image.open for this metric alone"""
+    current_image = Image.open(current_image_name).convert("RGB")
+    archive_image = Image.open(archive_image_name).convert("RGB")
+    pairs = zip(current_image.getdata(), archive_image.getdata())
+    dif = sum(abs(c1 - c2) for p1, p2 in pairs for c1, c2 in zip(p1, p2))
+    ncomponents = current_image.size[0] * current_image.size[1] * 3
+    return 100 - ((dif / 255.0 * 100) / ncomponents)
+
+
+def old_array(image_name):
+    return np.asarray(Image.open(image_name).convert("RGB"))
+
+
+def save_screenshot(path, seed, mode):
+    random = np.random.RandomState(seed)
+    pixels = random.randint(0, 256, (40, 56, 3), dtype=np.uint8)
+    pixels[:20] = pixels[:20] // 64 * 64     # a flat part, like the background of a page
+    image = Image.fromarray(pixels)
+    if mode == "RGBA":
+        image.putalpha(Image.fromarray(random.randint(0, 256, (40, 56), dtype=np.uint8)))
+    elif mode == "P":
+        image = image.quantize(64)
+    image.save(str(path))
+    return str(path)
+
+
+@pytest.mark.parametrize("mode", ["RGBA", "P", "RGB"])
+def test_scores_match_the_per_metric_image_open_path(tmp_path, mode):
+    current_name = save_screenshot(tmp_path / "current.png", 1, mode)
+    archive_name = save_screenshot(tmp_path / "archive.png", 2, mode)
+    current = similarity_measures.ScreenshotImage(current_name)
+    archive = similarity_measures.ScreenshotImage(archive_name)
+
+    assert current.array.shape == (40, 56, 3)
+    assert current.array.dtype == np.uint8
+
+    assert calculate_similarity.calculate_metric("percent", current, archive) == pytest.approx(
+        old_percent(current_name, archive_name), abs=1e-9)
+    assert calculate_similarity.calculate_metric("mse", current, archive) == pytest.approx(
+        mean_squared_error(old_array(current_name), old_array(archive_name)))
+    assert calculate_similarity.calculate_metric("ssim", current, archive) == pytest.approx(
+        structural_similarity(old_array(current_name), old_array(archive_name), channel_axis=-1))
+    assert calculate_similarity.calculate_metric("phash", current, archive) == (
+        imagehash.phash(Image.open(current_name).convert("RGB")) - imagehash.phash(Image.open(archive_name).convert("RGB")))
+
+    error_scores = similarity_measures.calculate_error_metrics(current.array, archive.array)
+    assert error_scores["percent"] == pytest.approx(old_percent(current_name, archive_name), abs=1e-9)
+
+
+def test_screenshot_is_decoded_once(tmp_path, monkeypatch):
+    current_name = save_screenshot(tmp_path / "current.png", 1, "RGBA")
+    archive_name = save_screenshot(tmp_path / "archive.png", 2, "P")
+    opened = []
+    image_open = similarity_measures.Image.open
+
+    def counting_open(*args, **kwargs):
+        opened.append(args[0])
+        return image_open(*args, **kwargs)
+
+    monkeypatch.setattr(similarity_measures.Image, "open", counting_open)
+    current = similarity_measures.ScreenshotImage(current_name)
+    archive = similarity_measures.ScreenshotImage(archive_name)
+    array = current.array
+    for metric in ["ssim", "mse", "percent", "phash", "nrmse", "psnr", "dhash"]:
+        calculate_similarity.calculate_metric(metric, current, archive)
+
+    assert current.array is array
+    assert len(opened) == 2
+
+
+@pytest.mark.parametrize("shapes", [((3000, 30, 3), (3000, 30, 3)), ((500, 30, 3), (3000, 30, 3))])
+def test_strip_hausdorff_matches_whole_images(shapes):
+    random = np.random.RandomState(0)
+    current = random.randint(0, 256, shapes[0], dtype=np.uint8)
+    archive = random.randint(0, 256, shapes[1], dtype=np.uint8)
+
+    assert similarity_measures.calculate_hausdorff("current", "archive", current, archive, 256) == (
+        hausdorff_distance(current, archive))
+
+
+def test_strip_hausdorff_of_sparse_images():
+    random = np.random.RandomState(1)
+    for _ in range(20):
+        current = np.zeros((2000, 20, 3), dtype=np.uint8)
+        archive = np.zeros((2000, 20, 3), dtype=np.uint8)
+        for image in (current, archive):
+            rows = random.randint(0, 2000, random.randint(0, 8))
+            image[rows, random.randint(0, 20, len(rows)), random.randint(0, 3, len(rows))] = 255
+
+        assert similarity_measures.calculate_hausdorff("current", "archive", current, archive, 128) == (
+            hausdorff_distance(current, archive))
+
+
+def random_pair(shape, seed):
+    rng = np.random.default_rng(seed)
+    current = rng.integers(0, 256, shape, dtype=np.uint8)
+    archive = np.clip(current.astype(int) + rng.integers(-40, 41, shape), 0, 255).astype(np.uint8)
+    return current, archive
+
+
+numba_only = pytest.mark.skipif("numba" not in similarity_measures.SSIM_ENGINES, reason="numba is not installed")
+
+
+@numba_only
+@pytest.mark.parametrize("shape", [(61, 47, 3), (61, 47)])
+def test_numba_ssim_matches_skimage(shape):
+    current, archive = random_pair(shape, 4)
+    channel_axis = -1 if len(shape) == 3 else None
+    expected = structural_similarity(current, archive, data_range=255, channel_axis=channel_axis,
+                                     use_sample_covariance=True)
+    score = similarity_measures.calculate_ssim("", "", current, archive, engine="numba")
+    assert score == pytest.approx(expected, abs=1e-6)
+
+
+@numba_only
+def test_numba_gray_ssim_matches_skimage():
+    current, archive = random_pair((61, 47, 3), 5)
+    expected = structural_similarity(similarity_measures.prepare_ssim_image(current, gray=True),
+                                     similarity_measures.prepare_ssim_image(archive, gray=True),
+                                     data_range=255, use_sample_covariance=True)
+    score = similarity_measures.calculate_ssim("", "", current, archive, gray=True, engine="numba")
+    assert score == pytest.approx(expected, abs=1e-6)
+
+
+@numba_only
+def test_numba_ssim_of_image_smaller_than_window():
+    current, archive = random_pair((5, 9, 3), 6)
+    with pytest.raises(ValueError, match="win_size exceeds image extent"):
+        similarity_measures.calculate_ssim("", "", current, archive, engine="numba")
+
+
+def test_numba_ssim_falls_back_to_numpy_for_other_dtypes(monkeypatch):
+    current, archive = random_pair((61, 47, 3), 7)
+    current, archive = current / 255, archive / 255
+
+    def fail(*args):
+        raise AssertionError("the numba kernel only handles uint8 images")
+
+    monkeypatch.setattr(similarity_measures, "_ssim_uint8_numba", fail, raising=False)
+    score = similarity_measures.calculate_ssim("", "", current, archive, engine="numba")
+    assert score == similarity_measures.calculate_ssim("", "", current, archive, engine="numpy")
+    assert score == pytest.approx(structural_similarity(current, archive, data_range=2, channel_axis=-1,
+                                                        use_sample_covariance=True), abs=1e-6)
+
+
+error_engines = pytest.mark.parametrize("engine", [
+    "numpy", pytest.param("numba", marks=pytest.mark.skipif(similarity_measures.ERROR_KERNEL != "numba",
+                                                            reason="numba is not installed"))])
+
+
+@error_engines
+@pytest.mark.parametrize("shapes", [[(61, 47, 3), (61, 47, 3)], [(70, 40, 4), (55, 52, 4)], [(33, 20), (40, 18)]])
+def test_error_metrics_match_skimage(engine, shapes, monkeypatch):
+    monkeypatch.setattr(similarity_measures, "_error_sums", getattr(similarity_measures, "_error_sums_" + engine))
+    monkeypatch.setattr(similarity_measures, "ERROR_BLOCK_ROWS", 16)
+    rng = np.random.default_rng(8)
+    current = rng.integers(0, 256, shapes[0], dtype=np.uint8)
+    archive = rng.integers(0, 256, shapes[1], dtype=np.uint8)
+    scores = similarity_measures.calculate_error_metrics(current, archive)
+
+    current, archive = similarity_measures.cropping_images(current, archive)
+    assert scores["mse"] == pytest.approx(mean_squared_error(current, archive), rel=1e-12)
+    assert scores["nrmse"] == pytest.approx(normalized_root_mse(current, archive), rel=1e-12)
+    assert scores["psnr"] == pytest.approx(peak_signal_noise_ratio(current, archive, data_range=255), rel=1e-12)
+
+
+@error_engines
+def test_error_metrics_of_identical_images(engine, monkeypatch):
+    monkeypatch.setattr(similarity_measures, "_error_sums", getattr(similarity_measures, "_error_sums_" + engine))
+    image = np.random.default_rng(9).integers(0, 256, (30, 20, 3), dtype=np.uint8)
+    scores = similarity_measures.calculate_error_metrics(image, image.copy())
+    assert scores["mse"] == 0
+    assert scores["nrmse"] == 0
+    assert scores["psnr"] == np.inf
+    assert scores["percent"] == 100
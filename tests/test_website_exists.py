@@ -0,0 +1,17 @@
+from website_exists_mod import navigation_status
+
+
+def test_bare_host_is_not_a_redirect():
+    assert navigation_status("http://example.com", 200, "http://example.com/", []) == ("LIVE", "Return\tcode 200")
+
+
+def test_redirect_chain_is_a_redirect():
+    assert navigation_status("http://example.com", 200, "https://www.example.com/", ["http://example.com/"]) == (
+        "LIVE", "Redirected to\thttps://www.example.com/")
+
+
+def test_error_statuses():
+    assert navigation_status("http://example.com", 404, "http://example.com/") == ("FAIL", "HTTPError: 404")
+    assert navigation_status("http://example.com") == ("FAIL", "No response")
+    assert navigation_status("http://example.com", error=TimeoutError("Navigation Timeout Exceeded")) == (
+        "LIVE", "URLError: timed out")
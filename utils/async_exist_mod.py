@@ -0,0 +1,101 @@
+import asyncio
+import collections
+import concurrent.futures
+import os
+
+from capture_workers_mod import run_in_order
+from host_scheduler_mod import interleave_hosts
+from http_client_mod import HEAD_FALLBACK_STATUSES
+from shard_mod import url_host
+from website_exists_mod import is_website_exist, navigation_status
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def check_urls(jobs, write, timeout_duration=30, concurrency=200, host_concurrency=4, dns_ttl=300):
+    """Checks whether the urls of jobs exist, many at a time, and writes each result as soon as it comes in.
+
+    Parameters
+    ----------
+    jobs : iterable
+        (url_id, url) pairs. They are read as the checks go, with the urls of each host spread out
+        so that one host does not hold up the others.
+    write : function
+        Called with url_id, url, site_status, site_message and availability of each url, in the
+        order the checks finish. The statuses and messages are the ones is_website_exist gives.
+    timeout_duration : int
+        Seconds before a check times out.
+    concurrency : int
+        Largest number of checks running at once.
+    host_concurrency : int
+        Largest number of checks of the same host running at once.
+    dns_ttl : int
+        Seconds DNS lookups are cached.
+
+    Notes
+    -----
+    With aiohttp installed, every check runs in one event loop, and one connector keeps the
+    open connections and the DNS cache. Without it, the checks run is_website_exist in a pool
+    of concurrency threads, which is slower but needs nothing more. Either way a check waiting
+    for its host is not timed until it starts, so a host with many urls does not time them out.
+
+    """
+    jobs = interleave_hosts(jobs, lambda job: url_host(job[1]))
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(run_checks(jobs, write, timeout_duration, concurrency, host_concurrency, dns_ttl))
+
+
+async def run_checks(jobs, write, timeout_duration, concurrency, host_concurrency, dns_ttl):
+    def write_result(result):
+        url_id, url, site_status, site_message = result
+        availability = "Website does not exist" if site_status == "FAIL" else "Website exists"
+        write(url_id, url, site_status, site_message, availability)
+
+    host_slots = collections.defaultdict(lambda: asyncio.Semaphore(host_concurrency))
+
+    if aiohttp is not None:
+        connector = aiohttp.TCPConnector(limit=concurrency, limit_per_host=host_concurrency, ttl_dns_cache=dns_ttl)
+        async with aiohttp.ClientSession(connector=connector, cookie_jar=aiohttp.DummyCookieJar()) as session:
+            async def check(job):
+                url_id, url = job
+                async with host_slots[url_host(url)]:
+                    return (url_id, url) + await check_with_aiohttp(session, url, timeout_duration)
+
+            await run_in_order(jobs, check, concurrency, write_result, completion_order=True)
+        return
+
+    loop = asyncio.get_event_loop()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        async def check(job):
+            url_id, url = job
+            async with host_slots[url_host(url)]:
+                site_status, site_message, availability = await loop.run_in_executor(
+                    executor, is_website_exist, url, timeout_duration)
+            return url_id, url, site_status, site_message
+
+        await run_in_order(jobs, check, concurrency, write_result, completion_order=True)
+
+
+async def check_with_aiohttp(session, url, timeout_duration):
+    """Checks url like check_website_availability does, HEAD first then GET, returns site_status and site_message."""
+    timeout = aiohttp.ClientTimeout(total=timeout_duration)
+    try:
+        async with session.head(url, allow_redirects=True, timeout=timeout) as response:
+            pass
+        if response.status in HEAD_FALLBACK_STATUSES:
+            async with session.get(url, timeout=timeout) as response:
+                pass    # the headers are enough, the content is not read
+    except aiohttp.ClientSSLError as e:
+        return navigation_status(url, error=e.os_error)     # ie: [SSL: CERTIFICATE_VERIFY_FAILED] certificate verify failed
+    except aiohttp.ClientConnectorError as e:
+        error = e.os_error
+        if (isinstance(error, ConnectionError) or type(error) is OSError) and error.errno:
+            error = OSError(error.errno, os.strerror(error.errno))     # worded like urllib, ie: [Errno 111] Connection refused
+        return navigation_status(url, error=error)
+    except Exception as e:
+        return navigation_status(url, error=e)     # timeouts count as LIVE there
+    redirect_chain = [str(previous.url) for previous in response.history]
+    return navigation_status(url, response.status, str(response.url) if redirect_chain else url, redirect_chain)
@@ -0,0 +1,226 @@
+import argparse
+import os
+import sys
+import time
+import warnings
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import similarity_measures
+
+
+# SSIM modes compared with the full resolution colour SSIM, as calculate_ssim keyword arguments
+SSIM_MODES = [{"gray": True},
+              {"width": 512},
+              {"gray": True, "width": 512},
+              {"gray": True, "width": 256},
+              {"window": "gaussian"},
+              {"engine": "numba"},
+              {"gray": True, "engine": "numba"},
+              {"gray": True, "width": 512, "engine": "numba"}]
+
+
+def make_pair(height, width, seed=0, noise_level=20):
+    """Creates a random screenshot and a noisy copy of it.
+
+    Parameters
+    ----------
+    height : int
+        Height of the screenshots in pixels.
+    width : int
+        Width of the screenshots in pixels.
+    seed : int
+        Seed of the random generator.
+    noise_level : int
+        Largest change of a pixel value in the copy.
+
+    Returns
+    -------
+    current_image, archive_image : ndarray
+        Two (height, width, 3) uint8 matrices.
+
+    """
+    rng = np.random.default_rng(seed)
+    current_image = rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    noise = rng.integers(-noise_level, noise_level + 1, (height, width, 3))
+    archive_image = np.clip(current_image.astype(np.int64) + noise, 0, 255).astype(np.uint8)
+    return current_image, archive_image
+
+
+def best_time(function, repeat):
+    """Runs function repeat times and returns the fastest run in seconds and its result."""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, result
+
+
+def benchmark_error_metrics(height, width, repeat):
+    """Compares calculate_error_metrics with the four separate error metric functions.
+
+    Parameters
+    ----------
+    height : int
+        Height of the screenshots in pixels.
+    width : int
+        Width of the screenshots in pixels.
+    repeat : int
+        Number of runs, the fastest one is reported.
+
+    """
+    current_image, archive_image = make_pair(height, width)
+
+    def separate():
+        return {"mse": similarity_measures.calculate_mse("", "", current_image, archive_image),
+                "nrmse": similarity_measures.calculate_nrmse(current_image, archive_image),
+                "psnr": similarity_measures.calculate_psnr(current_image, archive_image),
+                "percent": similarity_measures.calculate_percent("", "", current_image, archive_image)}
+
+    def fused():
+        return similarity_measures.calculate_error_metrics(current_image, archive_image)
+
+    fused()     # the numba kernel is compiled on its first call
+    separate_time, separate_scores = best_time(separate, repeat)
+    fused_time, fused_scores = best_time(fused, repeat)
+    difference = max(abs(separate_scores[metric] - fused_scores[metric]) for metric in separate_scores)
+
+    print("{0}x{1}: separate {2:.3f}s, fused {3:.3f}s, speedup {4:.1f}x, largest score difference {5:.2e}"
+          .format(width, height, separate_time, fused_time, separate_time / fused_time, difference))
+
+
+def make_page_pair(height, width, seed, noise_level):
+    """Creates a screenshot made of flat blocks, like a web page, and a changed copy of it.
+
+    The copy has some of its blocks recoloured and noise added, so pairs made with different
+    seeds and noise levels cover a range of SSIM scores.
+
+    """
+    rng = np.random.default_rng(seed)
+    block = 32
+    blocks = rng.integers(0, 256, ((height + block - 1) // block, (width + block - 1) // block, 3), dtype=np.uint8)
+    current_image = np.repeat(np.repeat(blocks, block, axis=0), block, axis=1)[:height, :width]
+    changed = blocks.copy()
+    mask = rng.random(blocks.shape[:2]) < noise_level / 100
+    changed[mask] = rng.integers(0, 256, (int(mask.sum()), 3), dtype=np.uint8)
+    archive_image = np.repeat(np.repeat(changed, block, axis=0), block, axis=1)[:height, :width]
+    noise = rng.integers(-noise_level, noise_level + 1, archive_image.shape)
+    archive_image = np.clip(archive_image.astype(np.int64) + noise, 0, 255).astype(np.uint8)
+    return np.ascontiguousarray(current_image), archive_image
+
+
+def read_pairs(csv_in_name, curr_img_dir, arch_img_dir, limit):
+    """Opens up to limit screenshot pairs listed in a get_file_names.py CSV file.
+
+    Returns
+    -------
+    pairs : list
+        (current_image, archive_image) tuples of RGB uint8 matrices.
+
+    """
+    import calculate_similarity
+
+    image_dict, url_name_dict = calculate_similarity.read_input_file(csv_in_name, curr_img_dir, arch_img_dir)
+    pairs = []
+    for current_image_name, archive_image_list in image_dict.items():
+        for archive_image_name in archive_image_list:
+            if len(pairs) >= limit:
+                return pairs
+            try:
+                current = similarity_measures.ScreenshotImage(current_image_name)
+                archive = similarity_measures.ScreenshotImage(archive_image_name)
+                pairs.append((current.array, archive.array))
+            except (OSError, ValueError):
+                continue
+    return pairs
+
+
+def benchmark_ssim_modes(pairs, repeat):
+    """Compares the speed and the scores of the SSIM modes with full resolution colour SSIM.
+
+    Parameters
+    ----------
+    pairs : list
+        (current_image, archive_image) tuples.
+    repeat : int
+        Number of runs, the fastest one is reported.
+
+    Notes
+    -----
+    The Pearson correlation shows how closely a mode ranks the pairs like full resolution
+    SSIM does, which is what matters when the scores are used to find changed pages.
+
+    """
+    def score_all(options):
+        return [similarity_measures.calculate_ssim("", "", current_image, archive_image, **options)
+                for current_image, archive_image in pairs]
+
+    if "numba" in similarity_measures.SSIM_ENGINES:
+        score_all({"engine": "numba"})     # the numba kernel is compiled on its first call
+    full_time, full_scores = best_time(lambda: score_all({}), repeat)
+    print("full resolution colour: {0:.3f}s".format(full_time))
+    for options in SSIM_MODES:
+        mode_time, mode_scores = best_time(lambda: score_all(options), repeat)
+        correlation = np.corrcoef(full_scores, mode_scores)[0, 1] if len(pairs) > 1 else float("nan")
+        label = "_".join(part for part in (similarity_measures.ssim_mode_label(**options), options.get("engine")) if part)
+        print("{0}: {1:.3f}s, speedup {2:.1f}x, correlation {3:.4f}, largest score difference {4:.3g}"
+              .format(label, mode_time, full_time / mode_time, correlation,
+                      max(abs(full - mode) for full, mode in zip(full_scores, mode_scores))))
+
+
+def parse_args():
+    """Parses the command line arguments.
+
+    Returns
+    -------
+    args.heights : list
+        Heights of the generated screenshots.
+    args.width : int
+        Width of the generated screenshots.
+    args.repeat : int
+        Number of runs of each measurement.
+    args.csv, args.currdir, args.archdir : str
+        Screenshot pairs to compare the SSIM modes on, generated pairs are used when empty.
+    args.pairs : int
+        Number of screenshot pairs the SSIM modes are compared on.
+
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--heights", type=str, default="768,10000",
+                        help="(optional) Comma separated heights of the generated screenshots, default 768,10000")
+    parser.add_argument("--width", type=int, default=1024, help="(optional) Width of the generated screenshots, default 1024")
+    parser.add_argument("--repeat", type=int, default=3, help="(optional) Number of runs of each measurement, default 3")
+    parser.add_argument("--csv", type=str, default="", help="(optional) CSV file from get_file_names.py with real screenshot pairs for the SSIM comparison")
+    parser.add_argument("--currdir", type=str, default="", help="(optional) Directory of the current screenshots listed in --csv")
+    parser.add_argument("--archdir", type=str, default="", help="(optional) Directory of the archive screenshots listed in --csv")
+    parser.add_argument("--pairs", type=int, default=12, help="(optional) Number of pairs the SSIM modes are compared on, default 12")
+
+    args = parser.parse_args()
+    heights = [int(height) for height in args.heights.split(",")]
+    return heights, args.width, args.repeat, args.csv, args.currdir, args.archdir, args.pairs
+
+
+def main():
+    heights, width, repeat, csv_in_name, curr_img_dir, arch_img_dir, pair_count = parse_args()
+    warnings.simplefilter("ignore")     # skimage warns about the divide by zero of identical images
+
+    print("Error metric kernel: ", similarity_measures.ERROR_KERNEL)
+    for height in heights:
+        benchmark_error_metrics(height, width, repeat)
+
+    if csv_in_name:
+        pairs = read_pairs(csv_in_name, curr_img_dir, arch_img_dir, pair_count)
+    else:
+        pairs = [make_page_pair(max(heights), width, seed, noise_level=5 + 60 * seed // max(pair_count - 1, 1))
+                 for seed in range(pair_count)]
+    print("SSIM modes on {} pairs:".format(len(pairs)))
+    benchmark_ssim_modes(pairs, repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+
+from PIL import Image
+
+
+class CaptureJournal:
+    """Append-only record of the finished captures of an index CSV, used to resume a run.
+
+    Parameters
+    ----------
+    index_csv_name : str
+        The index CSV of the run. The journal is kept next to it in <index_csv_name>.journal.
+
+    Notes
+    -----
+    Every finished row is appended to the journal as one line of JSON holding its key, its
+    index row and its screenshot file, and the line is flushed right away. A run that is killed
+    loses at most the line being written, which is ignored when the journal is read back.
+
+    """
+
+    def __init__(self, index_csv_name):
+        self.journal_name = index_csv_name + ".journal"
+        self.entries = {}
+        if os.path.exists(self.journal_name):
+            self.entries = read_journal(self.journal_name)
+            print("Resuming from {0}, {1} urls already captured".format(self.journal_name, len(self.entries)))
+        self.journal_file = open(self.journal_name, 'a')
+
+    def finished_row(self, key):
+        """Returns the index row of key if it does not need to be captured again, otherwise None.
+
+        A row is finished when its site could not be reached, or when its screenshot file exists
+        and can be opened as an image. Rows whose screenshot failed or went missing, and rows
+        that failed for a reason worth retrying, are captured again.
+
+        """
+        entry = self.entries.get(tuple(key))
+        if entry is None or entry.get("retry"):
+            return None
+        if entry["site_status"] == "FAIL" or is_valid_image(entry["file"]):
+            return entry["row"]
+        return None
+
+    def file_name(self, key):
+        """Returns the screenshot file journaled for key, None if key is not in the journal."""
+        entry = self.entries.get(tuple(key))
+        return entry["file"] if entry is not None else None
+
+    def record(self, key, row, site_status, file_name, retry=False):
+        """Appends a finished row to the journal, unless the journal already has the same entry.
+
+        retry marks a row that failed for a reason that may go away, the next run captures it again.
+
+        """
+        entry = {"key": list(key), "row": [str(value) for value in row], "site_status": site_status, "file": file_name,
+                 "retry": retry}
+        if self.entries.get(tuple(key)) == entry:
+            return
+        self.entries[tuple(key)] = entry
+        self.journal_file.write(json.dumps(entry) + "\n")
+        self.journal_file.flush()
+
+    def close(self):
+        self.journal_file.close()
+
+
+def read_journal(journal_name):
+    """Returns the last entry of each key in a journal, by key."""
+    entries = {}
+    with open(journal_name, 'r') as journal_file:
+        for line in journal_file:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                logging.info("Skipping a damaged journal line in {}".format(journal_name))
+                continue
+            entries[tuple(entry["key"])] = entry
+    return entries
+
+
+def is_valid_image(file_name):
+    """Returns True if file_name exists and PIL recognises it as an image."""
+    if not file_name or not os.path.exists(file_name) or os.path.getsize(file_name) == 0:
+        return False
+    try:
+        with Image.open(file_name):
+            return True
+    except Exception:
+        return False
@@ -0,0 +1,102 @@
+import asyncio
+import collections
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+def run_workers(jobs, capture, workers, write, completion_order=False):
+    """Runs capture on each job in a pool of threads and hands the results to one writer.
+
+    Parameters
+    ----------
+    jobs : iterable
+        The jobs, read only as far as needed, so a long input is never held in memory.
+    capture : function
+        Called with each job in a worker thread, returns its result.
+    workers : int
+        Number of worker threads. With 1 the jobs are captured one after the other in the
+        calling thread.
+    write : function
+        Called in the calling thread with each result.
+    completion_order : bool
+        Write the results as they finish instead of in the order of jobs.
+
+    Notes
+    -----
+    At most twice as many jobs as workers are started ahead of the writer. In input order a
+    slow job holds back the results after it until it finishes; in completion order it does not.
+
+    """
+    if workers <= 1:
+        for job in jobs:
+            write(capture(job))
+        return
+
+    window = workers * 2
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = collections.deque()
+        try:
+            for job in jobs:
+                pending.append(executor.submit(capture, job))
+                if len(pending) >= window:
+                    write_finished(pending, write, completion_order)
+            while pending:
+                write_finished(pending, write, completion_order)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def write_finished(pending, write, completion_order):
+    """Waits for the next result of pending and writes it, or all finished ones in completion order."""
+    if not completion_order:
+        write(pending.popleft().result())
+        return
+
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in [future for future in pending if future in done]:
+        pending.remove(future)
+        write(future.result())
+
+
+async def run_in_order(jobs, capture, workers, write, completion_order=False):
+    """Runs the coroutine capture on each job with several running at once, the asyncio counterpart of run_workers.
+
+    Parameters
+    ----------
+    jobs : iterable
+        The jobs, read only as far as needed.
+    capture : coroutine function
+        Called with each job, returns its result.
+    workers : int
+        Number of captures running at once. Up to twice as many are started so that the next
+        captures can begin while an earlier one finishes.
+    write : function
+        Called with each result, in the order of jobs.
+    completion_order : bool
+        Write the results as they finish instead of in the order of jobs.
+
+    """
+    window = max(1, workers) * 2
+    pending = collections.deque()
+    try:
+        for job in jobs:
+            pending.append(asyncio.ensure_future(capture(job)))
+            if len(pending) >= window:
+                await write_finished_tasks(pending, write, completion_order)
+        while pending:
+            await write_finished_tasks(pending, write, completion_order)
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def write_finished_tasks(pending, write, completion_order):
+    """write_finished for the asyncio tasks of run_in_order."""
+    if not completion_order:
+        write(await pending.popleft())
+        return
+
+    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+    for task in [task for task in pending if task in done]:
+        pending.remove(task)
+        write(task.result())
@@ -1,7 +1,7 @@
 import csv
 import sys
-import requests
 from tqdm import tqdm
+from http_client_mod import shared_client
 
 def main():
     input_csv = sys.argv[1]
@@ -23,7 +23,7 @@ def main():
             new_url = new_archive + archive_url # replaced url, request it next
 
             try:                                         # try request with url
-                page = requests.get(new_url)
+                page = shared_client().probe(new_url)  # only the url redirected to is needed, not the page
                 url_with_closest_date = page.url
                 date_index_start = url_with_closest_date.index('web/') + 4
                 date_index_end = date_index_start + 14
@@ -0,0 +1,101 @@
+import logging
+import os
+from array import array
+
+
+def offsets_file_name(csv_name):
+    """Returns the sidecar file holding the row offsets of csv_name."""
+    return csv_name + ".offsets"
+
+
+def build_offsets(csv_name):
+    """Returns the byte offset of the start of every row of csv_name after the header.
+
+    Parameters
+    ----------
+    csv_name : str
+        The CSV file to index.
+
+    Returns
+    -------
+    offsets : array.array
+        Offsets of type 'q', offsets[0] is where row 1 starts.
+
+    Notes
+    -----
+    A quoted field can hold a newline, so a line only ends a row when it leaves an even
+    number of quotes open in the row, the same way csv.reader splits rows.
+
+    """
+    offsets = array('q')
+    position = 0
+    quotes = 0
+    row_start = None
+    with open(csv_name, 'rb') as csv_file:
+        for line in csv_file:
+            if quotes % 2 == 0:
+                row_start = position
+            quotes += line.count(b'"')
+            position += len(line)
+            if quotes % 2 == 0:
+                offsets.append(row_start)
+                quotes = 0
+    if offsets:
+        offsets.pop(0)  # the header row
+    return offsets
+
+
+def load_offsets(csv_name):
+    """Returns the row offsets of csv_name, from its sidecar file if it is still current.
+
+    The sidecar starts with the size and modification time of the CSV it was built from, so
+    it is built again as soon as the CSV changes. Building is done once by whichever run gets
+    there first; the others read the file it leaves.
+
+    """
+    stat = os.stat(csv_name)
+    offsets_name = offsets_file_name(csv_name)
+    try:
+        with open(offsets_name, 'rb') as offsets_file:
+            saved = array('q')
+            saved.frombytes(offsets_file.read())
+        if len(saved) >= 2 and saved[0] == stat.st_size and saved[1] == stat.st_mtime_ns:
+            return saved[2:]
+    except (OSError, ValueError):
+        pass
+
+    offsets = build_offsets(csv_name)
+    saved = array('q', [stat.st_size, stat.st_mtime_ns])
+    saved.extend(offsets)
+    temp_name = "{0}.{1}".format(offsets_name, os.getpid())
+    try:
+        with open(temp_name, 'wb') as offsets_file:
+            saved.tofile(offsets_file)
+        os.replace(temp_name, offsets_name)  # readers never see a half written index
+    except OSError as e:
+        logging.info("Could not save the row offsets of {0}: {1}".format(csv_name, e))
+    return offsets
+
+
+def seek_row(csv_file, row):
+    """Moves csv_file to the start of row, counting the first row after the header as 1.
+
+    Parameters
+    ----------
+    csv_file : file object
+        The CSV file, opened for reading and not read from yet.
+    row : int
+        The row to move to.
+
+    Returns
+    -------
+    found : bool
+        False if the CSV has fewer rows, csv_file is then left where it was.
+
+    """
+    offsets = load_offsets(csv_file.name)
+    row = max(1, row)
+    if row > len(offsets):
+        return False
+    csv_file.seek(offsets[row - 1])
+    return True
@@ -11,6 +11,8 @@ from selenium.webdriver import FirefoxOptions
 from selenium.webdriver.support.ui import WebDriverWait
 import time
 
+from page_settle_mod import PageSettle
+
 def get_cosine_similarity(archive_title,current_title):
 
     X = current_title.lower()
@@ -77,6 +79,7 @@ def content_drift_check(csv_in, csv_out, threshold):
     opts = FirefoxOptions()
     opts.add_argument("--headless")
     driver = webdriver.Firefox(firefox_options=opts)
+    page_settle = PageSettle(max_wait_ms=5000)    # titles set by scripts are in once the page settled
 
     with open(csv_in, 'r') as csv_file_in:
         csv_reader = csv.reader(csv_file_in)
@@ -128,12 +131,14 @@ def content_drift_check(csv_in, csv_out, threshold):
                         # driver.manage().timeouts().implicitlyWait(10, TimeUnit.SECONDS);
                         # driver.implicitly_wait(10, TimeUnit.SECONDS)
                         # WebDriverWait(driver, 10)
-                        time.sleep(5);
+                        settle_seconds, settled = page_settle.wait_selenium(driver)
+                        logging.info("current url settled in {0:.2f}s ({1})".format(settle_seconds, "settled" if settled else "max wait"))
 
                         current_title = driver.title
                         # driver.close()
                         driver.get(archive_url)
-                        # time.sleep(10);
+                        settle_seconds, settled = page_settle.wait_selenium(driver)
+                        logging.info("archive url settled in {0:.2f}s ({1})".format(settle_seconds, "settled" if settled else "max wait"))
                         # driver.manage().timeouts().implicitlyWait(10, TimeUnit.SECONDS);
                         archive_title = driver.title
                         # driver.close()
@@ -0,0 +1,198 @@
+import collections
+import fcntl
+import logging
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+# site messages of check_website_availability that mean the host is asking us to slow down
+THROTTLE_MESSAGES = ("HTTPError: 429", "HTTPError: 503")
+
+
+def interleave_hosts(rows, host_of, lookahead=1000):
+    """Yields rows taking turns between their hosts, so the same host is not visited many times in a row.
+
+    Parameters
+    ----------
+    rows : iterable
+        The rows, read only lookahead rows ahead of the ones yielded.
+    host_of : function
+        Returns the host of a row.
+    lookahead : int
+        Number of rows read ahead to find other hosts. Past that, a host with more rows than
+        the others is visited more often.
+
+    """
+    queues = collections.OrderedDict()
+    buffered = 0
+    rows = iter(rows)
+    exhausted = False
+    while True:
+        while not exhausted and buffered < lookahead:
+            try:
+                row = next(rows)
+            except StopIteration:
+                exhausted = True
+                break
+            queues.setdefault(host_of(row), collections.deque()).append(row)
+            buffered += 1
+        if not queues:
+            return
+
+        host, queue = queues.popitem(last=False)
+        yield queue.popleft()
+        buffered -= 1
+        if queue:
+            queues[host] = queue    # back of the line
+
+
+class HostScheduler:
+    """Limits how many captures of one host run at once and how often they start, across processes.
+
+    Parameters
+    ----------
+    state_dir : str
+        Directory of the lock files shared by every capture process on the machine. None for a
+        directory in the temporary directory.
+    host_concurrency : int
+        Largest number of captures of one host running at once, 0 for no limit.
+    host_rate : float
+        Largest number of captures of one host started per second, 0 for no limit.
+    backoff : int
+        Seconds every capture waits after a host answers 429 or 503. The wait doubles each
+        time the throttling comes back right after a wait, up to max_backoff.
+    max_backoff : int
+        Longest wait after throttling, in seconds.
+
+    Notes
+    -----
+    The state lives in files locked with flock, so the instances started by the submit
+    scripts share the limits of each host, and a lock held by a process that dies is released
+    with it. Each host has host_concurrency slot files, a capture holds the lock of one of them
+    while it runs. The start time given to the next capture of each host is kept in a rate
+    file, and the end of the current backoff in a file every capture checks before it starts.
+
+    """
+
+    def __init__(self, state_dir=None, host_concurrency=0, host_rate=0, backoff=30, max_backoff=600):
+        self.state_dir = state_dir or os.path.join(tempfile.gettempdir(), "screenshot_compare_hosts")
+        os.makedirs(self.state_dir, exist_ok=True)
+        self.host_concurrency = host_concurrency
+        self.host_rate = host_rate
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+    def state_file(self, host, kind):
+        host = re.sub(r'[^A-Za-z0-9.-]', '_', host or "unknown")
+        return os.path.join(self.state_dir, "{0}.{1}".format(host, kind))
+
+    @contextmanager
+    def locked_file(self, file_name):
+        """Context manager opening file_name for reading and writing while holding its lock."""
+        with open(file_name, 'a+') as state_file:
+            fcntl.flock(state_file, fcntl.LOCK_EX)
+            state_file.seek(0)
+            yield state_file
+
+    def acquire(self, url):
+        """Waits until a capture of url may start.
+
+        Returns
+        -------
+        slot : file object
+            The locked slot file, to hand to release when the capture is done. None without
+            a concurrency limit.
+
+        """
+        host = urlparse(url).hostname
+        slot = self.acquire_slot(host) if self.host_concurrency > 0 else None
+        try:
+            self.wait_for_backoff()
+            self.wait_for_rate(host)
+        except:
+            self.release(slot)
+            raise
+        return slot
+
+    def release(self, slot):
+        """Frees the slot returned by acquire."""
+        if slot is not None:
+            slot.close()    # closing the file releases its lock
+
+    @contextmanager
+    def slot(self, url):
+        """Context manager holding a slot of the host of url during one capture."""
+        slot = self.acquire(url)
+        try:
+            yield
+        finally:
+            self.release(slot)
+
+    def acquire_slot(self, host):
+        """Locks one of the slot files of host, waiting for a capture to finish if all are locked."""
+        while True:
+            for number in range(self.host_concurrency):
+                slot = open(self.state_file(host, "slot{}".format(number)), 'a')
+                try:
+                    fcntl.flock(slot, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    return slot
+                except OSError:
+                    slot.close()
+            time.sleep(0.2)
+
+    def wait_for_rate(self, host):
+        """Takes the next start time of host and sleeps until then."""
+        if self.host_rate <= 0:
+            return
+        with self.locked_file(self.state_file(host, "rate")) as rate_file:
+            now = time.time()
+            text = rate_file.read().strip()
+            start = max(now, float(text)) if text else now
+            rate_file.seek(0)
+            rate_file.truncate()
+            rate_file.write(repr(start + 1 / self.host_rate))
+        time.sleep(start - now)
+
+    def read_backoff(self, backoff_file):
+        """Returns the end of the current backoff and its length, from the backoff file."""
+        try:
+            until, delay = (float(value) for value in backoff_file.read().split())
+            return until, delay
+        except ValueError:
+            return 0, 0
+
+    def wait_for_backoff(self):
+        """Sleeps until the backoff after the last throttling, of any process, is over."""
+        while True:
+            with self.locked_file(os.path.join(self.state_dir, "backoff")) as backoff_file:
+                until, _ = self.read_backoff(backoff_file)
+            remaining = until - time.time()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+    def throttled(self):
+        """Makes every capture wait after a host answered 429 or 503."""
+        with self.locked_file(os.path.join(self.state_dir, "backoff")) as backoff_file:
+            until, delay = self.read_backoff(backoff_file)
+            now = time.time()
+            if until > now:
+                return  # captures started before the backoff do not lengthen it
+            if now - until < delay:
+                delay = min(self.max_backoff, delay * 2)    # throttled again right after the last wait
+            else:
+                delay = self.backoff
+            backoff_file.seek(0)
+            backoff_file.truncate()
+            backoff_file.write("{0!r} {1!r}".format(now + delay, delay))
+        print("Throttled, waiting {} seconds before the next capture".format(delay))
+        logging.info("Throttled, waiting {} seconds before the next capture".format(delay))
+
+    @staticmethod
+    def is_throttling(site_message):
+        """Returns True if site_message says the host throttled the request."""
+        return str(site_message) in THROTTLE_MESSAGES
@@ -0,0 +1,152 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+from shard_mod import url_host
+
+
+def is_timeout(message):
+    """Returns True if a site or screenshot message, or the error given as one, is about a timeout."""
+    if isinstance(message, BaseException) and "timeout" in type(message).__name__.lower():
+        return True
+    message = str(message).lower()
+    return "timeout" in message or "timed out" in message
+
+
+class HostTimeouts:
+    """Timeouts of each host learned from how long its earlier checks and captures took.
+
+    Parameters
+    ----------
+    stats_file : str
+        JSON file keeping the statistics between runs.
+    min_timeout : int
+        Shortest timeout given to any host, in seconds.
+    max_timeout : int
+        Longest timeout given to any host, in seconds.
+    factor : float
+        The timeout of a host is its 95th percentile duration times factor.
+    fail_fast_after : int
+        Number of timeouts in a row after which the urls of a host are not tried for
+        fail_fast_for seconds, 0 to always try them.
+    fail_fast_for : int
+        Seconds a host that keeps timing out is skipped, afterwards one url is tried again.
+    samples : int
+        Number of recent durations kept for each host and kind.
+
+    Notes
+    -----
+    Checks (the liveness request) and captures (loading and rendering the page) are timed
+    separately. A host needs 5 durations of a kind before its timeout replaces the default
+    one. A timeout counts as a duration as long as the timeout, so a slow host that keeps
+    timing out gets a longer timeout the next time, up to max_timeout. Timeouts are told from
+    the error or message (see is_timeout), not from the duration, which also holds the wait for
+    the page to settle and the rendering. Archive urls are timed by the site they captured.
+
+    """
+
+    PERCENTILE = 95
+    MIN_SAMPLES = 5
+
+    def __init__(self, stats_file, min_timeout=5, max_timeout=120, factor=2.0, fail_fast_after=3,
+                 fail_fast_for=3600, samples=50):
+        self.stats_file = stats_file
+        self.min_timeout = min_timeout
+        self.max_timeout = max_timeout
+        self.factor = factor
+        self.fail_fast_after = fail_fast_after
+        self.fail_fast_for = fail_fast_for
+        self.samples = samples
+        self.lock = threading.Lock()
+        self.changed_hosts = set()
+        self.stats = self.load()
+
+    def load(self):
+        try:
+            with open(self.stats_file, 'r') as stats_file:
+                return json.load(stats_file)
+        except (OSError, ValueError):
+            return {}
+
+    def host_stats(self, url):
+        return self.stats.setdefault(url_host(url), {"check": [], "capture": [], "timeouts": 0, "last_timeout": 0})
+
+    def timeout(self, url, kind, default):
+        """Returns the timeout of url for kind, "check" or "capture", in whole seconds."""
+        with self.lock:
+            durations = sorted(self.host_stats(url)[kind])
+        if len(durations) < self.MIN_SAMPLES:
+            return default
+        high = durations[min(len(durations) - 1, math.ceil(len(durations) * self.PERCENTILE / 100) - 1)]
+        return int(min(self.max_timeout, max(self.min_timeout, math.ceil(high * self.factor))))
+
+    def fail_fast(self, url):
+        """Returns why url is skipped if its host timed out too many times in a row lately, otherwise None."""
+        if self.fail_fast_after <= 0:
+            return None
+        with self.lock:
+            stats = self.host_stats(url)
+            if stats["timeouts"] < self.fail_fast_after or time.time() - stats["last_timeout"] > self.fail_fast_for:
+                return None
+            return "Skipped, {0} timed out {1} times in a row".format(url_host(url), stats["timeouts"])
+
+    def skipped_until(self, url):
+        """Returns the time the host of url stops being skipped by fail_fast, None if it is not skipped."""
+        if self.fail_fast(url) is None:
+            return None
+        with self.lock:
+            return self.host_stats(url)["last_timeout"] + self.fail_fast_for
+
+    def record(self, url, kind, seconds, timeout_duration, message):
+        """Adds how long a check or capture of url took.
+
+        Parameters
+        ----------
+        url : str
+            The url checked or captured.
+        kind : str
+            "check" or "capture".
+        seconds : float
+            How long it took.
+        timeout_duration : int
+            The timeout it was given.
+        message : str or Exception
+            Its site or screenshot message, or the error it raised. Only a timeout error or a
+            message about a timeout counts as a timeout.
+
+        """
+        timed_out = is_timeout(message)
+        with self.lock:
+            stats = self.host_stats(url)
+            stats[kind] = (stats[kind] + [round(max(seconds, timeout_duration) if timed_out else seconds, 2)])[-self.samples:]
+            if timed_out:
+                stats["timeouts"] += 1
+                stats["last_timeout"] = time.time()
+            else:
+                stats["timeouts"] = 0
+            self.changed_hosts.add(url_host(url))
+            save = len(self.changed_hosts) >= 50
+        if save:
+            self.save()
+
+    def save(self):
+        """Writes the statistics of the hosts seen by this run into stats_file.
+
+        The file is read again first, so the hosts other processes saved in the meantime are kept.
+
+        """
+        with self.lock:
+            stats = self.load()
+            for host in self.changed_hosts:
+                stats[host] = self.stats[host]
+            self.changed_hosts = set()
+            temp_name = "{0}.{1}".format(self.stats_file, os.getpid())
+            try:
+                with open(temp_name, 'w') as stats_file:
+                    json.dump(stats, stats_file)
+                os.replace(temp_name, self.stats_file)
+            except OSError as e:
+                logging.info("Could not save the host timeouts to {0}: {1}".format(self.stats_file, e))
@@ -0,0 +1,188 @@
+import http.cookiejar
+import logging
+import re
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+
+# statuses some servers give HEAD requests only, the url is asked again with GET before trusting them
+HEAD_FALLBACK_STATUSES = (400, 403, 405, 406, 501)
+
+_shared_client = None
+_shared_lock = threading.Lock()
+
+
+class DnsCache:
+    """The DNS lookups of the connections of one HttpClient, each kept for ttl seconds.
+
+    Parameters
+    ----------
+    ttl : int
+        Seconds a lookup is kept.
+
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def addresses(self, host, port):
+        """Returns the addresses host resolves to, in the order of getaddrinfo.
+
+        Failed lookups raise and are not cached.
+
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get((host, port))
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        addresses = []
+        for family, kind, proto, canonname, sockaddr in socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM):
+            if sockaddr[0] not in addresses:
+                addresses.append(sockaddr[0])
+        with self.lock:
+            self.entries[(host, port)] = (now + self.ttl, addresses)
+        return addresses
+
+
+class CachedDnsConnection:
+    """Mixed into the urllib3 connection classes to connect to the address of dns_cache.
+
+    Only the address connected to changes, the Host header and the name the TLS certificate
+    is checked against stay the host of the url. As urllib3 does, each address of the host
+    is tried in turn until one accepts the connection, and the error of the last one is raised.
+
+    """
+
+    dns_cache = None
+
+    def _new_conn(self):
+        dns_host = self._dns_host
+        try:
+            addresses = self.dns_cache.addresses(dns_host, self.port)
+        except OSError:
+            return super()._new_conn()    # urllib3 looks the host up itself and raises its usual error
+        error = None
+        try:
+            for address in addresses:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+            raise error
+        finally:
+            self._dns_host = dns_host
+
+
+class CachedDnsAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections look their hosts up in dns_cache instead of every time."""
+
+    def __init__(self, dns_cache, **kwargs):
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        attributes = {"dns_cache": self.dns_cache}
+        http_pool = type("CachedDnsHTTPConnectionPool", (HTTPConnectionPool,), {
+            "ConnectionCls": type("CachedDnsHTTPConnection", (CachedDnsConnection, HTTPConnection), attributes)})
+        https_pool = type("CachedDnsHTTPSConnectionPool", (HTTPSConnectionPool,), {
+            "ConnectionCls": type("CachedDnsHTTPSConnection", (CachedDnsConnection, HTTPSConnection), attributes)})
+        self.poolmanager.pool_classes_by_scheme = {"http": http_pool, "https": https_pool}
+
+
+def error_reason(error):
+    """Returns the reason of a requests error the way urllib words it, ie: [Errno 111] Connection refused."""
+    match = re.search(r"\[Errno -?\d+\][^)\"']*", str(error))
+    return match.group(0).strip() if match else str(error)
+
+
+class HttpClient:
+    """The HTTP connections shared by every request of the process to a host.
+
+    Parameters
+    ----------
+    timeout : int
+        Seconds to wait for a connection and then for each read, unless a request gives its own.
+    pool_size : int
+        Number of connections kept open to each host, at least the number of threads making requests.
+    dns_ttl : int
+        Seconds the DNS lookups of this client are cached, 0 to look up every new connection.
+        The cache only serves this client, other libraries of the process look up as usual.
+
+    Notes
+    -----
+    Connections are kept alive between requests, so the urls of the same host, such as the
+    mementos of one archive, skip the TCP and TLS handshakes after the first one. Cookies are
+    never stored, so one request cannot change the answer to the next as it could with a
+    browser.
+
+    Examples
+    --------
+    >>> response = shared_client().probe("https://example.com")
+    >>> response.status_code, response.url, response.history
+
+    """
+
+    def __init__(self, timeout=30, pool_size=20, dns_ttl=300):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        if dns_ttl > 0:
+            adapter = CachedDnsAdapter(DnsCache(dns_ttl), pool_connections=pool_size, pool_maxsize=pool_size)
+        else:
+            adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, timeout=None, **kwargs):
+        """GET url following redirects, returns the requests.Response."""
+        return self.session.get(url, timeout=timeout or self.timeout, **kwargs)
+
+    def probe(self, url, timeout=None):
+        """Asks for url without downloading its content, following redirects.
+
+        HEAD is tried first. If the server refuses it, the url is asked with GET and the
+        connection is closed once the headers arrive.
+
+        Returns
+        -------
+        response : requests.Response
+            The response of the final url, with the redirects in response.history.
+
+        Raises
+        ------
+        requests.exceptions.RequestException
+            If the url could not be reached or timed out.
+
+        """
+        timeout = timeout or self.timeout
+        response = self.session.head(url, timeout=timeout, allow_redirects=True)
+        response.close()
+        if response.status_code in HEAD_FALLBACK_STATUSES:
+            logging.info("HEAD {0} answered {1}, asking with GET".format(url, response.status_code))
+            response = self.session.get(url, timeout=timeout, stream=True)
+            response.close()
+        return response
+
+    def close(self):
+        self.session.close()
+
+
+def shared_client():
+    """Returns the HttpClient of the process, made the first time it is needed."""
+    global _shared_client
+    with _shared_lock:
+        if _shared_client is None:
+            _shared_client = HttpClient()
+        return _shared_client
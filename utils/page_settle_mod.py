@@ -0,0 +1,89 @@
+import logging
+import time
+
+
+# resolves once the page loaded, its images and fonts are in, and neither the network nor the DOM
+# changed for quietMs, or after maxMs whatever the page is doing
+SETTLE_SCRIPT = """
+(quietMs, maxMs, done) => {
+    const start = performance.now();
+    let last = start;
+    const touch = () => { last = performance.now(); };
+    const mutations = new MutationObserver(touch);
+    mutations.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+    let resources = null;
+    try {
+        resources = new PerformanceObserver(touch);
+        resources.observe({entryTypes: ['resource']});
+    } catch (e) {}
+    const mediaLoaded = () => Array.from(document.images).every(image => image.complete) &&
+        (!document.fonts || document.fonts.status === 'loaded');
+    const check = () => {
+        const now = performance.now();
+        const settled = document.readyState === 'complete' && mediaLoaded() && now - last >= quietMs;
+        if (settled || now - start >= maxMs) {
+            mutations.disconnect();
+            if (resources) resources.disconnect();
+            done({settled: settled, waited: Math.round(now - start)});
+        } else {
+            setTimeout(check, 50);
+        }
+    };
+    check();
+}
+"""
+
+
+class PageSettle:
+    """Waits until a page in a browser has settled, instead of sleeping for a fixed time.
+
+    Parameters
+    ----------
+    quiet_ms : int
+        How long no request may finish and the DOM may not change before the page counts as settled.
+    max_wait_ms : int
+        Longest wait, pages that never settle (tickers, animations, polling) are captured after it.
+    fixed_delay_ms : int
+        Wait of the browsers that cannot run the script, cutycapt waits this long after loading.
+
+    Notes
+    -----
+    The same script runs in pyppeteer, in selenium and in the title fetcher. Finished
+    requests are seen through the resource timing of the page, and requests that never finish,
+    like long polling, do not hold it back.
+
+    """
+
+    def __init__(self, quiet_ms=500, max_wait_ms=10000, fixed_delay_ms=2000):
+        self.quiet_ms = quiet_ms
+        self.max_wait_ms = max_wait_ms
+        self.fixed_delay_ms = fixed_delay_ms
+
+    async def wait_pyppeteer(self, page):
+        """Waits for a pyppeteer page, returns the seconds waited and whether the page settled."""
+        start = time.time()
+        try:
+            result = await page.evaluate("(quietMs, maxMs) => new Promise(resolve => ({0})(quietMs, maxMs, resolve))"
+                                         .format(SETTLE_SCRIPT), self.quiet_ms, self.max_wait_ms)
+            return time.time() - start, bool(result and result.get("settled"))
+        except Exception as e:
+            logging.info("Waiting for the page to settle failed: {}".format(e))
+            return time.time() - start, False
+
+    def wait_selenium(self, driver):
+        """Waits for the page of a selenium driver, returns the seconds waited and whether the page settled."""
+        start = time.time()
+        try:
+            driver.set_script_timeout(self.max_wait_ms / 1000 + 5)
+            result = driver.execute_async_script("return ({0})(arguments[0], arguments[1], arguments[arguments.length - 1]);"
+                                                 .format(SETTLE_SCRIPT), self.quiet_ms, self.max_wait_ms)
+            return time.time() - start, bool(result and result.get("settled"))
+        except Exception as e:
+            logging.info("Waiting for the page to settle failed: {}".format(e))
+            return time.time() - start, False
+
+
+def log_timing(url, load_seconds, settle_seconds, settled, render_seconds):
+    """Logs how long a capture spent loading, waiting for the page to settle and rendering."""
+    logging.info("Timing {0}: load {1:.2f}s, settle {2:.2f}s ({3}), render {4:.2f}s".format(
+        url, load_seconds, settle_seconds, "settled" if settled else "max wait", render_seconds))
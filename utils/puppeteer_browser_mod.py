@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import time
+
+from capture_workers_mod import run_in_order
+from page_settle_mod import PageSettle, log_timing
+from website_exists_mod import navigation_status
+
+
+# buttons clicked through to remove popups and banners when cookies are not kept, there could be a lot more
+POPUP_BUTTONS = ["I Accept", "I Understand", "I Agree", "Accept Recommended Settings", "Close", "Close and Accept",
+                 "OK", "OK, I Understand.", "Accept", "Accept Cookies", "No Thanks"]
+
+
+class PuppeteerBrowser:
+    """One headless Chromium shared by all the pyppeteer screenshots of a run.
+
+    Parameters
+    ----------
+    chrome_args : list
+        Contains extra arguments for chrome that can be passed into pyppeteer. None if no additional arguments.
+    screensize : list
+        Contains two int which are height and width of the browser viewport.
+    pages : int
+        Largest number of pages rendered at the same time.
+    request_filter : RequestFilter
+        Decides which requests of the pages are aborted. None to let pages load everything.
+    page_settle : PageSettle
+        Decides when a loaded page is ready for its screenshot. None for the default quiet window
+        and max wait.
+
+    Notes
+    -----
+    Each screenshot gets its own incognito browser context, so pages rendered at the same
+    time or one after the other share no cookies, storage or cache. If Chromium exits it is
+    launched again for the next screenshot.
+
+    References
+    ----------
+    .. [1] https://pypi.org/project/pyppeteer/
+
+    .. [2] https://github.com/ukwa/webrender-puppeteer/blob/6fcc719d64dc19a4929c02d3a445a8283bee5195/renderer.js
+
+    """
+
+    def __init__(self, chrome_args=None, screensize=(768, 1024), pages=1, request_filter=None, page_settle=None):
+        self.chrome_args = chrome_args or []
+        self.request_filter = request_filter
+        self.page_settle = page_settle or PageSettle()
+        self.screensize = screensize
+        self.page_slots = asyncio.Semaphore(max(1, pages))
+        self.launch_lock = asyncio.Lock()
+        self.browser = None
+
+    async def get_browser(self):
+        """Returns the running browser, launching it if it is not running."""
+        from pyppeteer import launch
+
+        async with self.launch_lock:
+            if self.browser is not None and self.browser.process.poll() is not None:
+                logging.info("Chromium exited, launching it again")
+                self.browser = None
+            if self.browser is None:
+                self.browser = await launch(headless=True, dumpio=True, args=self.chrome_args,
+                                            handleSIGINT=False, handleSIGTERM=False, handleSIGHUP=False)
+            return self.browser
+
+    async def screenshot(self, url, output_file_name, timeout_duration, keep_cookies, screenshot_on_timeout=False,
+                         check_response=False):
+        """Takes a screenshot of url in a new incognito page.
+
+        Parameters
+        ----------
+        url : str
+            The url to take a screenshot of.
+        output_file_name : str
+            The screenshot file.
+        timeout_duration : int
+            Duration before timeout when loading the page, in seconds. The whole screenshot
+            has to finish within twice this plus a minute.
+        keep_cookies : bool
+            Whether or not to run click_button() to attempt to remove cookies banners. False to remove.
+        screenshot_on_timeout : bool
+            Take the screenshot of whatever loaded when the page load times out, then raise the
+            timeout error.
+        check_response : bool
+            Skip the screenshot if the response of the page is an HTTP error, so the response can
+            stand in for a separate liveness check.
+
+        Returns
+        -------
+        site_status : str
+            LIVE or FAIL, derived from the response of the page by navigation_status. None
+            without check_response.
+        site_message : str
+            The reason for site_status.
+
+        Raises
+        ------
+        pyppeteer.errors.TimeoutError
+            If the page did not load in time or the screenshot missed its deadline.
+
+        """
+        from pyppeteer import errors
+
+        deadline = timeout_duration * 2 + 60
+        async with self.page_slots:
+            browser = await self.get_browser()
+            context = await browser.createIncognitoBrowserContext()
+            try:
+                return await asyncio.wait_for(self.render(context, url, output_file_name, timeout_duration,
+                                                          keep_cookies, screenshot_on_timeout, check_response), deadline)
+            except asyncio.TimeoutError:
+                raise errors.TimeoutError("Screenshot deadline of {} seconds exceeded".format(deadline))
+            finally:
+                try:
+                    await context.close()
+                except Exception as e:
+                    # https://github.com/GoogleChrome/puppeteer/issues/2269
+                    logging.info("Closing the browser context failed: {}".format(e))
+
+    async def render(self, context, url, output_file_name, timeout_duration, keep_cookies, screenshot_on_timeout,
+                     check_response=False):
+        from pyppeteer import errors
+
+        page = await context.newPage()
+        await page.setViewport({'height': self.screensize[0], 'width': self.screensize[1]})
+        if self.request_filter is not None:
+            await self.filter_requests(page)
+        try:
+            start = time.time()
+            response = await page.goto(url, timeout=(timeout_duration * 1000))
+            loaded = time.time()
+            site_status = site_message = None
+            if check_response:
+                if response is None:
+                    site_status, site_message = navigation_status(url)
+                else:
+                    site_status, site_message = navigation_status(url, response.status, response.url,
+                                                                  [request.url for request in response.request.redirectChain])
+                if site_status == "FAIL":
+                    return site_status, site_message    # no screenshot of error pages
+            settle_seconds, settled = await self.page_settle.wait_pyppeteer(page)
+
+            if not keep_cookies:
+                for button_text in POPUP_BUTTONS:
+                    await click_button(page, button_text)
+                await page.keyboard.press("Escape")
+        except errors.TimeoutError:
+            if screenshot_on_timeout:
+                await page.screenshot(path=output_file_name)
+            raise
+
+        rendering = time.time()
+        await page.screenshot(path=output_file_name)
+        log_timing(url, loaded - start, settle_seconds, settled, time.time() - rendering)
+        return site_status, site_message
+
+    async def filter_requests(self, page):
+        """Aborts the requests of page that request_filter blocks, and counts the ones it loads."""
+        request_filter = self.request_filter
+        await page.setRequestInterception(True)
+
+        def on_request(request):
+            if request_filter.blocks(request.url, request.resourceType, request.isNavigationRequest()):
+                request_filter.count(blocked=1)
+                asyncio.ensure_future(settle(request.abort('blockedbyclient')))
+            else:
+                asyncio.ensure_future(settle(request.continue_()))
+
+        def on_response(response):
+            try:
+                loaded_bytes = int(response.headers.get('content-length', 0))
+            except ValueError:
+                loaded_bytes = 0
+            request_filter.count(loaded=1, loaded_bytes=loaded_bytes)
+
+        page.on('request', on_request)
+        page.on('response', on_response)
+
+    async def close(self):
+        """Closes the browser."""
+        async with self.launch_lock:
+            if self.browser is not None:
+                try:
+                    await self.browser.close()
+                except Exception as e:
+                    logging.info("Closing Chromium failed: {}".format(e))
+                self.browser = None
+
+
+async def settle(coroutine):
+    """Awaits an interception answer, which fails if the page was closed before it was sent."""
+    try:
+        await coroutine
+    except Exception as e:
+        logging.info("Request interception failed: {}".format(e))
+
+
+async def click_button(page, button_text):
+    """Execute js script on page to click button
+
+    Parameters
+    ----------
+    page : pyppeteer.page.Page
+        The page to go through
+    button_text: str
+        Name of the button to click
+
+    References
+    ----------
+    .. [1] https://github.com/ukwa/webrender-puppeteer/blob/6fcc719d64dc19a4929c02d3a445a8283bee5195/renderer.js
+
+    Notes
+    -----
+    Right now only clicks popups and banners that are buttons, but some sites have banners with using a or wb_divs
+
+
+    """
+    await page.evaluate('''query => {
+      const elements = [...document.querySelectorAll('button')];
+      const targetElement = elements.find(e => e.innerText.toLowerCase().includes(query));
+      targetElement && targetElement.click();
+      }''', button_text.lower())
+
+
+def capture_all(jobs, capture, workers, write, browser, completion_order=False):
+    """Drives run_in_order from one event loop and closes browser at the end.
+
+    Parameters
+    ----------
+    jobs, capture, workers, write, completion_order
+        See run_in_order.
+    browser : PuppeteerBrowser
+        The browser used by capture.
+
+    """
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(run_in_order(jobs, capture, workers, write, completion_order))
+    finally:
+        loop.run_until_complete(browser.close())
@@ -0,0 +1,116 @@
+import json
+import re
+import threading
+
+
+# file extensions standing in for resource types where the browser can only block by url (selenium)
+RESOURCE_TYPE_EXTENSIONS = {
+    "media": ["mp4", "webm", "ogv", "mp3", "m3u8", "mov"],
+    "font": ["woff", "woff2", "ttf", "otf", "eot"],
+    "image": ["png", "jpg", "jpeg", "gif", "webp", "svg", "ico"],
+    "stylesheet": ["css"],
+    "script": ["js"],
+}
+
+# the extension ends the path of the url, or is followed by its query string
+RESOURCE_TYPE_PATTERNS = {resource_type: [pattern.format(extension) for extension in extensions
+                                          for pattern in ("*.{}", "*.{}?*")]
+                          for resource_type, extensions in RESOURCE_TYPE_EXTENSIONS.items()}
+
+
+def matches(url, pattern):
+    """Returns True if url matches pattern, where only * is a wildcard, as in Network.setBlockedURLs."""
+    return re.fullmatch(".*".join(re.escape(part) for part in pattern.split("*")), url, re.DOTALL) is not None
+
+
+class RequestFilter:
+    """Decides which requests of a page the browser aborts, and counts them.
+
+    Parameters
+    ----------
+    block_types : list
+        Resource types to block, as named by Chrome: media, font, image, stylesheet, script,
+        xhr, fetch, websocket, eventsource, manifest, texttrack or other. The page itself and
+        its frames (document) are never blocked.
+    block_patterns : list
+        Url patterns to block, * matches anything, ie: "*doubleclick.net*".
+    allow_patterns : list
+        Url patterns that are never blocked, even if a type or pattern above matches.
+
+    Notes
+    -----
+    Blocked requests fail at once instead of waiting for a slow or dead host, so the page
+    finishes loading sooner. Pyppeteer applies the filter fully through request interception.
+    Selenium can only block urls, through the DevTools Network.setBlockedURLs command, so
+    types are blocked by their usual file extensions and allow_patterns do not apply. The
+    patterns that match the url of the page are left out for that page.
+
+    """
+
+    def __init__(self, block_types=(), block_patterns=(), allow_patterns=()):
+        self.block_types = set(block_types) - {"document"}
+        self.block_patterns = list(block_patterns)
+        self.allow_patterns = list(allow_patterns)
+        self.lock = threading.Lock()
+        self.blocked = 0
+        self.loaded = 0
+        self.loaded_bytes = 0
+
+    @classmethod
+    def from_settings(cls, block_types, block_patterns, allow_patterns):
+        """Returns a filter, or None if nothing is to be blocked."""
+        if not block_types and not block_patterns:
+            return None
+        return cls(block_types, block_patterns, allow_patterns)
+
+    def blocks(self, url, resource_type, navigation=False):
+        """Returns True if the request of url, of resource_type, is to be aborted.
+
+        Navigation requests and documents are never aborted, whatever their url.
+
+        """
+        if navigation or resource_type == "document":
+            return False
+        if any(matches(url, pattern) for pattern in self.allow_patterns):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return any(matches(url, pattern) for pattern in self.block_patterns)
+
+    def blocked_url_patterns(self, page_url=None):
+        """Returns the url patterns that block the same requests, for Network.setBlockedURLs.
+
+        Patterns matching page_url are left out, so the page itself still loads.
+
+        """
+        patterns = list(self.block_patterns)
+        for resource_type in sorted(self.block_types):
+            patterns.extend(RESOURCE_TYPE_PATTERNS.get(resource_type, []))
+        if page_url is not None:
+            patterns = [pattern for pattern in patterns if not matches(page_url, pattern)]
+        return patterns
+
+    def count(self, blocked=0, loaded=0, loaded_bytes=0):
+        with self.lock:
+            self.blocked += blocked
+            self.loaded += loaded
+            self.loaded_bytes += loaded_bytes
+
+    def count_performance_log(self, entries):
+        """Counts the requests of a page from the Chrome performance log of a selenium driver."""
+        blocked = loaded = loaded_bytes = 0
+        for entry in entries:
+            try:
+                message = json.loads(entry["message"])["message"]
+            except (KeyError, ValueError):
+                continue
+            if message.get("method") == "Network.loadingFailed" and message["params"].get("blockedReason"):
+                blocked += 1
+            elif message.get("method") == "Network.loadingFinished":
+                loaded += 1
+                loaded_bytes += int(message["params"].get("encodedDataLength", 0))
+        self.count(blocked, loaded, loaded_bytes)
+
+    def summary(self):
+        return "{0} requests blocked, {1} requests loaded ({2:.1f} MB)".format(self.blocked, self.loaded,
+                                                                              self.loaded_bytes / 1e6)
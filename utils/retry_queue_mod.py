@@ -0,0 +1,146 @@
+import csv
+import heapq
+import itertools
+import logging
+import math
+import os
+import time
+
+
+# answers of check_website_availability worth asking again, other FAIL answers such as 404 are final
+RETRY_SITE_MESSAGES = ("HTTPError: 429", "HTTPError: 500", "HTTPError: 502", "HTTPError: 503", "HTTPError: 504")
+RETRY_SITE_ERRORS = ("timed out", "Temporary failure", "Connection reset")
+
+
+def is_retryable(site_status, site_message, screenshot_message):
+    """Returns True if a capture failed for a reason that may go away, such as a timeout.
+
+    Parameters
+    ----------
+    site_status : str
+        LIVE or FAIL, from check_website_availability.
+    site_message : str
+        The reason for site_status.
+    screenshot_message : str
+        The message of the screenshot method.
+
+    """
+    site_message = str(site_message)
+    if site_status == "FAIL":
+        return site_message in RETRY_SITE_MESSAGES or any(error in site_message for error in RETRY_SITE_ERRORS)
+    return str(screenshot_message) != "Screenshot successful"
+
+
+class RetryQueue:
+    """Failed captures waiting to be tried again, each after a longer wait than the last.
+
+    Parameters
+    ----------
+    max_attempts : int
+        Number of times a url is captured before its failure is final, 1 to never retry.
+    delay : int
+        Seconds before the first retry. Every retry of the same url waits twice as long as the
+        one before.
+    max_delay : int
+        Longest wait before a retry, in seconds.
+
+    Examples
+    --------
+    >>> retries = RetryQueue(3, 30, 600)
+    >>> retries.defer(row, failure=output)      # False once row had its 3 attempts
+    >>> while retries:
+    ...     for due, row in retries.take():     # due is None for the output of a row given up on
+    ...         ...
+
+    """
+
+    def __init__(self, max_attempts=1, delay=30, max_delay=600):
+        self.max_attempts = max_attempts
+        self.delay = delay
+        self.max_delay = max_delay
+        self.attempts = {}
+        self.queue = []
+        self.order = itertools.count()  # keeps rows due at the same time in the order they failed
+
+    def __len__(self):
+        return len(self.queue)
+
+    def defer(self, job, not_before=None, failure=None):
+        """Queues job for another attempt after the backoff delay, returns False if it used up its attempts.
+
+        not_before is the earliest time the attempt is worth making, ie: the end of the window in
+        which HostTimeouts.fail_fast skips the host of job. The wait is never longer than the
+        backoff delay for it: if the retry pass reaches job before not_before, take gives back
+        failure, the output of the failed attempt, instead of job.
+
+        """
+        attempts = self.attempts.get(job, 1)
+        if attempts >= self.max_attempts:
+            return False
+        self.attempts[job] = attempts + 1
+        wait = min(self.max_delay, self.delay * 2 ** (attempts - 1))
+        heapq.heappush(self.queue, (time.time() + wait, next(self.order), job, not_before, failure))
+        logging.info("Retrying {0} in {1} seconds, attempt {2} of {3}".format(job, wait, attempts + 1,
+                                                                              self.max_attempts))
+        return True
+
+    def take(self):
+        """Empties the queue, returns its jobs with the time they are due, earliest first.
+
+        A job whose not_before is later than both its due time and now is not tried again: it
+        is returned as (None, failure) and has no attempts left, so that writing failure puts
+        it in the dead letters with its reason instead of sleeping until not_before.
+
+        """
+        now = time.time()
+        due_jobs = []
+        for due, _, job, not_before, failure in sorted(self.queue):
+            if not_before is not None and failure is not None and not_before > max(due, now):
+                self.attempts[job] = self.max_attempts
+                logging.info("Not retrying {0}, its host is skipped for {1} more seconds".format(
+                    job, int(math.ceil(not_before - now))))
+                due_jobs.append((None, failure))
+            else:
+                due_jobs.append((due, job))
+        self.queue = []
+        return due_jobs
+
+
+class DeadLetters:
+    """The CSV of the rows whose capture still failed after their last attempt.
+
+    Parameters
+    ----------
+    index_csv_name : str
+        The index CSV of the run, the rows are written to <index_csv_name>.dead.csv.
+    header : list
+        The header of the index CSV.
+
+    Notes
+    -----
+    The file of the last run is removed when a run starts and only created again if a row
+    fails for good, so it always lists the failures of the latest run.
+
+    """
+
+    def __init__(self, index_csv_name, header):
+        self.file_name = index_csv_name + ".dead.csv"
+        self.header = header
+        self.dead_file = None
+        self.count = 0
+        if os.path.exists(self.file_name):
+            os.remove(self.file_name)
+
+    def write(self, row):
+        if self.dead_file is None:
+            self.dead_file = open(self.file_name, 'w+')
+            self.csv_writer = csv.writer(self.dead_file, delimiter=',', quoting=csv.QUOTE_ALL)
+            self.csv_writer.writerow(self.header)
+        self.csv_writer.writerow(row)
+        self.dead_file.flush()
+        self.count += 1
+
+    def close(self):
+        if self.dead_file is not None:
+            self.dead_file.close()
+            print("{0} urls failed after their last attempt, see {1}".format(self.count, self.file_name))
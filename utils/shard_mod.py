@@ -0,0 +1,103 @@
+import os
+import re
+from urllib.parse import urlparse
+
+from csv_offsets_mod import load_offsets
+
+
+# an archive url keeps the url it captured after its timestamp, ie: .../1068/20190101000000if_/http://example.com/
+ARCHIVED_URL = re.compile(r'/\d{14}[a-z_]*/(.+)$')
+
+
+def parse_shard(shard):
+    """Returns the shard number and the number of shards of a "i/n" string, ie: "2/8" gives (2, 8).
+
+    Raises
+    ------
+    ValueError
+        If shard is not of the form i/n with 1 <= i <= n.
+
+    """
+    try:
+        index, count = (int(part) for part in shard.split("/"))
+    except ValueError:
+        raise ValueError("shard must be i/n, ie: 2/8, not {}".format(shard))
+    if not 1 <= index <= count:
+        raise ValueError("shard number must be between 1 and {0}, not {1}".format(count, index))
+    return index, count
+
+
+def shard_file_name(file_name, shard):
+    """Returns the name of the file of one shard, ie: index/archive_index.csv gives index/archive_index.shard2of8.csv.
+
+    Parameters
+    ----------
+    file_name : str
+        The file of the whole run.
+    shard : tuple
+        The shard number and the number of shards.
+
+    """
+    root, extension = os.path.splitext(file_name)
+    return "{0}.shard{1}of{2}{3}".format(root, shard[0], shard[1], extension)
+
+
+def shard_range(csv_in_name, read_range, shard):
+    """Returns the lines of the input CSV captured by one shard when sharding by rows.
+
+    The lines of read_range, or of the whole CSV, are split into blocks of nearly equal size
+    and the shard gets the block of its number. The number of lines comes from the saved
+    offsets of the CSV, so the shard starts reading at its first line.
+
+    Returns
+    -------
+    read_range : list
+        The first and last line of the shard, the first is larger than the last if the shard is empty.
+
+    """
+    first = max(1, read_range[0]) if read_range[0] is not None else 1
+    last = read_range[1] if read_range[1] is not None else len(load_offsets(csv_in_name))
+    lines = max(0, last - first + 1)
+    index, count = shard
+    return [first + (index - 1) * lines // count, first + index * lines // count - 1]
+
+
+def url_host(url):
+    """Returns the host of url, or of the url it captured if it is an archive url."""
+    archived = ARCHIVED_URL.search(url)
+    if archived is not None:
+        url = archived.group(1)
+    return (urlparse(url).hostname or url).lower()
+
+
+def assign_hosts(urls, count):
+    """Spreads the hosts of urls over count shards so each shard gets about as many urls.
+
+    Hosts are given out from the one with the most urls down, each to the shard with the
+    fewest urls so far. Every process sharding the same CSV computes the same assignment.
+
+    Parameters
+    ----------
+    urls : iterable
+        Every url of the run.
+    count : int
+        The number of shards.
+
+    Returns
+    -------
+    shards : dict
+        The shard number, from 1 to count, of each host.
+
+    """
+    host_counts = {}
+    for url in urls:
+        host = url_host(url)
+        host_counts[host] = host_counts.get(host, 0) + 1
+
+    shard_sizes = [0] * count
+    shards = {}
+    for host in sorted(host_counts, key=lambda host: (-host_counts[host], host)):
+        smallest = shard_sizes.index(min(shard_sizes))
+        shard_sizes[smallest] += host_counts[host]
+        shards[host] = smallest + 1
+    return shards
@@ -2,15 +2,13 @@
 import argparse
 import csv
 import time
-import urllib.request
-import urllib.error
 import logging
-import socket
 import sys
 # sys.path.insert(0, './testFolder/')
 from website_exists_mod import *
+from async_exist_mod import check_urls
 
-def	handle_csv_file(csv_in_name, csv_out_name, timeout_duration):
+def	handle_csv_file(csv_in_name, csv_out_name, timeout_duration, concurrency=200, host_concurrency=4):
 	"""Fetches	urls from the input	CSV	and	records the urls' availability in output CSV
 
 	Parameters
@@ -21,6 +19,16 @@ def	handle_csv_file(csv_in_name, csv_out_name, timeout_duration):
         The CSV file to write the availablity results.
     timeout_duration : str
 	    Duration before timeout when going to each website.
+    concurrency : int
+        Number of urls checked at once.
+    host_concurrency : int
+        Number of urls of the same host checked at once.
+
+	Notes
+	-----
+	The rows are written as their checks finish, so they are not in the order of the input
+	CSV. Id is still the number of the url in the input CSV.
+
 	"""
 
 	with open(csv_in_name,	'r') as	csv_file_in:
@@ -29,32 +37,26 @@ def	handle_csv_file(csv_in_name, csv_out_name, timeout_duration):
 			csv_writer = csv.writer(csv_file_out, delimiter=',',	quoting=csv.QUOTE_ALL)
 			csv_writer.writerow(["Id","url", "availability", "site_status", "site_message"])
 
-			line_count =	0
 			next(csv_reader)	 # skip	header
-			url_counter = 1
-			fail_counter = 0
-			success_counter = 0
-			while True:
-				try:
-					line =	next(csv_reader)
-				except StopIteration:
-					break
-				line_count += 1
-
-				url	= line[0]
-
-				print("url[%d]: %s: "%(url_counter, url))
-				site_status, site_message, availability =	is_website_exist(url, timeout_duration)
+			counters = {"success": 0, "fail": 0}
+
+			def write(url_counter, url, site_status, site_message, availability):
+				print("url[%d]: %s: %s"%(url_counter, url, availability))
 				if availability == "Website does not exist":
-					fail_counter += 1
+					counters["fail"] += 1
 				else:
-					success_counter += 1
-
+					counters["success"] += 1
 				csv_writer.writerow([url_counter, url, availability, site_status, site_message])
-				url_counter += 1
-	
+
+			start = time.time()
+			jobs = ((url_counter, line[0]) for url_counter, line in enumerate(csv_reader, 1) if line)
+			check_urls(jobs, write, timeout_duration, concurrency, host_concurrency)
+			duration = time.time() - start
+
+	total = counters["success"] + counters["fail"]
 	print("-"*10+"report"+"-"*10)
-	print(" total url: %d \n available url: %d \n non-available url: %d" %(url_counter-1, success_counter, fail_counter))
+	print(" total url: %d \n available url: %d \n non-available url: %d" %(total, counters["success"], counters["fail"]))
+	print(" checked in %.1f seconds, %.0f urls per minute" %(duration, total * 60 / max(duration, 0.001)))
 	print("-"*10+"report"+"-"*10)
 
 
@@ -69,6 +71,10 @@ def parse_args():
         The CSV file to write the availablity results.
     timeout_duration : str
 	    Duration before timeout when going to each website.
+    concurrency : int
+        Number of urls checked at once.
+    host_concurrency : int
+        Number of urls of the same host checked at once.
     """
 
     parser = argparse.ArgumentParser()
@@ -76,6 +82,8 @@ def parse_args():
     parser.add_argument("--input", type=str, help="The CSV file with the current urls")
     parser.add_argument("--output", type=str, help="The CSV file to write the output")
     parser.add_argument("--timeout", type = str, help="(optional) Specify duration before timeout, in seconds, default 30 seconds")
+    parser.add_argument("--concurrency", type=int, default=200, help="(optional) Number of urls checked at once, default 200")
+    parser.add_argument("--host_concurrency", type=int, default=4, help="(optional) Number of urls of the same host checked at once, default 4")
 
     args = parser.parse_args()
 
@@ -99,13 +107,13 @@ def parse_args():
             print("Invalid format for timeout")
             exit()
 
-    return csv_in_name, csv_out_name, timeout_duration
+    return csv_in_name, csv_out_name, timeout_duration, max(1, args.concurrency), max(1, args.host_concurrency)
 				
 
 def	main():
-	csv_in_name, csv_out_name, timeout_duration = parse_args()
+	csv_in_name, csv_out_name, timeout_duration, concurrency, host_concurrency = parse_args()
 	print("Starting")
-	handle_csv_file(csv_in_name, csv_out_name, timeout_duration)
+	handle_csv_file(csv_in_name, csv_out_name, timeout_duration, concurrency, host_concurrency)
 
 
 main()
@@ -0,0 +1,249 @@
+import json
+import logging
+import queue
+import threading
+from contextlib import contextmanager
+
+from page_settle_mod import PageSettle
+
+
+class WebDriverPool:
+    """A pool of headless Chrome WebDrivers that are reused across screenshots.
+
+    Parameters
+    ----------
+    size : int
+        Largest number of drivers open at once. Drivers are started when they are first needed.
+    max_pages : int
+        Number of pages a driver loads before it is quit and replaced by a new one, 0 to never
+        replace a driver that still works.
+    timeout_duration : int
+        Page load timeout of the drivers, in seconds.
+    screensize : list
+        Contains two int which are height and width of the browser window.
+    request_filter : RequestFilter
+        Decides which requests the drivers block. None to let pages load everything.
+    page_settle : PageSettle
+        Decides when a page loaded by a driver is ready for its screenshot. None for the default
+        quiet window and max wait.
+    check_navigation : bool
+        Keep the performance log of the drivers, so navigation_response can tell the status and
+        the redirects of the page a driver loaded.
+
+    Notes
+    -----
+    Starting Chrome takes longer than rendering most pages, so each driver is kept between
+    screenshots. After every page its cookies, local storage and session storage are cleared
+    and it is sent back to about:blank at the starting window size. A driver that no longer
+    responds is quit and replaced, so crashed or hung Chrome processes are not left behind.
+
+    """
+
+    def __init__(self, size=1, max_pages=50, timeout_duration=30, screensize=(768, 1024), request_filter=None,
+                 page_settle=None, check_navigation=False):
+        self.size = max(1, size)
+        self.max_pages = max_pages
+        self.timeout_duration = timeout_duration
+        self.screensize = screensize
+        self.request_filter = request_filter
+        self.page_settle = page_settle or PageSettle()
+        self.check_navigation = check_navigation
+        self.idle_drivers = queue.LifoQueue()
+        self.open_slots = threading.BoundedSemaphore(self.size)
+        self.page_counts = {}
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def new_driver(self):
+        """Starts a headless Chrome WebDriver."""
+        from selenium import webdriver
+
+        print("Loading Selenium")
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")
+        options.add_argument("--hide-scrollbars")
+        if self.request_filter is not None or self.check_navigation:
+            options.set_capability("goog:loggingPrefs", {"performance": "ALL"})    # to count the requests
+        driver = webdriver.Chrome(options=options)
+        driver.set_page_load_timeout(self.timeout_duration)
+        driver.set_window_size(self.screensize[1], self.screensize[0])
+        if self.request_filter is not None:
+            driver.execute_cdp_cmd("Network.enable", {})
+        return driver
+
+    def navigate(self, driver, url):
+        """Loads url in driver, blocking the requests of the page that request_filter blocks.
+
+        The blocked urls are set for each page, leaving out the patterns that match url, as
+        Network.setBlockedURLs would otherwise also block the page itself.
+
+        """
+        if self.request_filter is not None:
+            driver.execute_cdp_cmd("Network.setBlockedURLs",
+                                   {"urls": self.request_filter.blocked_url_patterns(url)})
+        driver.get(url)
+
+    def acquire(self):
+        """Returns an idle driver, starting a new one if the pool is not full yet.
+
+        Blocks while all size drivers are busy.
+
+        """
+        self.open_slots.acquire()
+        try:
+            return self.idle_drivers.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            driver = self.new_driver()
+        except:
+            self.open_slots.release()
+            raise
+        with self.lock:
+            self.page_counts[driver] = 0
+        return driver
+
+    def release(self, driver, failed=False):
+        """Returns a driver to the pool after a page.
+
+        Parameters
+        ----------
+        driver : selenium.webdriver.Chrome
+            A driver returned by acquire.
+        failed : bool
+            True if the page raised an error, the driver is then checked before it is reused.
+
+        """
+        try:
+            with self.lock:
+                self.page_counts[driver] += 1
+                worn_out = self.max_pages and self.page_counts[driver] >= self.max_pages
+
+            if self.closed or worn_out or (failed and not self.is_responsive(driver)) or not self.reset(driver):
+                self.discard(driver)
+            else:
+                self.idle_drivers.put(driver)
+        finally:
+            self.open_slots.release()
+
+    @contextmanager
+    def driver(self):
+        """Context manager lending a driver for one page.
+
+        Examples
+        --------
+        >>> with pool.driver() as driver:
+        ...     pool.navigate(driver, url)
+
+        """
+        driver = self.acquire()
+        try:
+            yield driver
+        except:
+            self.release(driver, failed=True)
+            raise
+        self.release(driver)
+
+    @staticmethod
+    def is_responsive(driver):
+        """Returns False if the browser of the driver crashed or stopped answering."""
+        try:
+            driver.execute_script("return 1")
+            return True
+        except:
+            return False
+
+    def reset(self, driver):
+        """Clears the cookies and storage left by the last page and goes back to about:blank.
+
+        Returns
+        -------
+        reset : bool
+            False if the driver could not be reset and should not be reused.
+
+        """
+        try:
+            if self.request_filter is not None or self.check_navigation:
+                try:
+                    entries = driver.get_log("performance")    # also empties the log for the next page
+                    if self.request_filter is not None:
+                        self.request_filter.count_performance_log(entries)
+                except Exception as e:
+                    logging.info("Reading the performance log failed: {}".format(e))
+            try:
+                driver.execute_script("window.localStorage.clear(); window.sessionStorage.clear();")
+            except:
+                pass    # pages such as about:blank or error pages have no storage
+            try:
+                driver.execute_cdp_cmd("Network.clearBrowserCookies", {})
+            except:
+                driver.delete_all_cookies()
+            driver.get("about:blank")
+            driver.set_window_size(self.screensize[1], self.screensize[0])
+            return True
+        except Exception as e:
+            logging.info("WebDriver reset failed: {}".format(e))
+            return False
+
+    def navigation_response(self, driver):
+        """Returns the status code, the url and the redirect chain of the page driver just loaded.
+
+        Needs check_navigation. Reading the performance log empties it, so the requests in it
+        are counted for request_filter here.
+
+        Returns
+        -------
+        status_code : int
+            The HTTP status of the response of the page, after redirects. None if there was none.
+        final_url : str
+            The url of that response.
+        redirect_chain : list
+            The urls the page was redirected from, in order.
+
+        """
+        entries = driver.get_log("performance")
+        if self.request_filter is not None:
+            self.request_filter.count_performance_log(entries)
+        return document_response(entries)
+
+    def discard(self, driver):
+        """Quits a driver and forgets it."""
+        with self.lock:
+            self.page_counts.pop(driver, None)
+        try:
+            driver.quit()
+        except Exception as e:
+            logging.info("WebDriver quit failed: {}".format(e))
+
+    def close(self):
+        """Quits every idle driver. Drivers still in use are quit when they are released."""
+        self.closed = True
+        while True:
+            try:
+                driver = self.idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(driver)
+
+
+def document_response(entries):
+    """Finds the response of the page of the main frame in the Chrome performance log entries of a driver."""
+    status_code = final_url = frame_id = None
+    redirect_chain = []
+    for entry in entries:
+        try:
+            message = json.loads(entry["message"])["message"]
+            params = message["params"]
+        except (KeyError, ValueError):
+            continue
+        if params.get("type") != "Document":
+            continue
+        if message.get("method") == "Network.requestWillBeSent":
+            if frame_id is None:
+                frame_id = params.get("frameId")    # the page is the first document requested
+            if params.get("frameId") == frame_id and "redirectResponse" in params:
+                redirect_chain.append(params["redirectResponse"]["url"])
+        elif message.get("method") == "Network.responseReceived" and params.get("frameId") == frame_id:
+            status_code = params["response"]["status"]
+            final_url = params["response"]["url"]
+    return status_code, final_url, redirect_chain
@@ -1,10 +1,11 @@
 import argparse
 import csv
 import time
-import urllib.request
-import urllib.error
 import logging
-import socket
+
+import requests
+
+from http_client_mod import error_reason, shared_client
 
 
 def	check_website_availability(url, timeout_duration):
@@ -26,6 +27,11 @@ def	check_website_availability(url, timeout_duration):
 		An error describing why the site can't be	reached	or a message saying	the	site was redirected.
 
 
+	Notes
+	-----
+	The request goes through the shared HttpClient, so it reuses the open connections and the
+	cached DNS lookups of the host, and asks with HEAD before falling back to GET.
+
 	References
 	----------
 	..	[1]	https://stackoverflow.com/questions/1726402/in-python-how-do-i-use-urllib-to-see-if-a-website-is-404-or-200
@@ -33,24 +39,19 @@ def	check_website_availability(url, timeout_duration):
 	"""
 
 	try:
-		conn = urllib.request.urlopen(url, timeout = timeout_duration)
-	except	urllib.error.HTTPError as e:
-		#	Return code	error (e.g.	404, 501, ...)
-		error_message	= 'HTTPError: {}'.format(e.code)
+		response = shared_client().probe(url, timeout_duration)
+	except	requests.exceptions.Timeout:
+		#	a slow site is not a dead one
+		error_message	= 'URLError: timed out'
 		print(error_message)
 		logging.info(error_message)
-		return "FAIL", error_message
-	except	urllib.error.URLError as e:
+		return "LIVE", error_message
+	except	requests.exceptions.ConnectionError as e:
 		#	Not	an HTTP-specific error (e.g. connection	refused)
-		error_message	= 'URLError: {}'.format(e.reason)
-		if isinstance(e.reason, socket.timeout):
-			print(error_message)
-			logging.info(error_message)
-			return "LIVE", error_message
-		else:
-			print(error_message)
-			logging.info(error_message)
-			return "FAIL", error_message
+		error_message	= 'URLError: {}'.format(error_reason(e))
+		print(error_message)
+		logging.info(error_message)
+		return "FAIL", error_message
 	except	Exception as e:
 		#	other reasons such as "your	connection is not secure"
 		print(e)
@@ -62,11 +63,18 @@ def	check_website_availability(url, timeout_duration):
 		logging.info("Unknown	error")
 		return "FAIL", "Unknown error"
 
+	if	response.status_code >= 400:
+		#	Return code	error (e.g.	404, 501, ...)
+		error_message	= 'HTTPError: {}'.format(response.status_code)
+		print(error_message)
+		logging.info(error_message)
+		return "FAIL", error_message
+
 	# check if	redirected
-	if conn.geturl() != url:
-		print("Redirected	to {}".format(conn.geturl()))
-		logging.info("Redirected to {}".format(conn.geturl()))
-		return "LIVE", "Redirected to	{}".format(conn.geturl())
+	if response.history:
+		print("Redirected	to {}".format(response.url))
+		logging.info("Redirected to {}".format(response.url))
+		return "LIVE", "Redirected to	{}".format(response.url)
 
 	# reaching	this point means it	received code 200
 	print("Return code	200")
@@ -104,3 +112,58 @@ def	is_website_exist(url, timeout_duration):
 		return site_status, site_message,	"Website exists"
 
 
+def	navigation_status(url, status_code=None, final_url=None, redirect_chain=(), error=None):
+	"""Derives the site status of url from the response a browser got when it loaded url, instead of requesting it again.
+
+	Parameters
+	----------
+	url : str
+		The url the browser loaded.
+	status_code : int
+		The HTTP status of the response of the page, after redirects. None if there was no response.
+	final_url : str
+		The url of that response.
+	redirect_chain : list
+		The urls the browser was redirected from, in order. Only these mark a redirect, browsers
+		also change url when they normalise it, ie: http://example.com to http://example.com/.
+	error : Exception
+		The error the browser raised while loading url, None if it loaded.
+
+	Returns
+	-------
+	site_status : str
+		LIVE if website can still	be reached or is redirected.
+		FAIL if not.
+	site_message :	str
+		The same messages as check_website_availability gives for the same answer.
+
+	"""
+
+	if	error is not None:
+		error_message	= 'URLError: {}'.format(error)
+		print(error_message)
+		logging.info(error_message)
+		#	like check_website_availability, a timeout does not mean the site is gone
+		if "timeout" in type(error).__name__.lower() or "timed out" in str(error).lower():
+			return "LIVE", 'URLError: timed out'
+		return "FAIL", error_message
+
+	if	status_code is None:
+		logging.info("No response from {}".format(url))
+		return "FAIL", "No response"
+
+	if	status_code >= 400:
+		error_message	= 'HTTPError: {}'.format(status_code)
+		print(error_message)
+		logging.info(error_message)
+		return "FAIL", error_message
+
+	if	redirect_chain:
+		logging.info("Redirect chain: {}".format(" -> ".join(list(redirect_chain) + [final_url])))
+		print("Redirected	to {}".format(final_url))
+		logging.info("Redirected to {}".format(final_url))
+		return "LIVE", "Redirected to	{}".format(final_url)
+
+	print("Return code	200")
+	logging.info("Return code 200")
+	return	"LIVE",	"Return	code 200"
@@ -0,0 +1,103 @@
+import logging
+import os
+import queue
+import select
+import shutil
+import subprocess
+from contextlib import contextmanager
+
+
+class XvfbPool:
+    """A pool of running Xvfb displays lent to cutycapt one screenshot at a time.
+
+    Parameters
+    ----------
+    size : int
+        Number of displays, one for each screenshot taken at the same time.
+    screensize : list
+        Contains two int which are height and width of the screen of each display.
+
+    Notes
+    -----
+    Every display is started once with Xvfb -displayfd, which makes Xvfb pick a free display
+    number itself, so pools of several processes on one machine never collide. A display
+    whose Xvfb exited is started again the next time it is lent out.
+
+    """
+
+    def __init__(self, size=1, screensize=(768, 1024)):
+        self.size = max(1, size)
+        self.screen = "{0}x{1}x24".format(screensize[1], screensize[0])
+        self.idle_displays = queue.Queue()
+        self.processes = {}
+
+    @classmethod
+    def start_or_none(cls, size=1, screensize=(768, 1024)):
+        """Returns a started pool, or None if Xvfb is not installed or could not start.
+
+        Without a pool, cutycapt_screenshot falls back to starting xvfb-run for every url.
+
+        """
+        if shutil.which("Xvfb") is None:
+            logging.info("Xvfb not found, using xvfb-run for each screenshot")
+            return None
+        pool = cls(size, screensize)
+        try:
+            for _ in range(pool.size):
+                pool.idle_displays.put(pool.start_display())
+        except (OSError, RuntimeError) as e:
+            logging.info("Starting Xvfb failed, using xvfb-run for each screenshot: {}".format(e))
+            pool.close()
+            return None
+        return pool
+
+    def start_display(self, start_timeout=10):
+        """Starts one Xvfb and returns its display, ie: ":99"."""
+        read_fd, write_fd = os.pipe()
+        try:
+            process = subprocess.Popen(["Xvfb", "-displayfd", str(write_fd), "-screen", "0", self.screen,
+                                        "-nolisten", "tcp"], pass_fds=(write_fd,),
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        finally:
+            os.close(write_fd)
+
+        try:
+            output = b""
+            while not output.endswith(b"\n"):
+                ready, _, _ = select.select([read_fd], [], [], start_timeout)
+                chunk = os.read(read_fd, 64) if ready else b""
+                if not chunk:
+                    process.kill()
+                    raise RuntimeError("Xvfb did not report a display number")
+                output += chunk
+        finally:
+            os.close(read_fd)
+
+        display = ":" + output.decode().strip()
+        self.processes[display] = process
+        return display
+
+    @contextmanager
+    def display(self):
+        """Context manager lending a display, as the value for the DISPLAY environment variable."""
+        display = self.idle_displays.get()
+        try:
+            if self.processes[display].poll() is not None:
+                logging.info("Xvfb of display {} exited, starting another one".format(display))
+                new_display = self.start_display()
+                del self.processes[display]
+                display = new_display
+            yield display
+        finally:
+            self.idle_displays.put(display)
+
+    def close(self):
+        """Stops every Xvfb of the pool."""
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.processes = {}